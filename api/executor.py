@@ -0,0 +1,87 @@
+# api/executor.py
+
+import os
+import asyncio
+import functools
+import logging
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_POOL = os.getenv("INFERENCE_POOL", "thread")  # "thread" or "process"
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", os.cpu_count() or 2))
+INFERENCE_MAX_INFLIGHT = int(os.getenv("INFERENCE_MAX_INFLIGHT", 32))
+INFERENCE_RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", 1))
+
+
+class Overloaded(Exception):
+    """Raised when a job is rejected because the in-flight limit is reached."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Runs blocking decode / inference work off the event loop in a bounded
+    thread or process pool. Jobs past `max_inflight` fail fast with
+    `Overloaded` instead of piling up in an unbounded queue.
+    """
+
+    def __init__(self, kind=INFERENCE_POOL, workers=INFERENCE_WORKERS,
+                 max_inflight=INFERENCE_MAX_INFLIGHT, retry_after=INFERENCE_RETRY_AFTER):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown pool kind: {kind!r}")
+        self.kind = kind
+        self.workers = workers
+        self.max_inflight = max_inflight
+        self.retry_after = retry_after
+
+        self._pool = None
+        self._inflight = 0
+        self._rejected = 0
+        self._completed = 0
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            pool_cls = ThreadPoolExecutor if self.kind == "thread" else ProcessPoolExecutor
+            self._pool = pool_cls(max_workers=self.workers)
+            logger.info(f"Started {self.kind} pool with {self.workers} workers")
+        return self._pool
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Reserve an in-flight slot for one job, or raise Overloaded."""
+        # Only touched from the event loop thread, so no lock is needed.
+        if self._inflight >= self.max_inflight:
+            self._rejected += 1
+            raise Overloaded(self.retry_after)
+        self._inflight += 1
+        try:
+            yield
+        finally:
+            self._inflight -= 1
+            self._completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` in the pool and await its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, functools.partial(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_inflight": self.max_inflight,
+            "inflight": self._inflight,
+            "completed": self._completed,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
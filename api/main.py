@@ -1,15 +1,62 @@
 # api/main.py
 
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response, FileResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from vision.models.inference import diagnose_image
-from utils.medical_agent import consult_symptoms
+from vision.models import chexnet_model, registry
+from vision.models.inference import chexnet_batcher, cascade_batcher, explain_batcher
+from vision.models.cam import heatmap_store
+from vision.models import ensemble
+from vision.models.cascade import chexnet_cascade, CASCADE_ENABLED
+from vision.models.result_cache import result_cache, make_key
+from vision.models import bulk
+from api.executor import InferenceExecutor, Overloaded
+from utils.medical_agent import consult_symptoms, stream_consultation
+from utils.llm_gateway import LLMError, LLMDeadlineExceeded
+from utils.sse import format_event
+from utils.consult_cache import consult_cache
+from utils.explanation_store import explanation_store, EXPLAIN_PREFETCH
+from data.log_store import get_log_store, LOG_PAGE_SIZE, TIMESTAMP_FORMAT
+from data.upload_store import get_upload_store
+from gnn.drug_safety import get_drug_safety_index
+from gnn.embedding_index import get_embedding_index
+from utils import metrics
+from utils.metrics import span
+from typing import Optional, List, Union
+from PIL import UnidentifiedImageError
 from datetime import datetime
+import asyncio
+import io
+import queue
+import re
+import mimetypes
+import threading
+import time
+import zipfile
 import os
+import logging
 
-# In-memory store
-diagnosis_log = []
+logger = logging.getLogger(__name__)
+
+# Durable diagnosis log (SQLite, batched background writes)
+log_store = get_log_store()
+
+# Decode and inference run here, never on the event loop. Only pure CPU
+# functions go to it: with INFERENCE_POOL=process their arguments are
+# pickled, and any state they touch lives in the worker process. Caches and
+# stores are called through run_in_threadpool instead.
+executor = InferenceExecutor()
+
+# Bulk scoring jobs each use the whole decode pool, so only run a few at once
+BULK_MAX_JOBS = int(os.getenv("BULK_MAX_JOBS", 1))
+bulk_jobs = threading.BoundedSemaphore(BULK_MAX_JOBS)
+
+# Keep a copy of each upload on disk (written after the response is sent),
+# content-addressed and size-budgeted, see data.upload_store
+SAVE_UPLOADS = os.getenv("SAVE_UPLOADS", "1") == "1"
+upload_store = get_upload_store()
 
 app = FastAPI(
     title="🩺 Autonomous AI Medical Assistant",
@@ -17,6 +64,39 @@ app = FastAPI(
     version="1.2.0",
 )
 
+# Screening model first, CheXNet only for uncertain studies (CASCADE_ENABLED=1)
+diagnosis_batcher = cascade_batcher if CASCADE_ENABLED else chexnet_batcher
+
+# Scraped by /metrics; read from the live objects at scrape time
+metrics.register_collector("batcher", diagnosis_batcher.stats)
+if CASCADE_ENABLED:
+    metrics.register_collector("cascade", chexnet_cascade.stats)
+metrics.register_collector("executor", executor.stats)
+metrics.register_collector("log_store", log_store.stats)
+metrics.register_collector("uploads", upload_store.stats)
+metrics.register_collector("cache_diagnosis", result_cache.stats)
+metrics.register_collector("cache_consult", consult_cache.stats)
+metrics.register_collector("cache_explanations", explanation_store.stats)
+metrics.register_collector("models", registry.stats)
+metrics.register_collector("explain_batcher", explain_batcher.stats)
+metrics.register_collector("heatmaps", heatmap_store.stats)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    metrics.inflight_requests.inc(server="fastapi")
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.inflight_requests.dec(server="fastapi")
+        # Route template, not the raw path, to keep label cardinality bounded
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        metrics.observe_request("fastapi", endpoint, request.method, status, time.perf_counter() - started)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -30,42 +110,297 @@ app.add_middleware(
 class SymptomsInput(BaseModel):
     symptoms: str
 
+class DrugSafetyInput(BaseModel):
+    # Indices into data.drugs_graph.DRUGS and/or drug names
+    drug_ids: List[Union[int, str]] = []
+    drugs: List[str] = []
+
+class DrugPartnersInput(BaseModel):
+    drug_ids: List[Union[int, str]] = []
+    drugs: List[str] = []
+    k: int = 10
+    # "risk": highest predicted interaction risk; "similar": nearest embeddings
+    mode: str = "risk"
+
+class BulkJobResponse(StreamingResponse):
+    """
+    Frees the bulk job slot when the response ends, however it ends: body
+    streamed, client gone mid-stream, or gone before the body started (the
+    body generator's own `finally` never runs if it was never started).
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            bulk_jobs.release()
+
+def _busy(retry_after: int, detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=503, detail=detail, headers={"Retry-After": str(retry_after)}
+    )
+
+def _diagnosis_key(contents: bytes, explain: bool = False, use_ensemble: bool = False) -> str:
+    if use_ensemble:
+        return make_key(contents, ensemble.MODEL_ID, ensemble.MODEL_VERSION)
+    if explain:
+        # Heatmaps come from the full DenseNet, never from the cascade's screener
+        return make_key(contents, f"{chexnet_model.MODEL_ID}+cam", chexnet_model.MODEL_VERSION)
+    if CASCADE_ENABLED:
+        return make_key(contents, chexnet_cascade.model_id, chexnet_cascade.model_version)
+    return make_key(contents, chexnet_model.MODEL_ID, chexnet_model.MODEL_VERSION)
+
+async def _explain(diagnosis: str):
+    # Table lookup only: a label it lacks is generated in the background and
+    # this response goes out without an explanation instead of waiting on it
+    try:
+        return explanation_store.peek(diagnosis)
+    except Exception as e:
+        logger.warning(f"Explanation unavailable for {diagnosis}: {e}")
+        return None
+
+@app.on_event("startup")
+async def warmup_models():
+    if EXPLAIN_PREFETCH:
+        explanation_store.prefetch(ensemble.LABELS)
+    # Models load lazily on first request unless WARMUP_MODELS names them
+    if registry.WARMUP_MODELS:
+        # In this process: the batchers that serve requests live here
+        await run_in_threadpool(registry.warmup, registry.WARMUP_MODELS)
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    executor.shutdown()
+
 @app.get("/")
 def root():
     return {"message": "Welcome to the 🩺 Autonomous AI Medical Assistant API!"}
 
 @app.post("/diagnose")
-async def diagnose(file: UploadFile = File(...)):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+async def diagnose(background_tasks: BackgroundTasks, file: UploadFile = File(...),
+                   explain: bool = False, use_ensemble: bool = Query(False, alias="ensemble")):
+    """
+    Diagnose one X-ray. With `?explain=true` the response also carries
+    `heatmaps`: class-activation overlays for the top labels (GET their `url`).
+    With `?ensemble=true` CheXNet and ViT run side by side on one decode and
+    the response adds each model's answer (`models`) and timings (`timing_ms`).
+    """
+    if explain and use_ensemble:
+        raise HTTPException(status_code=400, detail="explain and ensemble can't be combined")
+    timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
     filename = file.filename
 
-    contents = await file.read()
-    file_path = f"data/uploads/{filename}"
-    os.makedirs("data/uploads", exist_ok=True)
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    with span("upload_read", "fastapi"):
+        contents = await file.read()
+
+    # Off the event loop: the cascade's identity includes the screener's weights hash
+    cache_key = await run_in_threadpool(_diagnosis_key, contents, explain, use_ensemble)
+    result = await run_in_threadpool(result_cache.get, cache_key)
+    if result is not None and explain and not heatmap_store.has(result):
+        result = None  # overlays were deleted from disk, render them again
+
+    try:
+        if result is None:
+            async with executor.slot():
+                if use_ensemble:
+                    # Decodes once, then runs both models at the same time
+                    result = await executor.run(ensemble.diagnose_bytes, contents)
+                else:
+                    # Decode straight from the request buffer, no disk round trip
+                    input_tensor = await executor.run(chexnet_model.preprocess_bytes, contents)
+                    if explain:
+                        result = await asyncio.wrap_future(explain_batcher.submit(input_tensor))
+                        result = await run_in_threadpool(
+                            heatmap_store.attach, cache_key.rsplit(":", 1)[-1],
+                            chexnet_model.MODEL_VERSION, input_tensor, result
+                        )
+                    else:
+                        result = await asyncio.wrap_future(diagnosis_batcher.submit(input_tensor))
+            # Timings describe this request only
+            await run_in_threadpool(result_cache.put, cache_key, {k: v for k, v in result.items() if k != "timing_ms"})
+    except UnidentifiedImageError:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    except Overloaded as e:
+        raise _busy(e.retry_after, str(e))
+    except queue.Full:
+        raise _busy(executor.retry_after, "Inference queue is full, retry shortly.")
+
+    # Image hash is the last part of the cache key
+    digest = cache_key.rsplit(":", 1)[-1]
+    file_path = upload_store.path(digest) if SAVE_UPLOADS else None
+    if file_path:
+        # Runs after the response has been sent; identical studies are stored once
+        background_tasks.add_task(upload_store.put, contents, filename, digest)
 
-    result = diagnose_image(file_path)
     record = {
         "filename": filename,
         "diagnosis": result["diagnosis"],
         "confidence": result["confidence"],
         "timestamp": timestamp,
         "image_path": file_path,
+        "image_hash": digest,
     }
-    diagnosis_log.append(record)
-    return record
+    log_store.append(record, source="fastapi")
+    response = {**record, "explanation": await _explain(result["diagnosis"])}
+    if explain:
+        response["heatmaps"] = result["heatmaps"]
+    if use_ensemble:
+        response["models"] = result["models"]
+        response["timing_ms"] = result.get("timing_ms", {"cached": True})
+    return response
+
+@app.get("/heatmaps/{digest}/{name}")
+def get_heatmap(digest: str, name: str):
+    path = heatmap_store.path(digest, name)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Heatmap not found")
+    # Content-addressed: a given URL never changes
+    return FileResponse(path, media_type="image/png", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/uploads/{digest}")
+def get_upload(digest: str):
+    """A stored upload by its sha256 (the `image_hash` in the diagnosis log)."""
+    entry = upload_store.lookup(digest) if re.fullmatch(r"[0-9a-f]{64}", digest) else None
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Upload not found (never stored, or evicted)")
+    media_type = mimetypes.guess_type(entry["filename"] or "")[0] or "application/octet-stream"
+    return FileResponse(entry["path"], media_type=media_type)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/batching-stats")
+def batching_stats():
+    stats = {**diagnosis_batcher.stats(), "executor": executor.stats()}
+    if CASCADE_ENABLED:
+        stats["cascade"] = chexnet_cascade.stats()
+    return stats
+
+@app.post("/diagnose-bulk")
+def diagnose_bulk(files: List[UploadFile] = File(...), format: str = "ndjson"):
+    """
+    Score many X-rays in one request. Accepts several image files and/or zip
+    archives of images and streams one result per image as NDJSON or CSV.
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    if not bulk_jobs.acquire(blocking=False):
+        raise _busy(executor.retry_after, "A bulk job is already running, retry later.")
+
+    # Read the raw uploads now (the files are closed once this handler
+    # returns); archives stay compressed and are unpacked one image at a time
+    # as scoring pulls them
+    try:
+        raw = [(file.filename, file.file.read()) for file in files]
+    except Exception:
+        bulk_jobs.release()
+        raise
+
+    def uploads():
+        for name, contents in raw:
+            if zipfile.is_zipfile(io.BytesIO(contents)):
+                yield from bulk.iter_zip(contents)
+            else:
+                yield name, contents
+
+    def results():
+        timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+        for result in bulk.score_stream(uploads()):
+            if "error" not in result:
+                log_store.append({**result, "timestamp": timestamp, "image_path": None}, source="bulk")
+            yield result
+
+    if format == "csv":
+        return BulkJobResponse(bulk.to_csv(results()), media_type="text/csv")
+    return BulkJobResponse(bulk.to_ndjson(results()), media_type="application/x-ndjson")
+
+@app.get("/cache-stats")
+def cache_stats():
+    return {
+        "diagnosis": result_cache.stats(),
+        "consult": consult_cache.stats(),
+        "explanations": explanation_store.stats(),
+    }
+
+@app.get("/models")
+def model_status():
+    return registry.stats()
 
 @app.get("/diagnosis-log")
-def get_diagnosis_log():
-    return {"log": diagnosis_log}
+def get_diagnosis_log(
+    cursor: Optional[int] = None,
+    limit: int = Query(LOG_PAGE_SIZE, ge=1, le=1000),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    diagnosis: Optional[str] = None,
+):
+    try:
+        log, next_cursor = log_store.query(
+            start=start, end=end, diagnosis=diagnosis, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time range: {e}")
+    return {"log": log, "next_cursor": next_cursor}
 
 @app.post("/consult")
 def consult(input: SymptomsInput):
-    output = consult_symptoms(input.symptoms)
+    try:
+        output = consult_symptoms(input.symptoms)
+    except LLMDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=f"Consultation timed out: {e}")
+    except LLMError as e:
+        raise HTTPException(status_code=502, detail=f"Consultation unavailable: {e}")
     return {"consultation": output}
 
+@app.post("/consult/stream")
+async def consult_stream(input: SymptomsInput):
+    """Stream the consultation as Server-Sent Events: `data: {"delta": ...}` then `event: done`."""
+    async def events():
+        try:
+            async for delta in stream_consultation(input.symptoms):
+                yield format_event({"delta": delta})
+        except Exception as e:
+            yield format_event({"error": str(e)}, event="error")
+            return
+        yield format_event({}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/check-drug-safety")
+def check_drug_safety(input: DrugSafetyInput):
+    """Risk for every pair in a medication list, from the precomputed GNN risk matrix."""
+    medications = [*input.drug_ids, *input.drugs]
+    if len(medications) < 2:
+        raise HTTPException(status_code=400, detail="Provide at least two medications")
+    try:
+        return get_drug_safety_index().check(medications)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/drug-partners")
+def drug_partners(input: DrugPartnersInput):
+    """Top-k riskiest (or most similar) other drugs for one drug or a medication list."""
+    medications = [*input.drug_ids, *input.drugs]
+    if not medications:
+        raise HTTPException(status_code=400, detail="Provide at least one medication")
+    if input.mode not in ("risk", "similar") or not 1 <= input.k <= 100:
+        raise HTTPException(status_code=400, detail="mode must be 'risk' or 'similar' and k in 1..100")
+    index = get_embedding_index()
+    try:
+        if input.mode == "risk":
+            partners = index.riskiest(medications, k=input.k)
+        else:
+            partners = index.nearest(medications, k=input.k)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"partners": partners, "mode": input.mode}
+
 @app.delete("/delete-diagnoses")
 def delete_diagnoses():
-    diagnosis_log.clear()
+    log_store.clear()
     return {"status": "cleared"}
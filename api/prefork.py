@@ -0,0 +1,247 @@
+# api/prefork.py
+#
+# Pre-fork serving: load the models once, then fork uvicorn workers that
+# share the weights instead of each holding their own copy.
+#
+#   python -m api.prefork --workers 4 --port 8000
+#   python -m api.prefork --app api_flask:app --interface wsgi --port 5000
+#
+# The master process:
+#   1. builds the models through vision.models.registry with one torch
+#      thread, so no OpenMP thread pool exists when it forks,
+#   2. moves every parameter and buffer into shared memory (share_memory())
+#      so forked workers map the same physical pages,
+#   3. runs gc.freeze() so the garbage collector never touches (and so
+#      never copies) the objects created before the fork,
+#   4. binds the listening socket and forks the workers, restarting any
+#      that exit.
+# Each worker sets its own intra-op thread count (cores / workers by
+# default), imports the app and serves from the shared socket. Per-worker
+# unique memory (USS) is logged at startup and exported on /metrics.
+
+import os
+import gc
+import sys
+import time
+import socket
+import signal
+import argparse
+import logging
+
+logger = logging.getLogger("api.prefork")
+
+PREFORK_WORKERS = int(os.getenv("PREFORK_WORKERS", 2))
+# Models to load in the master; anything else loads lazily per worker
+PREFORK_MODELS = [m.strip() for m in os.getenv("PREFORK_MODELS", "chexnet,chexnet_runner,vit").split(",") if m.strip()]
+# Intra-op threads per worker; 0 = cpu_count // workers
+PREFORK_THREADS = int(os.getenv("PREFORK_THREADS", 0))
+# Seconds after startup at which worker memory is reported
+PREFORK_REPORT_DELAY = float(os.getenv("PREFORK_REPORT_DELAY", 10))
+
+
+def threads_per_worker(workers: int) -> int:
+    return PREFORK_THREADS or max(1, (os.cpu_count() or 1) // workers)
+
+
+def _module_of(model):
+    """The torch module holding a model's weights: the model, or a backend runner's `module`."""
+    import torch
+
+    if isinstance(model, torch.nn.Module):
+        return model
+    module = getattr(model, "module", None)
+    return module if isinstance(module, torch.nn.Module) else None
+
+
+def load_shared_models(names: list):
+    """
+    Build models in this process and move their tensors to shared memory.
+    Returns ({name: (bytes, name of the model whose weights it uses)}, [names not shared]).
+    """
+    import torch
+    from vision.models import registry, backends
+
+    skipped = []
+    if backends.INFERENCE_BACKEND == "onnx" and "chexnet_runner" in names:
+        # onnxruntime sessions own native thread pools that don't survive fork
+        logger.warning("INFERENCE_BACKEND=onnx: chexnet_runner will be built in each worker instead")
+        names = [name for name in names if name != "chexnet_runner"]
+        skipped.append("chexnet_runner")
+
+    # No intra-op thread pool in the master: forking after OpenMP has
+    # started its threads can deadlock the children.
+    torch.set_num_threads(1)
+
+    shared = {}
+    owners = {}  # id(module) -> first model name that uses it
+    for name in names:
+        module = _module_of(registry.get_model(name))
+        if module is None:
+            logger.warning(f"'{name}' holds no torch module to share; workers only get copy-on-write pages")
+            skipped.append(name)
+            continue
+        module.eval()
+        for param in module.parameters():
+            param.requires_grad_(False)
+        try:
+            # Also after an earlier share of the same module: building a
+            # runner can replace its tensors (e.g. channels-last conversion)
+            module.share_memory()
+        except Exception as e:
+            # e.g. packed int8 weights: still shared copy-on-write, just not pinned
+            logger.warning(f"Could not move '{name}' to shared memory ({e}); relying on copy-on-write")
+        owner = owners.setdefault(id(module), name)
+        size = sum(t.numel() * t.element_size() for t in module.state_dict().values()
+                   if isinstance(t, torch.Tensor))
+        shared[name] = (size, owner)
+    return shared, skipped
+
+
+def memory_info(pid: int = None) -> dict:
+    """USS / PSS / RSS in MB. USS is what this process alone costs."""
+    import psutil
+
+    info = psutil.Process(pid).memory_full_info()
+    return {
+        "uss_mb": round(info.uss / 2**20, 1),
+        "pss_mb": round(getattr(info, "pss", 0) / 2**20, 1),
+        "rss_mb": round(info.rss / 2**20, 1),
+    }
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(index: int, sock: socket.socket, args):
+    """Body of a forked worker; never returns."""
+    import torch
+    import uvicorn
+    from utils import metrics
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    threads = threads_per_worker(args.workers)
+    torch.set_num_threads(threads)
+    os.environ["PREFORK_WORKER"] = str(index)
+    # The app isn't imported yet, so its decode pool picks up the same share
+    os.environ.setdefault("INFERENCE_WORKERS", str(threads))
+    metrics.register_collector("process", lambda: {
+        "worker": index,
+        "torch_threads": torch.get_num_threads(),
+        **memory_info(),
+    })
+    logger.info(f"Worker {index} (pid {os.getpid()}) serving {args.app} with {threads} torch threads")
+
+    config = uvicorn.Config(args.app, interface=args.interface, log_level=args.log_level,
+                            timeout_keep_alive=args.keep_alive)
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        os._exit(0)
+
+
+class Master:
+    def __init__(self, args, sock: socket.socket):
+        self.args = args
+        self.sock = sock
+        self.workers = {}  # pid -> worker index
+        self.stopping = False
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(index, self.sock, self.args)
+            except BaseException:
+                logger.exception(f"Worker {index} crashed")
+                os._exit(1)
+        self.workers[pid] = index
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report(self):
+        master = memory_info()
+        logger.info(f"Master (pid {os.getpid()}): {master}")
+        for pid, index in sorted(self.workers.items(), key=lambda item: item[1]):
+            try:
+                logger.info(f"Worker {index} (pid {pid}): {memory_info(pid)}")
+            except Exception as e:
+                logger.warning(f"Worker {index} (pid {pid}): memory unavailable ({e})")
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for index in range(self.args.workers):
+            self.spawn(index)
+
+        report_at = time.monotonic() + PREFORK_REPORT_DELAY
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if report_at and time.monotonic() >= report_at:
+                    self.report()
+                    report_at = None
+                time.sleep(0.5)
+                continue
+            index = self.workers.pop(pid, None)
+            if index is not None and not self.stopping:
+                logger.warning(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+                self.spawn(index)
+        logger.info("All workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork server with shared model weights")
+    parser.add_argument("--app", default="api.main:app")
+    parser.add_argument("--interface", default="auto", choices=["auto", "asgi3", "asgi2", "wsgi"])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=PREFORK_WORKERS)
+    parser.add_argument("--models", nargs="*", default=PREFORK_MODELS)
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    started = time.perf_counter()
+    shared, skipped = load_shared_models(args.models)
+    for name, (size, owner) in shared.items():
+        if owner == name:
+            logger.info(f"Shared '{name}': {size / 2**20:.1f} MB of weights")
+        else:
+            logger.info(f"Shared '{name}': same weights as '{owner}'")
+    if skipped:
+        logger.warning(f"Not shared (built or copied per worker): {', '.join(skipped)}")
+    logger.info(f"Models loaded in {time.perf_counter() - started:.1f}s; "
+                f"{args.workers} workers x {threads_per_worker(args.workers)} torch threads")
+
+    # Everything allocated so far is permanent: keep the collector from
+    # writing to those objects' headers (and dirtying their pages) later.
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(args.host, args.port)
+    logger.info(f"Listening on {args.host}:{args.port}")
+    Master(args, sock).run()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,171 @@
 # api_flask.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
-from vision.models.vit_dummy import diagnose_image as vit_diagnose_image
+from vision.models.vit_dummy import diagnose_bytes as vit_diagnose_bytes
+from vision.models import registry, vit_dummy
+from vision.models.cascade import vit_cascade, CASCADE_ENABLED
+from vision.models import ensemble
+from vision.models.result_cache import result_cache, make_key
 from PIL import UnidentifiedImageError
+from concurrent.futures import ThreadPoolExecutor
+from data.log_store import get_log_store, TIMESTAMP_FORMAT
+from data.upload_store import get_upload_store
+from utils.explanation_store import explanation_store, EXPLAIN_PREFETCH
+from utils import metrics
+from utils.metrics import span
 from datetime import datetime
 import os
-import pandas as pd
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all domains and routes
 
 # Ensure necessary folders and files
 os.makedirs("data", exist_ok=True)
-log_path = os.path.join("data", "diagnosis_log.csv")
-if not os.path.exists(log_path):
-    df = pd.DataFrame(columns=["timestamp", "diagnosis", "confidence", "image_path"])
-    df.to_csv(log_path, index=False)
+log_store = get_log_store()
+
+# Keep a copy of each upload on disk, written off the request path,
+# content-addressed and size-budgeted (see data.upload_store)
+SAVE_UPLOADS = os.getenv("SAVE_UPLOADS", "1") == "1"
+upload_store = get_upload_store()
+upload_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-writer")
+# Uploads handed to the writer and not started yet
+upload_queue = {"depth": 0}
+upload_queue_lock = threading.Lock()
+
+def queue_upload(contents, filename, digest):
+    with upload_queue_lock:
+        upload_queue["depth"] += 1
+    upload_writer.submit(save_upload, contents, filename, digest)
+
+def save_upload(contents, filename, digest):
+    with upload_queue_lock:
+        upload_queue["depth"] -= 1
+    stored = upload_store.put(contents, filename, digest)
+    if not stored["deduplicated"]:
+        logger.debug(f"Saved upload to {stored['path']}")
+
+# Scraped by /metrics; read from the live objects at scrape time
+metrics.register_collector("log_store", log_store.stats)
+metrics.register_collector("uploads", upload_store.stats)
+metrics.register_collector("cache_diagnosis", result_cache.stats)
+metrics.register_collector("cache_explanations", explanation_store.stats)
+metrics.register_collector("models", registry.stats)
+if CASCADE_ENABLED:
+    metrics.register_collector("cascade", vit_cascade.stats)
+metrics.register_collector("upload_writer", lambda: {"queue_depth": upload_queue["depth"]})
+
+# Labels missing from the explanation table are generated in the background
+if EXPLAIN_PREFETCH:
+    explanation_store.prefetch(ensemble.LABELS)
+
+@app.before_request
+def start_request_timer():
+    g.started = time.perf_counter()
+    metrics.inflight_requests.inc(server="flask")
+
+@app.after_request
+def record_request_metrics(response):
+    # Route template, not the raw path, to keep label cardinality bounded
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.observe_request("flask", endpoint, request.method, response.status_code,
+                            time.perf_counter() - g.started)
+    return response
+
+@app.teardown_request
+def end_request(exc):
+    metrics.inflight_requests.dec(server="flask")
+
+# Models load lazily on first request unless WARMUP_MODELS names them
+if registry.WARMUP_MODELS:
+    registry.warmup(registry.WARMUP_MODELS)
 
 @app.route("/diagnose", methods=["POST"])
 def diagnose():
-    print("🔔 Diagnose endpoint hit.")
-
     if "file" not in request.files:
-        print("❌ No file found in request.")
+        logger.debug("Diagnose request without a file")
         return jsonify({"error": "No file uploaded"}), 400
 
     file = request.files["file"]
-    print(f"📸 Received file: {file.filename}")
+    logger.debug(f"Diagnosing {file.filename}")
 
     try:
-        # Auto timestamp image saves
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        image_path = os.path.join("data", f"xray_{timestamp}.png")
-        file.save(image_path)
-        print(f"💾 Saved file to: {image_path}")
-
-        # Run diagnosis using cached model
-        result = vit_diagnose_image(image_path)
-
-        # Save result to CSV log
-        new_row = pd.DataFrame({
-            "timestamp": [timestamp],
-            "diagnosis": [result["diagnosis"]],
-            "confidence": [result["confidence"]],
-            "image_path": [image_path]
-        })
-        log_df = pd.read_csv(log_path)
-        log_df = pd.concat([log_df, new_row], ignore_index=True)
-        log_df.to_csv(log_path, index=False)
-
-        print(f"✅ Diagnosis completed and saved: {result}")
+        timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+        with span("upload_read", "flask"):
+            contents = file.read()
+
+        # Run diagnosis using cached model, decoding from the upload buffer.
+        # Repeat uploads of the same study are served from the result cache.
+        # With CASCADE_ENABLED=1 a screening model answers clearly normal studies
+        # and only the rest go through ViT. ?ensemble=true runs CheXNet and ViT
+        # side by side on one decode and fuses them.
+        use_ensemble = request.args.get("ensemble", "").lower() in ("1", "true")
+        if use_ensemble:
+            cache_key = make_key(contents, ensemble.MODEL_ID, ensemble.MODEL_VERSION)
+        elif CASCADE_ENABLED:
+            cache_key = make_key(contents, vit_cascade.model_id, vit_cascade.model_version)
+        else:
+            cache_key = make_key(contents, vit_dummy.MODEL_ID, vit_dummy.MODEL_VERSION)
+        result = result_cache.get(cache_key)
+        if result is None:
+            if use_ensemble:
+                result = ensemble.get_ensemble().diagnose_bytes(contents)
+            elif CASCADE_ENABLED:
+                result = vit_cascade.diagnose_bytes(contents)
+            else:
+                result = vit_diagnose_bytes(contents)
+            # Timings describe this request only
+            result_cache.put(cache_key, {k: v for k, v in result.items() if k != "timing_ms"})
+        # Stored under its hash (the last part of the cache key), so
+        # concurrent or repeated uploads never clobber each other
+        digest = cache_key.rsplit(":", 1)[-1]
+        image_path = upload_store.path(digest) if SAVE_UPLOADS else None
+        if image_path:
+            queue_upload(contents, file.filename, digest)
+
+        # Precomputed explanation; unknown labels are generated in the
+        # background and this response goes out without one
+        try:
+            explanation = explanation_store.peek(result["diagnosis"])
+        except Exception as e:
+            logger.warning(f"Explanation unavailable for {result['diagnosis']}: {e}")
+            explanation = None
+        result = {**result, "explanation": explanation}
+
+        # Append result to the diagnosis log (written in the background)
+        log_store.append({
+            "timestamp": timestamp,
+            "filename": file.filename,
+            "diagnosis": result["diagnosis"],
+            "confidence": result["confidence"],
+            "image_path": image_path,
+            "image_hash": digest,
+        }, source="flask")
+
+        logger.debug(f"Diagnosis for {file.filename}: {result['diagnosis']} ({result['confidence']})")
         return jsonify(result)
 
     except UnidentifiedImageError as e:
-        print(f"❌ PIL Error: {e}")
+        logger.debug(f"Invalid image {file.filename}: {e}")
         return jsonify({"error": "Invalid image file"}), 400
 
     except Exception as e:
-        print(f"🔥 Unexpected Error: {e}")
+        logger.exception(f"Diagnosis failed for {file.filename}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route("/cache-stats", methods=["GET"])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
 if __name__ == "__main__":
-    print("🚀 Starting Flask server...")
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Starting Flask server")
     app.run(debug=True)
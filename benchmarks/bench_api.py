@@ -0,0 +1,60 @@
+# benchmarks/bench_api.py
+#
+# FastAPI endpoints in-process (fastapi.testclient, no network), with
+# `concurrency` client threads: /diagnose with distinct uploads so the
+# result cache misses, /consult with distinct and repeated symptoms (cache
+# misses vs hits, against the stubbed OpenAI client) and /check-drug-safety.
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import summarize, sample_images
+
+
+def _load(fn, payloads: list, concurrency: int) -> dict:
+    def call(payload):
+        started = time.perf_counter()
+        response = fn(payload)
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(call, payloads))
+    elapsed = time.perf_counter() - started
+
+    errors = sum(status >= 400 for _, status in outcomes)
+    return {
+        "requests_per_sec": round(len(payloads) / elapsed, 2),
+        "errors": errors,
+        **summarize([seconds for seconds, _ in outcomes]),
+    }
+
+
+def run(requests: int, concurrency: int) -> dict:
+    from fastapi.testclient import TestClient
+    from api.main import app
+
+    # One extra image for the warm-up, so no measured upload starts as a cache hit
+    warmup_image, *images = sample_images(requests + 1)
+    symptoms = [f"fever and dry cough for {i} days" for i in range(requests)]
+
+    with TestClient(app) as client:
+        # One request first so model loading isn't counted as latency
+        client.post("/diagnose", files={"file": ("warmup.png", warmup_image, "image/png")})
+
+        return {
+            "diagnose": _load(
+                lambda data: client.post("/diagnose", files={"file": ("xray.png", data, "image/png")}),
+                images, concurrency,
+            ),
+            "consult_miss": _load(
+                lambda text: client.post("/consult", json={"symptoms": text}), symptoms, concurrency
+            ),
+            "consult_hit": _load(
+                lambda text: client.post("/consult", json={"symptoms": text}), symptoms, concurrency
+            ),
+            "check_drug_safety": _load(
+                lambda _: client.post("/check-drug-safety", json={"drugs": ["Aspirin", "Warfarin", "Ibuprofen"]}),
+                range(requests), concurrency,
+            ),
+        }
@@ -0,0 +1,91 @@
+# benchmarks/bench_gnn.py
+#
+# DrugGNN scoring: the full-graph forward pass, /check-drug-safety lookups
+# and embedding-index queries, with a randomly initialized model. The
+# embedding index is also measured on a synthetic table of `scale_drugs`
+# drugs, exact and IVF.
+
+import os
+import time
+import tempfile
+
+import numpy as np
+import torch
+
+from benchmarks.common import summarize, timed
+from data.drugs_graph import load_drug_graph
+from gnn.models.gnn_model import DrugGNN
+from gnn.drug_safety import DrugSafetyIndex, LINK_PREDICTION
+from gnn.embedding_index import DrugEmbeddingIndex, compute_embeddings
+
+
+def _random_model_file(in_feats, hidden=16, out=16) -> str:
+    torch.manual_seed(0)
+    path = os.path.join(tempfile.mkdtemp(prefix="gnn-bench-"), "gnn_model.pt")
+    torch.save({"model": DrugGNN(in_feats, hidden, out).state_dict(), "objective": LINK_PREDICTION}, path)
+    return path
+
+
+def run(repeats: int, scale_drugs: int) -> dict:
+    graph, drugs = load_drug_graph()
+    features = graph.ndata["feat"]
+    model_path = _random_model_file(features.shape[1])
+    no_features = os.path.join(os.path.dirname(model_path), "missing.pt")
+
+    model = DrugGNN(features.shape[1], 16, 16).eval()
+
+    def forward():
+        with torch.no_grad():
+            model(graph, features)
+
+    started = time.perf_counter()
+    safety = DrugSafetyIndex(model_path=model_path, features_path=no_features)
+    safety_build_s = time.perf_counter() - started
+
+    results = {
+        "graph": {"drugs": graph.num_nodes(), "edges": graph.num_edges()},
+        "forward_full_graph": summarize(timed(forward, repeats)),
+        "drug_safety": {"build_s": round(safety_build_s, 3)},
+    }
+    for size in (2, 5, 10):
+        medications = drugs[:min(size, len(drugs))]
+        results["drug_safety"][f"check_{size}"] = summarize(
+            timed(lambda: safety.check(medications), repeats * 10)
+        )
+
+    names, hidden, output = compute_embeddings(model_path, no_features)
+    index = DrugEmbeddingIndex(hidden.shape[1], output.shape[1])
+    index.add(names, hidden, output)
+    results["embedding_index"] = {
+        "riskiest_top10": summarize(timed(lambda: index.riskiest(names[:1], k=10), repeats * 10)),
+        "nearest_top10": summarize(timed(lambda: index.nearest(names[:1], k=10), repeats * 10)),
+    }
+
+    results["embedding_index_scaled"] = _scaled_index(scale_drugs, repeats)
+    return results
+
+
+def _scaled_index(num_drugs: int, repeats: int) -> dict:
+    rng = np.random.default_rng(0)
+    names = [f"drug-{i}" for i in range(num_drugs)]
+    hidden = rng.standard_normal((num_drugs, 16), dtype=np.float32)
+    output = rng.standard_normal((num_drugs, 16), dtype=np.float32)
+
+    results = {"drugs": num_drugs}
+    exact_top = None
+    for mode, approximate in (("exact", False), ("ivf", True)):
+        started = time.perf_counter()
+        index = DrugEmbeddingIndex(16, 16, approximate=approximate)
+        index.add(names, hidden, output)
+        build_s = time.perf_counter() - started
+
+        top = {p["drug"] for p in index.riskiest(names[:3], k=10)}
+        results[mode] = {
+            "build_s": round(build_s, 3),
+            "riskiest_top10": summarize(timed(lambda: index.riskiest(names[:3], k=10), repeats * 10)),
+        }
+        if exact_top is None:
+            exact_top = top
+        else:
+            results[mode]["recall_at_10"] = round(len(top & exact_top) / max(len(exact_top), 1), 3)
+    return results
@@ -0,0 +1,111 @@
+# benchmarks/bench_vision.py
+#
+# CheXNet and ViT: per-stage latency for one image, then images/sec for
+# whole batches at several batch sizes and torch thread counts.
+
+import time
+
+import torch
+
+from benchmarks.common import summarize, timed, sample_images
+from vision.models import chexnet_model, vit_dummy
+from vision.models.preprocess import open_image, load_gray, to_batch, TARGET_SIZE
+
+
+def _decode(data: bytes):
+    # The decode half of preprocess.load_gray: bytes -> grayscale PIL image
+    image = open_image(data)
+    if image.format == "JPEG":
+        image.draft("L", (TARGET_SIZE * 2, TARGET_SIZE * 2))
+    image = image.convert("L")
+    image.load()
+    return image
+
+
+MODELS = {
+    "chexnet": {
+        "model": chexnet_model.get_runner,
+        "prepare": chexnet_model.prepare_batch,
+        "postprocess": lambda output: [chexnet_model._postprocess(p) for p in torch.sigmoid(output)],
+    },
+    "vit": {
+        "model": vit_dummy.get_model,
+        "prepare": to_batch,
+        "postprocess": lambda output: [
+            vit_dummy.CLASSES[i % len(vit_dummy.CLASSES)] for i in output.argmax(dim=1).tolist()
+        ],
+    },
+}
+
+
+def stage_latency(name: str, image: bytes, repeats: int) -> dict:
+    spec = MODELS[name]
+    model = spec["model"]()
+    decoded = _decode(image)
+    gray = load_gray(decoded)
+    batch = spec["prepare"]([gray])
+    with torch.no_grad():
+        output = model(batch)
+
+    def forward():
+        with torch.no_grad():
+            model(batch)
+
+    return {
+        "decode": summarize(timed(lambda: _decode(image), repeats)),
+        # Resize of an already-decoded image, plus batch normalization
+        "preprocess": summarize(timed(lambda: spec["prepare"]([load_gray(decoded)]), repeats)),
+        "forward": summarize(timed(forward, repeats)),
+        "postprocess": summarize(timed(lambda: spec["postprocess"](output), repeats)),
+        "end_to_end": summarize(timed(lambda: _end_to_end(name, image), repeats)),
+    }
+
+
+def _end_to_end(name, image):
+    if name == "chexnet":
+        return chexnet_model.diagnose_bytes(image)
+    return vit_dummy.diagnose_bytes(image)
+
+
+def throughput(name: str, images: list, batch_sizes: list, threads: list, repeats: int) -> dict:
+    """
+    images/sec for batch normalization + forward + postprocess over already
+    decoded images (decode cost is per image and measured in `stage_latency`).
+    """
+    spec = MODELS[name]
+    model = spec["model"]()
+    grays = [load_gray(image) for image in images]
+    default_threads = torch.get_num_threads()
+    results = {}
+
+    for num_threads in threads:
+        torch.set_num_threads(num_threads)
+        for batch_size in batch_sizes:
+            chunk = grays[:batch_size]
+
+            def run():
+                with torch.no_grad():
+                    spec["postprocess"](model(spec["prepare"](chunk)))
+
+            samples = timed(run, repeats)
+            results.setdefault(f"threads_{num_threads}", {})[f"batch_{batch_size}"] = {
+                "images_per_sec": round(batch_size * len(samples) / sum(samples), 2),
+                **summarize(samples),
+            }
+    torch.set_num_threads(default_threads)
+    return results
+
+
+def run(models: list, batch_sizes: list, threads: list, repeats: int) -> dict:
+    images = sample_images(max(batch_sizes))
+    results = {}
+    for name in models:
+        started = time.perf_counter()
+        MODELS[name]["model"]()
+        load_seconds = time.perf_counter() - started
+        results[name] = {
+            "load_s": round(load_seconds, 3),
+            "stages": stage_latency(name, images[0], repeats),
+            "throughput": throughput(name, images, batch_sizes, threads, repeats),
+        }
+    return results
@@ -0,0 +1,181 @@
+# benchmarks/common.py
+#
+# Shared helpers for the benchmark suite: timing and percentiles, peak RSS,
+# synthetic X-rays, an offline stand-in for the OpenAI client, and result
+# files keyed by git commit.
+
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import platform
+import threading
+import concurrent.futures
+import resource
+import subprocess
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+SAMPLE_IMAGE = os.path.join("data", "samples", "sample_xray.png")
+
+STUB_ANSWER = (
+    "Likely a viral upper respiratory infection. Recommended tests: CBC and chest X-ray. "
+    "Rest, fluids and antipyretics. Please see a doctor if symptoms persist."
+)
+
+
+def summarize(samples: list) -> dict:
+    """Latency percentiles in milliseconds for a list of durations in seconds."""
+    ms = sorted(s * 1000 for s in samples)
+    if not ms:
+        return {"n": 0}
+
+    def pct(p):
+        return round(ms[min(len(ms) - 1, int(round(p / 100 * (len(ms) - 1))))], 3)
+
+    return {
+        "n": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 3),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def timed(fn, repeats: int, warmup: int = 1) -> list:
+    """Call `fn()` `warmup` times untimed, then `repeats` times; returns durations."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def sample_images(count: int, size: int = 1024) -> list:
+    """
+    `count` distinct PNG-encoded X-rays. Each one differs by a few pixels so
+    content-hash caches miss, the way they would for real uploads.
+    """
+    import numpy as np
+    from PIL import Image
+
+    if os.path.exists(SAMPLE_IMAGE):
+        base = np.array(Image.open(SAMPLE_IMAGE).convert("L").resize((size, size)), dtype=np.uint8)
+    else:
+        base = np.random.default_rng(0).integers(0, 256, (size, size), dtype=np.uint8)
+
+    rng = np.random.default_rng(1)
+    images = []
+    for _ in range(count):
+        pixels = base.copy()
+        pixels[rng.integers(0, size, 8), rng.integers(0, size, 8)] = rng.integers(0, 256, 8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="PNG")
+        images.append(buffer.getvalue())
+    return images
+
+
+class _StubGateway:
+    """Offline stand-in for utils.llm_gateway.LLMGateway."""
+
+    def __init__(self, latency_s):
+        self.latency_s = latency_s
+        self.calls = 0
+
+    def complete(self, messages, component="", **params):
+        self.calls += 1
+        time.sleep(self.latency_s)
+        return STUB_ANSWER
+
+    async def acomplete(self, messages, component="", **params):
+        self.calls += 1
+        await asyncio.sleep(self.latency_s)
+        return STUB_ANSWER
+
+    def submit(self, messages, component="", **params):
+        self.calls += 1
+        future = concurrent.futures.Future()
+        threading.Timer(self.latency_s, future.set_result, (STUB_ANSWER,)).start()
+        return future
+
+    async def astream(self, messages, component="", **params):
+        self.calls += 1
+        words = STUB_ANSWER.split(" ")
+        for word in words:
+            await asyncio.sleep(self.latency_s / len(words))
+            yield word + " "
+
+    def stats(self) -> dict:
+        return {"calls": self.calls}
+
+
+def install_stub_openai(latency_ms: float = 200.0):
+    """
+    Replace the process-wide LLM gateway (used by utils.medical_agent and
+    utils.explainer) with an offline fake that answers after a fixed delay,
+    so runs need no network or API key. Returns the fake; its `.calls`
+    counts upstream calls.
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    from utils import llm_gateway
+
+    stub = _StubGateway(latency_ms / 1000)
+    llm_gateway._gateway = stub
+    return stub
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True
+        ).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment() -> dict:
+    import torch
+
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(results: dict, path: str = None) -> str:
+    """Write results to `path` (default benchmarks/results/<commit>.json)."""
+    path = path or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    return path
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """{"a": {"b": 1}} -> {"a.b": 1}, numeric leaves only."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
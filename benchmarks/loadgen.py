@@ -0,0 +1,257 @@
+# benchmarks/loadgen.py
+#
+# Open-loop load generator for the FastAPI and Flask servers.
+#
+#   python -m benchmarks.mock_openai --port 9000 &
+#   OPENAI_BASE_URL=http://localhost:9000/v1 OPENAI_API_KEY=mock uvicorn api.main:app --port 8000 &
+#   OPENAI_BASE_URL=http://localhost:9000/v1 OPENAI_API_KEY=mock python api_flask.py &
+#   python -m benchmarks.loadgen --rps 5 10 20 40 --duration 30
+#
+# Requests are sent on a Poisson schedule at each target rate, independent
+# of how fast responses come back, so queueing shows up as latency and
+# errors instead of silently lowering the offered load. Each step reports
+# throughput, p50/p95/p99 and error rate per scenario. Stepping stops at the
+# first saturated step (throughput well below target, or too many errors).
+#
+# Every /diagnose upload is a distinct file by default (a PNG of one of the
+# sample X-rays with a unique text chunk), so the result cache misses and
+# the saturation point measures inference. --image-repeat-ratio sends that
+# share of uploads as exact repeats instead; the report records the mode.
+# Streamed consultations count as failed when the stream carries an
+# `error` event or ends without `done`, even though the status is 200.
+
+import sys
+import json
+import time
+import zlib
+import struct
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.common import summarize, sample_images, git_commit, write_results
+from utils.sse import iter_events
+
+DEFAULT_MIX = "diagnose=4,consult=3,consult_stream=1,drug_safety=2,flask_diagnose=2"
+
+# Mostly distinct complaints, with some repeats so the consult cache sees
+# a realistic hit rate
+SYMPTOMS = [
+    "fever and dry cough for three days", "sore throat and runny nose", "chest pain when breathing",
+    "shortness of breath at night", "headache and stiff neck", "persistent cough with green sputum",
+    "wheezing after exercise", "fatigue and night sweats",
+]
+DRUG_LISTS = [
+    ["Aspirin", "Warfarin"], ["Ibuprofen", "Warfarin", "Aspirin"], ["Metformin", "Atorvastatin"],
+    ["Azithromycin", "Ciprofloxacin", "Prednisone"], ["Lisinopril", "Omeprazole", "Levothyroxine"],
+]
+
+
+class StreamFailed(Exception):
+    """An SSE response that returned 200 but reported an error (or was cut short)."""
+
+
+def tag_png(png: bytes, tag: str) -> bytes:
+    """The same image with a tEXt chunk added: identical pixels, different bytes (and hash)."""
+    data = b"loadgen\x00" + tag.encode()
+    chunk = struct.pack(">I", len(data)) + b"tEXt" + data + struct.pack(">I", zlib.crc32(b"tEXt" + data))
+    # The IEND chunk is always the last 12 bytes
+    return png[:-12] + chunk + png[-12:]
+
+
+class Scenarios:
+    def __init__(self, fastapi_url, flask_url, images, repeat_ratio, rng, image_repeat_ratio=0.0):
+        self.fastapi_url = fastapi_url.rstrip("/")
+        self.flask_url = flask_url.rstrip("/") if flask_url else None
+        self.images = images
+        self.repeat_ratio = repeat_ratio
+        self.image_repeat_ratio = image_repeat_ratio
+        self.rng = rng
+        self._serial = 0
+        self._image_serial = 0
+
+    def _image(self) -> bytes:
+        image = self.rng.choice(self.images)
+        if self.rng.random() < self.image_repeat_ratio:
+            return image
+        self._image_serial += 1
+        return tag_png(image, str(self._image_serial))
+
+    def _symptoms(self) -> str:
+        if self.rng.random() < self.repeat_ratio:
+            return self.rng.choice(SYMPTOMS)
+        self._serial += 1
+        return f"{self.rng.choice(SYMPTOMS)}, case {self._serial}"
+
+    async def diagnose(self, client):
+        image = self._image()
+        return await client.post(f"{self.fastapi_url}/diagnose", files={"file": ("xray.png", image, "image/png")})
+
+    async def flask_diagnose(self, client):
+        image = self._image()
+        return await client.post(f"{self.flask_url}/diagnose", files={"file": ("xray.png", image, "image/png")})
+
+    async def consult(self, client):
+        return await client.post(f"{self.fastapi_url}/consult", json={"symptoms": self._symptoms()})
+
+    async def consult_stream(self, client):
+        # Counted as done when the whole stream has arrived
+        async with client.stream("POST", f"{self.fastapi_url}/consult/stream",
+                                 json={"symptoms": self._symptoms()}) as response:
+            lines = [line async for line in response.aiter_lines()]
+        if response.status_code == 200:
+            events = [event for event, _ in iter_events(lines)]
+            if "error" in events:
+                raise StreamFailed("sse_error")
+            if "done" not in events:
+                raise StreamFailed("sse_incomplete")
+        return response
+
+    async def drug_safety(self, client):
+        return await client.post(f"{self.fastapi_url}/check-drug-safety",
+                                 json={"drugs": self.rng.choice(DRUG_LISTS)})
+
+
+def parse_mix(spec: str, has_flask: bool) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.startswith("flask_") and not has_flask:
+            continue
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def run_step(scenarios, mix, rps, duration, max_inflight, timeout, rng) -> dict:
+    names, weights = zip(*mix.items())
+    latencies = defaultdict(list)
+    outcomes = defaultdict(lambda: defaultdict(int))
+    inflight = 0
+    tasks = set()
+
+    async def one(client, name):
+        nonlocal inflight
+        inflight += 1
+        started = time.perf_counter()
+        try:
+            response = await getattr(scenarios, name)(client)
+            outcome = str(response.status_code)
+        except StreamFailed as e:
+            outcome = str(e)
+        except httpx.TimeoutException:
+            outcome = "timeout"
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        finally:
+            inflight -= 1
+        latencies[name].append(time.perf_counter() - started)
+        outcomes[name][outcome] += 1
+
+    limits = httpx.Limits(max_connections=max_inflight, max_keepalive_connections=max_inflight)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        next_at = started
+        while next_at - started < duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            name = rng.choices(names, weights)[0]
+            if inflight >= max_inflight:
+                # The generator itself is the bottleneck; count it, don't block
+                outcomes[name]["client_saturated"] += 1
+            else:
+                task = asyncio.create_task(one(client, name))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            next_at += rng.expovariate(rps)
+        if tasks:
+            await asyncio.wait(tasks)
+        elapsed = time.perf_counter() - started
+
+    scenarios_report = {}
+    total_ok = total = 0
+    for name in names:
+        counts = dict(outcomes[name])
+        sent = sum(counts.values())
+        ok = sum(n for outcome, n in counts.items() if outcome.startswith("2"))
+        total += sent
+        total_ok += ok
+        scenarios_report[name] = {
+            "sent": sent,
+            "ok": ok,
+            "error_rate": round(1 - ok / sent, 4) if sent else 0.0,
+            "outcomes": counts,
+            **summarize(latencies[name]),
+        }
+    return {
+        "target_rps": rps,
+        "achieved_rps": round(total_ok / elapsed, 2),
+        "error_rate": round(1 - total_ok / total, 4) if total else 0.0,
+        "scenarios": scenarios_report,
+    }
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    images = sample_images(args.images)
+    scenarios = Scenarios(args.fastapi_url, args.flask_url, images, args.repeat_ratio, rng,
+                          image_repeat_ratio=args.image_repeat_ratio)
+    image_mode = ("distinct upload per request (result cache misses)" if not args.image_repeat_ratio
+                  else f"{args.image_repeat_ratio:.0%} of uploads repeat one of {args.images} images")
+    print(f"[loadgen] /diagnose images: {image_mode}", file=sys.stderr)
+    mix = parse_mix(args.mix, bool(args.flask_url))
+
+    steps = []
+    saturation_rps = None
+    for rps in args.rps:
+        print(f"[loadgen] {rps} rps for {args.duration}s ...", file=sys.stderr)
+        step = await run_step(scenarios, mix, rps, args.duration, args.max_inflight, args.timeout, rng)
+        steps.append(step)
+        print(f"[loadgen]   achieved {step['achieved_rps']} rps, error rate {step['error_rate']:.2%}", file=sys.stderr)
+        if step["achieved_rps"] < args.saturation_ratio * rps or step["error_rate"] > args.max_error_rate:
+            saturation_rps = rps
+            print(f"[loadgen] saturated at {rps} rps", file=sys.stderr)
+            break
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "diagnose_images": image_mode,
+        "saturation_rps": saturation_rps,
+        "steps": steps,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed-traffic load generator")
+    parser.add_argument("--fastapi-url", default="http://localhost:8000")
+    parser.add_argument("--flask-url", default="http://localhost:5000", help="empty to skip Flask")
+    parser.add_argument("--rps", nargs="+", type=float, default=[5, 10, 20, 40])
+    parser.add_argument("--duration", type=float, default=30, help="seconds per step")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--repeat-ratio", type=float, default=0.3, help="share of repeated symptoms")
+    parser.add_argument("--images", type=int, default=64, help="sample X-rays uploads are made from")
+    parser.add_argument("--image-repeat-ratio", type=float, default=0.0,
+                        help="share of uploads sent as exact repeats (result cache hits)")
+    parser.add_argument("--max-inflight", type=int, default=512)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--saturation-ratio", type=float, default=0.9)
+    parser.add_argument("--max-error-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="default: benchmarks/results/loadgen-<commit>.json")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    path = write_results(results, args.output or f"benchmarks/results/loadgen-{results['commit']}.json")
+    print(json.dumps({"diagnose_images": results["diagnose_images"],
+                      "saturation_rps": results["saturation_rps"],
+                      "steps": [{k: s[k] for k in ("target_rps", "achieved_rps", "error_rate")} for s in results["steps"]]},
+                     indent=2))
+    print(f"[loadgen] results written to {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
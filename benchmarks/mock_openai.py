@@ -0,0 +1,185 @@
+# benchmarks/mock_openai.py
+#
+# Local stand-in for the OpenAI chat-completions API, for load tests without
+# network access or API spend.
+#
+#   python -m benchmarks.mock_openai --port 9000 --latency-ms 800 --sigma 0.5 --error-rate 0.02
+#   OPENAI_BASE_URL=http://localhost:9000/v1 OPENAI_API_KEY=mock uvicorn api.main:app
+#
+# Latency is lognormal around a median; streamed responses spread it over
+# the chunks (time to first token plus a per-token delay). Errors are
+# injected at configurable rates: 500s, 429s with Retry-After, and hangs
+# that exceed the client's timeout.
+
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from itertools import count
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", 800))
+MOCK_LATENCY_SIGMA = float(os.getenv("MOCK_LATENCY_SIGMA", 0.5))
+MOCK_FIRST_TOKEN_MS = float(os.getenv("MOCK_FIRST_TOKEN_MS", 300))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", 0.0))
+MOCK_RATE_LIMIT_RATE = float(os.getenv("MOCK_RATE_LIMIT_RATE", 0.0))
+MOCK_HANG_RATE = float(os.getenv("MOCK_HANG_RATE", 0.0))
+MOCK_HANG_SECONDS = float(os.getenv("MOCK_HANG_SECONDS", 120))
+MOCK_SEED = int(os.getenv("MOCK_SEED", 0))
+
+ANSWER = (
+    "Likely diagnosis: viral upper respiratory infection. Recommended tests: CBC, "
+    "CRP and a chest X-ray if symptoms persist. Initial care: rest, fluids and "
+    "antipyretics as needed. Please see a doctor for a proper examination."
+)
+
+app = FastAPI(title="Mock OpenAI")
+settings = {
+    "latency_ms": MOCK_LATENCY_MS,
+    "sigma": MOCK_LATENCY_SIGMA,
+    "first_token_ms": MOCK_FIRST_TOKEN_MS,
+    "error_rate": MOCK_ERROR_RATE,
+    "rate_limit_rate": MOCK_RATE_LIMIT_RATE,
+    "hang_rate": MOCK_HANG_RATE,
+    "hang_seconds": MOCK_HANG_SECONDS,
+}
+stats = {"requests": 0, "streams": 0, "errors": 0, "rate_limited": 0, "hangs": 0}
+_rng = random.Random(MOCK_SEED)
+_ids = count()
+
+
+def _latency_s() -> float:
+    # Lognormal with the configured median: heavy right tail like the real API
+    return settings["latency_ms"] / 1000 * _rng.lognormvariate(0, settings["sigma"])
+
+
+def _error_response():
+    """An injected failure, or None for a normal response."""
+    roll = _rng.random()
+    if roll < settings["error_rate"]:
+        stats["errors"] += 1
+        return JSONResponse(
+            {"error": {"message": "Injected server error", "type": "server_error"}}, status_code=500
+        )
+    roll -= settings["error_rate"]
+    if roll < settings["rate_limit_rate"]:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"message": "Injected rate limit", "type": "rate_limit_exceeded"}},
+            status_code=429, headers={"Retry-After": "1"},
+        )
+    return None
+
+
+def _completion(model: str, content: str) -> dict:
+    words = content.split()
+    return {
+        "id": f"chatcmpl-mock-{next(_ids)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 60, "completion_tokens": len(words), "total_tokens": 60 + len(words)},
+    }
+
+
+async def _stream(model: str, content: str, total_s: float):
+    completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+    words = content.split(" ")
+    first_token_s = min(settings["first_token_ms"] / 1000, total_s)
+    per_token_s = max(total_s - first_token_s, 0) / max(len(words), 1)
+
+    await asyncio.sleep(first_token_s)
+    for i, word in enumerate(words):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(per_token_s)
+    done = {
+        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+        "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+    }
+    yield f"data: {json.dumps(done)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-3.5-turbo")
+    stats["requests"] += 1
+
+    error = _error_response()
+    if error is not None:
+        await asyncio.sleep(_latency_s() / 10)
+        return error
+
+    if _rng.random() < settings["hang_rate"]:
+        stats["hangs"] += 1
+        await asyncio.sleep(settings["hang_seconds"])
+
+    latency_s = _latency_s()
+    if body.get("stream"):
+        stats["streams"] += 1
+        return StreamingResponse(_stream(model, ANSWER, latency_s), media_type="text/event-stream")
+
+    await asyncio.sleep(latency_s)
+    return _completion(model, ANSWER)
+
+
+@app.get("/mock/stats")
+def mock_stats():
+    return {**stats, "settings": settings}
+
+
+@app.post("/mock/settings")
+async def update_settings(request: Request):
+    """Change latency / error injection while a load test is running."""
+    updates = await request.json()
+    settings.update({key: float(value) for key, value in updates.items() if key in settings})
+    return settings
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat-completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=MOCK_LATENCY_MS, help="median latency")
+    parser.add_argument("--sigma", type=float, default=MOCK_LATENCY_SIGMA, help="lognormal spread (0 = fixed)")
+    parser.add_argument("--first-token-ms", type=float, default=MOCK_FIRST_TOKEN_MS)
+    parser.add_argument("--error-rate", type=float, default=MOCK_ERROR_RATE)
+    parser.add_argument("--rate-limit-rate", type=float, default=MOCK_RATE_LIMIT_RATE)
+    parser.add_argument("--hang-rate", type=float, default=MOCK_HANG_RATE)
+    parser.add_argument("--hang-seconds", type=float, default=MOCK_HANG_SECONDS)
+    args = parser.parse_args()
+
+    settings.update({
+        "latency_ms": args.latency_ms,
+        "sigma": args.sigma,
+        "first_token_ms": args.first_token_ms,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "hang_rate": args.hang_rate,
+        "hang_seconds": args.hang_seconds,
+    })
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
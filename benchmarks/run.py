@@ -0,0 +1,127 @@
+# benchmarks/run.py
+#
+# Offline benchmark suite for the diagnose, consult and drug-safety paths.
+#
+#   python -m benchmarks.run                       # all sections
+#   python -m benchmarks.run --sections vision --models chexnet --batch-sizes 1 8 32
+#   python -m benchmarks.run --compare benchmarks/results/abc123.json benchmarks/results/def456.json
+#
+# Models use random weights (PRETRAINED_WEIGHTS=0) and OpenAI is replaced by
+# a local stub, so nothing touches the network. Each section runs in its own
+# spawned process so its peak RSS is its own. Results are written as JSON to
+# benchmarks/results/<commit>.json.
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Before any model or API module is imported, here and in the children
+_scratch = tempfile.mkdtemp(prefix="med-bench-")
+os.environ.setdefault("PRETRAINED_WEIGHTS", "0")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("SAVE_UPLOADS", "0")
+os.environ.setdefault("LOG_DB", os.path.join(_scratch, "diagnosis_log.db"))
+os.environ.setdefault("LOG_FILE", os.path.join(_scratch, "diagnosis_log.csv"))
+os.environ.setdefault("EXPLANATIONS_PATH", os.path.join(_scratch, "explanations.json"))
+os.environ.setdefault("CONSULT_CACHE_DB", "")
+os.environ.setdefault("RESULT_CACHE_DB", "")
+
+from benchmarks.common import (  # noqa: E402
+    peak_rss_mb, install_stub_openai, git_commit, environment, write_results, flatten,
+)
+
+SECTIONS = ["vision", "gnn", "api"]
+
+# Metrics where a lower value is better; everything else compared is a rate
+LOWER_IS_BETTER = ("_ms", "_s", "rss_mb")
+
+
+def run_section(name: str, args: dict) -> dict:
+    """Entry point inside the spawned child."""
+    install_stub_openai(args["llm_latency_ms"])
+    started = time.perf_counter()
+
+    if name == "vision":
+        from benchmarks import bench_vision
+        results = bench_vision.run(args["models"], args["batch_sizes"], args["threads"], args["repeats"])
+    elif name == "gnn":
+        from benchmarks import bench_gnn
+        results = bench_gnn.run(args["repeats"], args["scale_drugs"])
+    elif name == "api":
+        from benchmarks import bench_api
+        results = bench_api.run(args["requests"], args["concurrency"])
+    else:
+        raise ValueError(f"Unknown section: {name}")
+
+    results["wall_s"] = round(time.perf_counter() - started, 2)
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def compare(base_path: str, new_path: str):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    base_flat = flatten(base["results"])
+    new_flat = flatten(new["results"])
+
+    print(f"{base['commit']} -> {new['commit']}")
+    for key in sorted(base_flat.keys() & new_flat.keys()):
+        if not key.endswith(("p50_ms", "p95_ms", "p99_ms", "images_per_sec", "requests_per_sec", "peak_rss_mb")):
+            continue
+        before, after = base_flat[key], new_flat[key]
+        if not before:
+            continue
+        change = (after - before) / before * 100
+        better = change < 0 if key.endswith(LOWER_IS_BETTER) else change > 0
+        marker = " " if abs(change) < 5 else "+" if better else "-"
+        print(f"{marker} {key:<60} {before:>12.3f} -> {after:>12.3f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the inference hot paths")
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=SECTIONS)
+    parser.add_argument("--models", nargs="+", choices=["chexnet", "vit"], default=["chexnet", "vit"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 16])
+    parser.add_argument("--threads", nargs="+", type=int, default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=64, help="requests per API scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scale-drugs", type=int, default=100_000)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--output", help="default: benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare", "sections")}
+    results = {}
+    for name in args.sections:
+        print(f"[bench] {name} ...", file=sys.stderr)
+        # spawn: a fresh interpreter per section, so peak RSS and thread
+        # settings don't leak between sections
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results[name] = pool.submit(run_section, name, config).result()
+        print(f"[bench] {name} done in {results[name]['wall_s']}s", file=sys.stderr)
+
+    path = write_results({
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "config": config,
+        "results": results,
+    }, args.output)
+    print(f"[bench] results written to {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 # gnn/data/drugs_graph.py
 
+import os
+import hashlib
 import dgl
 import torch
 
+# Optional CSV/Parquet edge list (columns drug_a, drug_b) to use instead of the
+# built-in demo lists below; see data/graph_loader.py
+DRUG_INTERACTIONS_PATH = os.getenv("DRUG_INTERACTIONS_PATH", "")
+
 DRUGS = [
     "Aspirin", "Ibuprofen", "Paracetamol", "Amoxicillin", "Atorvastatin",
     "Metformin", "Lisinopril", "Omeprazole", "Warfarin", "Simvastatin",
@@ -30,8 +36,18 @@ dst = [drug_to_idx[dst_drug] for _, dst_drug in INTERACTIONS]
 
 # Create DGL Graph
 def build_graph():
-    # Create graph with directional edges
-    g = dgl.graph((src, dst))
+    return load_drug_graph()[0]
+
+def load_drug_graph():
+    """Return (graph, drug_names), where node i is drug_names[i]."""
+    if DRUG_INTERACTIONS_PATH:
+        from data.graph_loader import load_graph
+
+        return load_graph(DRUG_INTERACTIONS_PATH)
+
+    # Create graph with directional edges (one node per drug, including
+    # drugs with no known interactions)
+    g = dgl.graph((src, dst), num_nodes=len(DRUGS))
 
     # Optional: Add reverse edges (bi-directional)
     g = dgl.to_bidirected(g)
@@ -39,7 +55,15 @@ def build_graph():
     # Initialize node features (optional for now)
     g.ndata["feat"] = torch.eye(g.num_nodes())  # Identity matrix as dummy features
 
-    return g
+    return g, list(DRUGS)
+
+def graph_fingerprint() -> str:
+    """Identifies the graph and node features load_drug_graph() returns right now."""
+    if DRUG_INTERACTIONS_PATH:
+        from data.graph_loader import graph_key
+
+        return graph_key(DRUG_INTERACTIONS_PATH)
+    return hashlib.sha256(repr((DRUGS, INTERACTIONS)).encode()).hexdigest()[:16]
 
 if __name__ == "__main__":
     graph = build_graph()
@@ -0,0 +1,145 @@
+# data/graph_loader.py
+#
+# Builds the drug interaction graph from a large CSV/Parquet edge list.
+#
+# Edges are streamed in chunks, never loaded whole, and drug names are mapped
+# to ids as they appear. The result is stored as CSR. Node features are
+# compact fixed-size vectors instead of an n x n one-hot matrix. The built
+# graph is cached in DGL's binary format, with features in a .npy file that
+# is memory-mapped on load, so later startups skip the parse entirely.
+
+import os
+import json
+import zlib
+import hashlib
+import logging
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+GRAPH_CACHE_DIR = os.getenv("GRAPH_CACHE_DIR", os.path.join("data", "cache", "graphs"))
+FEATURE_DIM = int(os.getenv("DRUG_FEATURE_DIM", 32))
+CHUNK_SIZE = int(os.getenv("GRAPH_CHUNK_SIZE", 1_000_000))
+
+
+def _iter_edge_chunks(path, src_col, dst_col, chunksize):
+    """Yield (src_names, dst_names) arrays chunk by chunk."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=[src_col, dst_col]):
+            yield (batch.column(src_col).to_numpy(zero_copy_only=False),
+                   batch.column(dst_col).to_numpy(zero_copy_only=False))
+    else:
+        import pandas as pd
+
+        for chunk in pd.read_csv(path, usecols=[src_col, dst_col], chunksize=chunksize, dtype=str):
+            chunk = chunk.dropna()
+            yield chunk[src_col].to_numpy(), chunk[dst_col].to_numpy()
+
+
+def drug_features(names, dim=FEATURE_DIM) -> np.ndarray:
+    """
+    Deterministic per-drug feature vectors seeded from the drug name, so a
+    drug keeps its features when the graph is rebuilt or extended. They are
+    a fixed starting point; the GNN learns on top of them.
+    """
+    features = np.empty((len(names), dim), dtype=np.float32)
+    for idx, name in enumerate(names):
+        rng = np.random.default_rng(zlib.crc32(name.encode()))
+        features[idx] = rng.standard_normal(dim, dtype=np.float32)
+    features /= np.sqrt(dim)
+    return features
+
+
+def read_edges(path, src_col="drug_a", dst_col="drug_b", chunksize=CHUNK_SIZE):
+    """Stream an edge list into int64 COO arrays plus the list of drug names."""
+    import pandas as pd
+
+    drug_to_idx = {}
+    src_parts, dst_parts = [], []
+
+    for src_names, dst_names in _iter_edge_chunks(path, src_col, dst_col, chunksize):
+        # Factorize the chunk, then only map its distinct names to global ids
+        codes, uniques = pd.factorize(np.concatenate([src_names, dst_names]))
+        mapping = np.empty(len(uniques), dtype=np.int64)
+        for i, name in enumerate(uniques):
+            idx = drug_to_idx.get(name)
+            if idx is None:
+                idx = drug_to_idx[name] = len(drug_to_idx)
+            mapping[i] = idx
+        global_ids = mapping[codes]
+        src_parts.append(global_ids[:len(src_names)])
+        dst_parts.append(global_ids[len(src_names):])
+
+    src = np.concatenate(src_parts) if src_parts else np.empty(0, dtype=np.int64)
+    dst = np.concatenate(dst_parts) if dst_parts else np.empty(0, dtype=np.int64)
+    return src, dst, list(drug_to_idx)
+
+
+def to_csr(src, dst, num_nodes):
+    """Bidirected, deduplicated, self-loop-free CSR (indptr, indices)."""
+    keep = src != dst
+    src, dst = src[keep], dst[keep]
+    # Encode each directed edge as one int64 key; unique() dedups and sorts
+    # by (src, dst), which is exactly CSR order.
+    keys = np.unique(np.concatenate([src * num_nodes + dst, dst * num_nodes + src]))
+    rows, indices = np.divmod(keys, num_nodes)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[1:])
+    return indptr, indices
+
+
+def graph_key(path, src_col="drug_a", dst_col="drug_b", dim=FEATURE_DIM) -> str:
+    """Changes whenever the file (size, mtime), its columns or the feature size change."""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{src_col}|{dst_col}|{dim}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _cache_dir(path, src_col, dst_col, dim):
+    return os.path.join(GRAPH_CACHE_DIR, graph_key(path, src_col, dst_col, dim))
+
+
+def load_graph(path, src_col="drug_a", dst_col="drug_b", feature_dim=FEATURE_DIM, use_cache=True):
+    """
+    Return (graph, drug_names) for an interaction file, building and caching
+    it on the first call. `graph.ndata["feat"]` is backed by a memory map
+    when loaded from cache.
+    """
+    import dgl
+
+    cache_dir = _cache_dir(path, src_col, dst_col, feature_dim)
+    graph_path = os.path.join(cache_dir, "graph.bin")
+    features_path = os.path.join(cache_dir, "features.npy")
+    names_path = os.path.join(cache_dir, "drugs.json")
+
+    if use_cache and os.path.exists(graph_path):
+        (graph,), _ = dgl.load_graphs(graph_path)
+        # Copy-on-write map: pages are read lazily and shared between processes
+        features = np.load(features_path, mmap_mode="c")
+        graph.ndata["feat"] = torch.from_numpy(features)
+        with open(names_path) as f:
+            names = json.load(f)
+        logger.info(f"Loaded cached drug graph from {cache_dir}: {graph}")
+        return graph, names
+
+    src, dst, names = read_edges(path, src_col, dst_col)
+    indptr, indices = to_csr(src, dst, len(names))
+    graph = dgl.graph(("csr", (torch.from_numpy(indptr), torch.from_numpy(indices), [])),
+                      num_nodes=len(names))
+    features = drug_features(names, feature_dim)
+    logger.info(f"Built drug graph from {path}: {graph.num_nodes()} drugs, {graph.num_edges()} edges")
+
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        dgl.save_graphs(graph_path, [graph])
+        np.save(features_path, features)
+        with open(names_path, "w") as f:
+            json.dump(names, f)
+        features = np.load(features_path, mmap_mode="c")
+
+    graph.ndata["feat"] = torch.from_numpy(features)
+    return graph, names
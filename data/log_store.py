@@ -0,0 +1,298 @@
+# data/log_store.py
+
+import os
+import csv
+import json
+import time
+import queue
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+LOG_DB = os.getenv("LOG_DB", os.path.join("data", "diagnosis_log.db"))
+# Legacy CSV log, imported once when the database is first created
+LOG_FILE = os.getenv("LOG_FILE", os.path.join("data", "diagnosis_log.csv"))
+LOG_FLUSH_INTERVAL_MS = float(os.getenv("LOG_FLUSH_INTERVAL_MS", 50))
+LOG_MAX_BATCH = int(os.getenv("LOG_MAX_BATCH", 256))
+LOG_PAGE_SIZE = int(os.getenv("LOG_PAGE_SIZE", 50))
+
+# Stored format of `timestamp`, whichever server or import wrote the record
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Accepted on the way in: the FastAPI format, the Flask server's compact one
+_INPUT_FORMATS = (TIMESTAMP_FORMAT, "%Y%m%d_%H%M%S")
+
+# Bumped by each one-time data migration, stored as PRAGMA user_version
+SCHEMA_VERSION = 1
+
+COLUMNS = ["timestamp", "filename", "diagnosis", "confidence", "image_path"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS diagnoses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    timestamp TEXT,
+    filename TEXT,
+    diagnosis TEXT,
+    confidence REAL,
+    image_path TEXT,
+    source TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_diagnoses_created_at ON diagnoses (created_at);
+CREATE INDEX IF NOT EXISTS idx_diagnoses_diagnosis ON diagnoses (diagnosis, created_at);
+"""
+
+
+def _to_epoch(value) -> float:
+    """
+    Time range filter bound: an epoch number (or numeric string, as query
+    parameters arrive) or an ISO-8601 string.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def parse_timestamp(value):
+    """A record's `timestamp` as a datetime, or None if missing or unrecognised."""
+    if not value:
+        return None
+    for fmt in _INPUT_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+class DiagnosisLogStore:
+    """
+    Append-only diagnosis log in SQLite (WAL mode).
+
+    `append()` only enqueues; a background thread writes queued records in
+    batched transactions. Reads use keyset pagination on the row id, so a
+    page costs the same no matter how large the log gets.
+    """
+
+    def __init__(self, db_path=LOG_DB, flush_interval_ms=LOG_FLUSH_INTERVAL_MS,
+                 max_batch=LOG_MAX_BATCH):
+        self.db_path = db_path
+        self.flush_interval_ms = flush_interval_ms
+        self.max_batch = max_batch
+
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        fresh = not os.path.exists(db_path)
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+        if fresh and os.path.exists(LOG_FILE):
+            self.import_csv(LOG_FILE)
+        self._migrate()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers run alongside the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # === Writes ===
+
+    def append(self, record: dict, source: str = None):
+        """Queue one diagnosis record for the background writer."""
+        self._ensure_writer()
+        self._queue.put((time.time(), dict(record), source))
+
+    def flush(self, timeout: float = None):
+        """Block until every queued record has been written."""
+        if self._writer is None:
+            return
+        if timeout is None:
+            self._queue.join()
+        else:
+            self._join(timeout)
+
+    def _join(self, timeout):
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="log-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval_ms / 1000
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception(f"Failed to write {len(batch)} diagnosis log records")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        rows = []
+        for created_at, record, source in batch:
+            parsed = parse_timestamp(record.get("timestamp"))
+            if parsed is not None:
+                record = {**record, "timestamp": parsed.strftime(TIMESTAMP_FORMAT)}
+            extra = {k: v for k, v in record.items() if k not in COLUMNS}
+            rows.append((
+                created_at,
+                *(record.get(col) for col in COLUMNS),
+                source,
+                json.dumps(extra) if extra else None,
+            ))
+        conn = self._conn()
+        with span("log_write", "sqlite"), conn:
+            conn.executemany(
+                "INSERT INTO diagnoses (created_at, timestamp, filename, diagnosis, "
+                "confidence, image_path, source, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def import_csv(self, path: str) -> int:
+        """
+        Load records from the legacy pandas CSV log. Each row keeps its own
+        time in `created_at`, so time range filters cover the history too.
+        """
+        with open(path, newline="") as f:
+            records = list(csv.DictReader(f))
+        now = time.time()
+        batch = []
+        for record in records:
+            parsed = parse_timestamp(record.get("timestamp"))
+            batch.append((parsed.timestamp() if parsed else now, record, "csv"))
+        self._write(batch)
+        logger.info(f"Imported {len(records)} records from {path}")
+        return len(records)
+
+    def _migrate(self):
+        """Run the data migrations this database hasn't had yet, once each."""
+        conn = self._conn()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        if version < 1:
+            self._normalize_existing()
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+
+    def _normalize_existing(self):
+        """Fix rows written before timestamps were normalised on insert."""
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT id, created_at, timestamp, source FROM diagnoses "
+            "WHERE timestamp GLOB '[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]_*' OR source = 'csv'"
+        ).fetchall()
+        updates = []
+        for row in rows:
+            parsed = parse_timestamp(row["timestamp"])
+            if parsed is None:
+                continue
+            # Imported rows take their time from the record, not the import
+            created_at = parsed.timestamp() if row["source"] == "csv" else row["created_at"]
+            timestamp = parsed.strftime(TIMESTAMP_FORMAT)
+            if (timestamp, created_at) != (row["timestamp"], row["created_at"]):
+                updates.append((timestamp, created_at, row["id"]))
+        if updates:
+            with conn:
+                conn.executemany("UPDATE diagnoses SET timestamp = ?, created_at = ? WHERE id = ?", updates)
+            logger.info(f"Normalised timestamps of {len(updates)} diagnosis log records")
+
+    # === Reads ===
+
+    def query(self, start=None, end=None, diagnosis=None, cursor=None, limit=LOG_PAGE_SIZE):
+        """
+        Return one page of records, oldest first, and the cursor for the
+        next page (None when there are no more rows).
+        """
+        clauses, params = [], []
+        if cursor is not None:
+            clauses.append("id > ?")
+            params.append(int(cursor))
+        if start is not None:
+            clauses.append("created_at >= ?")
+            params.append(_to_epoch(start))
+        if end is not None:
+            clauses.append("created_at < ?")
+            params.append(_to_epoch(end))
+        if diagnosis is not None:
+            clauses.append("diagnosis = ?")
+            params.append(diagnosis)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn().execute(
+            f"SELECT * FROM diagnoses {where} ORDER BY id LIMIT ?", (*params, limit + 1)
+        ).fetchall()
+
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return [self._to_record(row) for row in rows[:limit]], next_cursor
+
+    def stats(self) -> dict:
+        return {"queue_depth": self._queue.qsize(), "pending": self._queue.unfinished_tasks}
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM diagnoses").fetchone()[0]
+
+    def clear(self):
+        self.flush()
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM diagnoses")
+
+    @staticmethod
+    def _to_record(row: sqlite3.Row) -> dict:
+        record = {"id": row["id"], **{col: row[col] for col in COLUMNS}}
+        if row["extra"]:
+            record.update(json.loads(row["extra"]))
+        return record
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_log_store() -> DiagnosisLogStore:
+    """Process-wide store shared by the FastAPI and Flask servers."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DiagnosisLogStore()
+    return _store
@@ -0,0 +1,25 @@
+# scripts/build_explanations.py
+#
+# Precompute the diagnosis explanation table served by the API:
+#   python data/scripts/build_explanations.py
+# Re-run it whenever the prompt or model in utils/explainer.py changes.
+
+import os
+import sys
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+from utils.explanation_store import build_table, EXPLANATIONS_PATH
+from vision.models import chexnet_model, vit_dummy
+
+labels = sorted(set(chexnet_model.CLASSES) | set(vit_dummy.CLASSES))
+table = build_table(labels)
+logger.info(f"Wrote {len(table['explanations'])} explanations (version {table['version']}) to {EXPLANATIONS_PATH}")
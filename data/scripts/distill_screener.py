@@ -0,0 +1,136 @@
+# scripts/distill_screener.py
+#
+# Distill the cascade's screening model from CheXNet on a folder of X-rays.
+# No labels are needed: the targets are CheXNet's own probabilities.
+#   python data/scripts/distill_screener.py path/to/xrays --epochs 5
+#
+# Decoded studies (224x224 uint8, ~50 KB each) and targets are kept in
+# memory. Writes SCREEN_WEIGHTS; pick the thresholds afterwards with
+# data/scripts/eval_cascade.py.
+
+import os
+import sys
+import time
+import argparse
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import torch
+import torch.nn as nn
+
+from vision.models import bulk, cascade, chexnet_model, registry
+
+
+def load_studies(directory: str, batch_size: int):
+    """Decode every image once and score it with CheXNet: (names, grays, targets)."""
+    names, grays, targets = [], [], []
+    chunk = []
+
+    def flush():
+        if chunk:
+            targets.append(chexnet_model.predict_probs(chunk))
+            grays.extend(chunk)
+            chunk.clear()
+
+    for name, path in bulk.iter_directory(directory):
+        try:
+            chunk.append(chexnet_model.preprocess(path))
+        except Exception as e:
+            logger.warning(f"Skipping {name}: {e}")
+            continue
+        names.append(name)
+        if len(chunk) == batch_size:
+            flush()
+            if len(grays) % (batch_size * 20) == 0:
+                logger.info(f"Scored {len(grays)} studies with CheXNet")
+    flush()
+    return names, grays, torch.cat(targets) if targets else torch.empty(0, len(cascade.SCREEN_CLASSES))
+
+
+def evaluate(model, grays, targets, indices, batch_size) -> dict:
+    """Top-label agreement with CheXNet, overall and on the studies the default band accepts."""
+    model.eval()
+    probs = []
+    with torch.no_grad():
+        for start in range(0, len(indices), batch_size):
+            batch = cascade.screen_input([grays[i] for i in indices[start:start + batch_size]])
+            probs.append(torch.sigmoid(model(batch)))
+    probs = torch.cat(probs)
+    teacher = targets[indices]
+
+    top, label = probs.max(dim=1)
+    agree = label == teacher.argmax(dim=1)
+    accepted = torch.tensor([cascade.route(c) != "escalated" for c in top.tolist()])
+    return {
+        "agreement": round(agree.float().mean().item(), 4),
+        "accepted": round(accepted.float().mean().item(), 4),
+        "agreement_accepted": round(agree[accepted].float().mean().item(), 4) if accepted.any() else None,
+        "mae": round((probs - teacher).abs().mean().item(), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the cascade screener from CheXNet.")
+    parser.add_argument("directory")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--val-fraction", type=float, default=0.1)
+    parser.add_argument("--output", default=cascade.SCREEN_WEIGHTS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    started = time.perf_counter()
+    names, grays, targets = load_studies(args.directory, args.batch_size)
+    if len(grays) < 10:
+        sys.exit(f"Need at least 10 images under {args.directory}, found {len(grays)}")
+    logger.info(f"Scored {len(grays)} studies with CheXNet in {time.perf_counter() - started:.1f}s")
+
+    order = torch.randperm(len(grays)).tolist()
+    n_val = max(1, int(len(order) * args.val_fraction))
+    val_idx, train_idx = order[:n_val], order[n_val:]
+
+    # ImageNet backbone as the starting point; only the head starts from scratch
+    model = cascade.build_screener(pretrained_backbone=registry.PRETRAINED_WEIGHTS)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr)
+    # Soft targets: match CheXNet's probability for every label
+    loss_fn = nn.BCEWithLogitsLoss()
+
+    for epoch in range(1, args.epochs + 1):
+        model.train()
+        epoch_started = time.perf_counter()
+        shuffled = [train_idx[i] for i in torch.randperm(len(train_idx)).tolist()]
+        total_loss = 0.0
+        steps = 0
+        for start in range(0, len(shuffled), args.batch_size):
+            indices = shuffled[start:start + args.batch_size]
+            if len(indices) < 2:
+                continue  # BatchNorm needs more than one sample
+            logits = model(cascade.screen_input([grays[i] for i in indices]))
+            loss = loss_fn(logits, targets[indices])
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item()
+            steps += 1
+
+        report = evaluate(model, grays, targets, val_idx, args.batch_size)
+        logger.info(f"Epoch {epoch:02d} | loss {total_loss / max(steps, 1):.4f} | "
+                    f"{time.perf_counter() - epoch_started:.1f}s | val {report}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    tmp_path = f"{args.output}.tmp"
+    # The cascade only serves a screener whose teacher is the CheXNet it escalates to
+    torch.save({"state_dict": model.state_dict(), "teacher": chexnet_model.MODEL_VERSION}, tmp_path)
+    os.replace(tmp_path, args.output)
+    logger.info(f"✅ Screener saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
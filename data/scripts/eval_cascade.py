@@ -0,0 +1,150 @@
+# scripts/eval_cascade.py
+#
+# Accuracy / compute tradeoff of the cascade thresholds on a folder of X-rays:
+#   python data/scripts/eval_cascade.py path/to/xrays [--labels labels.csv] [--output eval.json]
+#
+# Every study goes through the screener and CheXNet once; each (low, high)
+# pair on the grid is then replayed from those outputs. "agreement" is how
+# often the cascade's label matches CheXNet alone; with --labels (a CSV of
+# filename,label) accuracy against ground truth is reported as well. CPU
+# cost is process CPU time (all threads) per study.
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from vision.models import bulk, cascade, chexnet_model
+
+CLASSES = chexnet_model.CLASSES
+
+
+def score_directory(directory: str, batch_size: int) -> dict:
+    """Screener and CheXNet top labels for every image, plus CPU seconds per model."""
+    names, screen_top, screen_label, heavy_label = [], [], [], []
+    cpu = {"screen": 0.0, "heavy": 0.0}
+    chunk, chunk_names = [], []
+
+    def flush():
+        if not chunk:
+            return
+        started = time.process_time()
+        probs = cascade.screen_probs(chunk)
+        screened = time.process_time()
+        heavy = chexnet_model.predict_probs(chunk)
+        cpu["screen"] += screened - started
+        cpu["heavy"] += time.process_time() - screened
+
+        top, label = probs.max(dim=1)
+        names.extend(chunk_names)
+        screen_top.extend(top.tolist())
+        screen_label.extend(CLASSES[i] for i in label.tolist())
+        heavy_label.extend(CLASSES[i] for i in heavy.argmax(dim=1).tolist())
+        chunk.clear()
+        chunk_names.clear()
+
+    for name, path in bulk.iter_directory(directory):
+        try:
+            chunk.append(chexnet_model.preprocess(path))
+        except Exception as e:
+            logger.warning(f"Skipping {name}: {e}")
+            continue
+        chunk_names.append(name)
+        if len(chunk) == batch_size:
+            flush()
+    flush()
+    return {"names": names, "screen_top": screen_top, "screen_label": screen_label,
+            "heavy_label": heavy_label, "cpu": cpu}
+
+
+def load_labels(path: str) -> dict:
+    with open(path, newline="") as f:
+        return {row["filename"]: row["label"] for row in csv.DictReader(f)}
+
+
+def sweep(scores: dict, lows: list, highs: list, labels: dict = None) -> list:
+    n = len(scores["names"])
+    screen_ms = 1000 * scores["cpu"]["screen"] / n
+    heavy_ms = 1000 * scores["cpu"]["heavy"] / n
+    truth = [labels.get(name) for name in scores["names"]] if labels else None
+
+    def accuracy(predicted):
+        pairs = [(p, t) for p, t in zip(predicted, truth) if t is not None]
+        return round(sum(p == t for p, t in pairs) / len(pairs), 4) if pairs else None
+
+    rows = [{
+        "low": None, "high": None, "escalation_rate": 1.0, "agreement": 1.0,
+        "cpu_ms_per_study": round(heavy_ms, 2), "cpu_saving": 0.0,
+        **({"accuracy": accuracy(scores["heavy_label"])} if truth else {}),
+    }]
+    for low in lows:
+        for high in highs:
+            if low >= high:
+                continue
+            routes = [cascade.route(top, low, high) for top in scores["screen_top"]]
+            predicted = [
+                heavy if decision == "escalated" else screen
+                for decision, screen, heavy in zip(routes, scores["screen_label"], scores["heavy_label"])
+            ]
+            escalation_rate = routes.count("escalated") / n
+            cpu_ms = screen_ms + escalation_rate * heavy_ms
+            row = {
+                "low": low,
+                "high": high,
+                "escalation_rate": round(escalation_rate, 4),
+                "agreement": round(sum(p == h for p, h in zip(predicted, scores["heavy_label"])) / n, 4),
+                "cpu_ms_per_study": round(cpu_ms, 2),
+                "cpu_saving": round(1 - cpu_ms / heavy_ms, 4) if heavy_ms else 0.0,
+            }
+            if truth:
+                row["accuracy"] = accuracy(predicted)
+            rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep cascade thresholds on a folder of X-rays.")
+    parser.add_argument("directory")
+    parser.add_argument("--labels", help="CSV with filename,label columns (optional)")
+    parser.add_argument("--low", nargs="+", type=float, default=[0.05, 0.1, 0.15, 0.2, 0.25, 0.3])
+    parser.add_argument("--high", nargs="+", type=float, default=[0.6, 0.7, 0.8, 0.9, 1.01],
+                        help="values above 1 never accept a finding from the screener")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--output", help="Write the full grid as JSON")
+    args = parser.parse_args()
+
+    screener = cascade.get_screener()
+    if not screener.distilled:
+        logger.warning("Screener is not distilled from the served CheXNet: results show an untrained "
+                       "model (run data/scripts/distill_screener.py first)")
+    logger.info(f"CheXNet {chexnet_model.MODEL_VERSION}, screener {screener.version}")
+
+    scores = score_directory(args.directory, args.batch_size)
+    if not scores["names"]:
+        sys.exit(f"No images found under {args.directory}")
+    labels = load_labels(args.labels) if args.labels else None
+    rows = sweep(scores, args.low, args.high, labels)
+
+    columns = ["low", "high", "escalation_rate", "agreement", *(["accuracy"] if labels else []),
+               "cpu_ms_per_study", "cpu_saving"]
+    print("\t".join(columns))
+    for row in sorted(rows, key=lambda r: r["cpu_ms_per_study"]):
+        print("\t".join("heavy" if row[c] is None and c in ("low", "high") else str(row[c]) for c in columns))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"chexnet_version": chexnet_model.MODEL_VERSION, "screen_version": screener.version,
+                       "images": len(scores["names"]), "cpu_seconds": scores["cpu"], "grid": rows}, f, indent=2)
+        logger.info(f"Grid written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
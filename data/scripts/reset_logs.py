@@ -1,11 +1,13 @@
 # scripts/reset_logs.py
 
 import os
+import glob
 import shutil
 
 # Paths
 log_path = "data/diagnosis_log.csv"
-upload_folder = "data/uploads"
+log_db_path = os.getenv("LOG_DB", "data/diagnosis_log.db")
+upload_folder = os.getenv("UPLOAD_DIR", "data/uploads")
 
 # Delete diagnosis log file
 if os.path.exists(log_path):
@@ -14,12 +16,20 @@ if os.path.exists(log_path):
 else:
     print("No diagnosis_log.csv found.")
 
-# Clear uploads folder
+# Delete the SQLite diagnosis log and its WAL files
+for path in (log_db_path, f"{log_db_path}-wal", f"{log_db_path}-shm"):
+    if os.path.exists(path):
+        os.remove(path)
+        print(f"Deleted: {path}")
+
+# Clear the upload store (blobs and their index live under one directory)
 if os.path.exists(upload_folder):
-    for filename in os.listdir(upload_folder):
-        file_path = os.path.join(upload_folder, filename)
-        if os.path.isfile(file_path):
-            os.remove(file_path)
-            print(f"Deleted: {file_path}")
+    shutil.rmtree(upload_folder)
+    print(f"Deleted: {upload_folder}")
 else:
     print("Uploads folder not found.")
+
+# Uploads saved by older Flask versions as data/xray_<timestamp>.png
+for file_path in glob.glob(os.path.join("data", "xray_*.png")):
+    os.remove(file_path)
+    print(f"Deleted: {file_path}")
@@ -0,0 +1,60 @@
+# scripts/score_directory.py
+#
+# Offline bulk diagnosis of a directory of X-rays:
+#   python data/scripts/score_directory.py path/to/xrays --format csv --output results.csv
+
+import os
+import sys
+import time
+import argparse
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from vision.models import bulk, chexnet_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every X-ray under a directory with CheXNet.")
+    parser.add_argument("directory")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--output", help="Output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=bulk.BULK_WORKERS, help="Decode processes")
+    parser.add_argument("--batch-size", type=int, default=bulk.BULK_BATCH_SIZE)
+    args = parser.parse_args()
+
+    results = bulk.score_stream(
+        bulk.iter_directory(args.directory),
+        decode=chexnet_model.preprocess,
+        batch_size=args.batch_size,
+        workers=args.workers,
+    )
+    encode = bulk.to_csv if args.format == "csv" else bulk.to_ndjson
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    started = time.perf_counter()
+    count = 0
+
+    def counted(results):
+        nonlocal count
+        for result in results:
+            count += 1
+            yield result
+
+    try:
+        for chunk in encode(counted(results)):
+            out.write(chunk)
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Scored {count} images in {elapsed:.1f}s ({count / elapsed:.1f} images/sec)")
+
+
+if __name__ == "__main__":
+    main()
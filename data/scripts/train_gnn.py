@@ -3,6 +3,8 @@ import sys
 import torch
 import torch.nn as nn
 import torch.optim as optim
+import time
+import hashlib
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -10,48 +12,224 @@ logger = logging.getLogger(__name__)
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
 
-from data.drugs_graph import build_graph
+from data.drugs_graph import build_graph, DRUG_INTERACTIONS_PATH
 from gnn.models.gnn_model import DrugGNN
 
+# "full": whole-graph node classification on random labels (toy demo graph).
+# "minibatch": neighbor-sampled link prediction over the interaction edges,
+# for graphs that don't fit through the model in one pass.
+TRAIN_MODE = os.getenv("TRAIN_MODE", "full")
+
+# Default 10 matches the committed gnn/models/gnn_model.pt. 0 = the graph's
+# own feature dimension (features used as loaded, memory map included); any
+# other value projects them with a fixed seeded matrix
 INPUT_DIM = int(os.getenv("INPUT_DIM", 10))
+FEATURE_SEED = int(os.getenv("FEATURE_SEED", 0))
 HIDDEN_DIM = int(os.getenv("HIDDEN_DIM", 16))
-OUTPUT_DIM = int(os.getenv("OUTPUT_DIM", 2))
+# Link prediction scores pairs with a dot product, which needs more than 2 dims
+OUTPUT_DIM = int(os.getenv("OUTPUT_DIM", 2 if TRAIN_MODE == "full" else 16))
 EPOCHS = int(os.getenv("EPOCHS", 30))
 LR = float(os.getenv("LR", 0.01))
 
+# Mini-batch mode only
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 1024))
+FANOUTS = [int(f) for f in os.getenv("FANOUTS", "10,10").split(",")]
+NUM_NEGATIVES = int(os.getenv("NUM_NEGATIVES", 1))
+NUM_WORKERS = int(os.getenv("NUM_WORKERS", 4))
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join("gnn", "models", "gnn_checkpoint.pt"))
+RESUME = os.getenv("RESUME", "1") == "1"
+
+save_dir = os.path.join("gnn", "models")
+
+
+def train_full(graph):
+    graph = graph.to(device)
+
+    model = DrugGNN(INPUT_DIM, HIDDEN_DIM, OUTPUT_DIM).to(device)
+    logger.info(f"Model:\n{model}")
+
+    labels = torch.randint(0, OUTPUT_DIM, (graph.num_nodes(),), device=device)
+
+    loss_fn = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=LR)
+
+    for epoch in range(1, EPOCHS + 1):
+        model.train()
+        logits = model(graph, graph.ndata["feat"])
+        loss = loss_fn(logits, labels)
+
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+        if epoch == 1 or epoch % 5 == 0 or epoch == EPOCHS:
+            acc = (logits.argmax(1) == labels).float().mean().item()
+            logger.info(f"Epoch {epoch}/{EPOCHS} — Loss: {loss.item():.4f} — Acc: {acc:.4f}")
+
+    return model
+
+
+def _edge_scores(pair_graph, h):
+    """sigmoid(z_i . z_j) logits, the same score gnn/drug_safety.py serves."""
+    import dgl.function as fn
+
+    with pair_graph.local_scope():
+        pair_graph.ndata["h"] = h
+        pair_graph.apply_edges(fn.u_dot_v("h", "h", "score"))
+        return pair_graph.edata["score"].squeeze(-1)
+
+
+def train_minibatch(graph):
+    import dgl
+
+    # The graph and features stay on the CPU (features may be a memory map);
+    # only each batch's sampled blocks and input rows move to the device.
+    features = graph.ndata.pop("feat")
+    src, dst = graph.edges()
+    # Sampling an edge also drops its reverse from the message-passing
+    # blocks, so the model can't just read the answer off the graph.
+    reverse_eids = graph.edge_ids(dst, src)
+
+    sampler = dgl.dataloading.as_edge_prediction_sampler(
+        dgl.dataloading.NeighborSampler(FANOUTS),
+        exclude="reverse_id",
+        reverse_eids=reverse_eids,
+        negative_sampler=dgl.dataloading.negative_sampler.Uniform(NUM_NEGATIVES),
+    )
+    loader = dgl.dataloading.DataLoader(
+        graph, torch.arange(graph.num_edges()), sampler,
+        batch_size=BATCH_SIZE, shuffle=True, drop_last=False,
+        num_workers=NUM_WORKERS, persistent_workers=NUM_WORKERS > 0,
+    )
+
+    model = DrugGNN(INPUT_DIM, HIDDEN_DIM, OUTPUT_DIM).to(device)
+    optimizer = optim.Adam(model.parameters(), lr=LR)
+    loss_fn = nn.BCEWithLogitsLoss()
+    logger.info(f"Model:\n{model}")
+
+    start_epoch = 1
+    if RESUME and os.path.exists(CHECKPOINT_PATH):
+        checkpoint = torch.load(CHECKPOINT_PATH, map_location=device)
+        if checkpoint.get("features") != FEATURES_ID:
+            raise SystemExit(
+                f"{CHECKPOINT_PATH} was trained on other node features "
+                f"({checkpoint.get('features')}, now {FEATURES_ID}); "
+                f"rerun with RESUME=0 or remove the checkpoint"
+            )
+        model.load_state_dict(checkpoint["model"])
+        optimizer.load_state_dict(checkpoint["optimizer"])
+        start_epoch = checkpoint["epoch"] + 1
+        logger.info(f"Resumed from {CHECKPOINT_PATH} at epoch {start_epoch}")
+
+    logger.info(
+        f"Mini-batch training: {graph.num_edges()} edges, batch {BATCH_SIZE}, "
+        f"fanouts {FANOUTS}, {NUM_WORKERS} workers"
+    )
+
+    for epoch in range(start_epoch, EPOCHS + 1):
+        model.train()
+        started = time.perf_counter()
+        total_loss, num_edges, num_batches = 0.0, 0, 0
+
+        for input_nodes, pos_graph, neg_graph, blocks in loader:
+            blocks = [block.to(device) for block in blocks]
+            pos_graph, neg_graph = pos_graph.to(device), neg_graph.to(device)
+            h = model(blocks, features[input_nodes].to(device))
+
+            pos_score = _edge_scores(pos_graph, h)
+            neg_score = _edge_scores(neg_graph, h)
+            scores = torch.cat([pos_score, neg_score])
+            targets = torch.cat([torch.ones_like(pos_score), torch.zeros_like(neg_score)])
+            loss = loss_fn(scores, targets)
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+            total_loss += loss.item()
+            num_edges += pos_graph.num_edges()
+            num_batches += 1
+
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Epoch {epoch}/{EPOCHS} — Loss: {total_loss / max(num_batches, 1):.4f} — "
+            f"{num_edges / elapsed:,.0f} edges/sec"
+        )
+
+        os.makedirs(os.path.dirname(CHECKPOINT_PATH) or ".", exist_ok=True)
+        torch.save(
+            {"epoch": epoch, "model": model.state_dict(), "optimizer": optimizer.state_dict(),
+             "features": FEATURES_ID},
+            CHECKPOINT_PATH + ".tmp",
+        )
+        os.replace(CHECKPOINT_PATH + ".tmp", CHECKPOINT_PATH)
+
+    graph.ndata["feat"] = features
+    return model
+
+
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 logger.info(f"Using device: {device}")
 
-graph = build_graph()
 
-if graph.ndata.get("feat") is None or graph.ndata["feat"].shape[1] != INPUT_DIM:
-    logger.warning(f"Replacing features with random {INPUT_DIM}-dim")
-    graph.ndata["feat"] = torch.randn(graph.num_nodes(), INPUT_DIM)
+def prepare_features(graph):
+    """
+    Node features for training, and a description of where they came from.
+    The same inputs always give the same features: nothing here is unseeded.
+    """
+    generator = torch.Generator().manual_seed(FEATURE_SEED)
+    features = graph.ndata.get("feat")
+    if features is None:
+        dim = INPUT_DIM or 16
+        logger.warning(f"Graph has no node features, using seeded random {dim}-dim features")
+        return torch.randn(graph.num_nodes(), dim, generator=generator), {"method": "random", "dim": dim}
 
-graph = graph.to(device)
+    source_dim = features.shape[1]
+    if not INPUT_DIM or INPUT_DIM == source_dim:
+        return features, {"method": "graph", "dim": source_dim}
 
-model = DrugGNN(INPUT_DIM, HIDDEN_DIM, OUTPUT_DIM).to(device)
-logger.info(f"Model:\n{model}")
+    # Random projection to INPUT_DIM: a fixed matrix, so a rerun (or a
+    # resume) sees the same features. This materialises them in memory.
+    logger.info(f"Projecting {source_dim}-dim node features to {INPUT_DIM} dims (seed {FEATURE_SEED})")
+    projection = torch.randn(source_dim, INPUT_DIM, generator=generator) / source_dim ** 0.5
+    return features.float() @ projection, {"method": "projected", "dim": INPUT_DIM, "from_dim": source_dim}
 
-labels = torch.randint(0, OUTPUT_DIM, (graph.num_nodes(),), device=device)
 
-loss_fn = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.parameters(), lr=LR)
+def feature_fingerprint(features, description) -> str:
+    """Identifies the feature source, so a checkpoint is never resumed on other features."""
+    digest = hashlib.sha256()
+    digest.update(repr(sorted(description.items())).encode())
+    digest.update(f"{DRUG_INTERACTIONS_PATH or 'demo'}|{FEATURE_SEED}|{tuple(features.shape)}".encode())
+    # First and last rows: enough to tell feature sets apart without reading a
+    # large memory map end to end
+    digest.update(features[:1024].contiguous().numpy().tobytes())
+    digest.update(features[-1024:].contiguous().numpy().tobytes())
+    return digest.hexdigest()[:16]
 
-for epoch in range(1, EPOCHS + 1):
-    model.train()
-    logits = model(graph, graph.ndata["feat"])
-    loss = loss_fn(logits, labels)
 
-    optimizer.zero_grad()
-    loss.backward()
-    optimizer.step()
+graph = build_graph()
+graph.ndata["feat"], feature_info = prepare_features(graph)
+INPUT_DIM = feature_info["dim"]
+FEATURES_ID = feature_fingerprint(graph.ndata["feat"], feature_info)
+logger.info(f"Node features: {feature_info}, id {FEATURES_ID}")
 
-    if epoch == 1 or epoch % 5 == 0 or epoch == EPOCHS:
-        acc = (logits.argmax(1) == labels).float().mean().item()
-        logger.info(f"Epoch {epoch}/{EPOCHS} — Loss: {loss.item():.4f} — Acc: {acc:.4f}")
+if TRAIN_MODE == "minibatch":
+    model = train_minibatch(graph)
+elif TRAIN_MODE == "full":
+    model = train_full(graph)
+else:
+    raise SystemExit(f"Unknown TRAIN_MODE: {TRAIN_MODE} (expected 'full' or 'minibatch')")
 
-save_dir = os.path.join("gnn", "models")
 os.makedirs(save_dir, exist_ok=True)
-torch.save(model.state_dict(), os.path.join(save_dir, "gnn_model.pt"))
-logger.info(f"Model saved at {save_dir}/gnn_model.pt")
\ No newline at end of file
+# The serving side only scores drug pairs with a link-prediction model, and
+# reads the layer sizes from here
+torch.save(
+    {"model": model.state_dict(),
+     "objective": "link_prediction" if TRAIN_MODE == "minibatch" else "node_classification",
+     "input_dim": INPUT_DIM, "hidden_dim": HIDDEN_DIM, "output_dim": OUTPUT_DIM,
+     "features": FEATURES_ID},
+    os.path.join(save_dir, "gnn_model.pt"),
+)
+# The serving side needs the exact node features the model was trained on
+torch.save(graph.ndata["feat"].cpu(), os.path.join(save_dir, "gnn_features.pt"))
+logger.info(f"Model saved at {save_dir}/gnn_model.pt")
@@ -0,0 +1,285 @@
+# data/upload_store.py
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join("data", "uploads"))
+# Disk budget for stored uploads; 0 = unbounded
+UPLOAD_BUDGET_MB = float(os.getenv("UPLOAD_BUDGET_MB", 2048))
+# Eviction brings usage back down to this fraction of the budget
+UPLOAD_LOW_WATERMARK = float(os.getenv("UPLOAD_LOW_WATERMARK", 0.9))
+# Uploads not read or re-uploaded for this long are evicted; 0 = keep
+UPLOAD_MAX_AGE_DAYS = float(os.getenv("UPLOAD_MAX_AGE_DAYS", 30))
+UPLOAD_EVICT_INTERVAL = float(os.getenv("UPLOAD_EVICT_INTERVAL", 60))
+
+INDEX_NAME = "index.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    filename TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_blobs_accessed_at ON blobs (accessed_at);
+-- Running totals, kept in the same transaction as every insert and delete,
+-- so all processes sharing the index see (and evict against) one budget
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER NOT NULL,
+    entries INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS blobs_usage_insert AFTER INSERT ON blobs BEGIN
+    UPDATE usage SET bytes = bytes + NEW.size, entries = entries + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS blobs_usage_delete AFTER DELETE ON blobs BEGIN
+    UPDATE usage SET bytes = bytes - OLD.size, entries = entries - 1;
+END;
+INSERT OR IGNORE INTO usage (id, bytes, entries) SELECT 0, COALESCE(SUM(size), 0), COUNT(*) FROM blobs;
+"""
+
+
+class UploadStore:
+    """
+    Content-addressed store for uploaded X-rays.
+
+    Each blob lives at `<root>/<d[:2]>/<d[2:4]>/<d>`, where d is the sha256
+    of its bytes. Identical studies are stored once, and a file is only ever
+    published whole (tmp file + os.replace). A SQLite index next to the
+    blobs holds size and last-access time per digest, so lookups never scan
+    directories. A background thread evicts least-recently-used blobs when
+    the store is over budget, and blobs older than the age limit. The budget
+    is read from the index, so prefork workers sharing a root share it too.
+    """
+
+    def __init__(self, root=UPLOAD_DIR, budget_mb=UPLOAD_BUDGET_MB, max_age_days=UPLOAD_MAX_AGE_DAYS,
+                 evict_interval=UPLOAD_EVICT_INTERVAL, low_watermark=UPLOAD_LOW_WATERMARK):
+        self.root = root
+        self.budget_bytes = int(budget_mb * 2**20)
+        self.max_age_s = max_age_days * 86400
+        self.evict_interval = evict_interval
+        self.low_watermark = low_watermark
+        self.db_path = os.path.join(root, INDEX_NAME)
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._evictor = None
+
+        self.puts = 0
+        self.dedup_hits = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+
+        os.makedirs(root, exist_ok=True)
+        fresh = not os.path.exists(self.db_path)
+        conn = self._conn()
+        conn.executescript(f"BEGIN IMMEDIATE; {SCHEMA} COMMIT;")
+        if fresh:
+            self.import_flat_files()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread, as in data.log_store
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _usage(self) -> sqlite3.Row:
+        """Bytes and entries stored, across every process using this index."""
+        return self._conn().execute("SELECT bytes, entries FROM usage").fetchone()
+
+    # === Writes ===
+
+    def path(self, digest: str) -> str:
+        """Where a blob lives (or would live); computed, never looked up."""
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, data: bytes, filename: str = None, digest: str = None) -> dict:
+        """
+        Store an upload unless identical bytes are already stored. `digest`
+        is the sha256 hex of `data`, for callers that already have it.
+        """
+        self._ensure_evictor()
+        digest = digest or hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            known = conn.execute(
+                "UPDATE blobs SET accessed_at = ? WHERE digest = ?", (now, digest)
+            ).rowcount
+        with self._lock:
+            self.puts += 1
+
+        if known and os.path.exists(path):
+            with self._lock:
+                self.dedup_hits += 1
+            return {"digest": digest, "path": path, "size": len(data), "deduplicated": True}
+
+        with span("disk_write", "uploads"):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        with conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO blobs (digest, size, created_at, accessed_at, filename) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (digest, len(data), now, now, filename),
+            ).rowcount
+        if inserted and self.budget_bytes and self._usage()["bytes"] > self.budget_bytes:
+            self._wake.set()
+        return {"digest": digest, "path": path, "size": len(data), "deduplicated": False}
+
+    def import_flat_files(self) -> int:
+        """Move files left in the root by the old filename-based layout into the store."""
+        moved = 0
+        for entry in os.scandir(self.root):
+            if not entry.is_file() or entry.name.startswith(INDEX_NAME):
+                continue
+            with open(entry.path, "rb") as f:
+                self.put(f.read(), filename=entry.name)
+            os.remove(entry.path)
+            moved += 1
+        if moved:
+            logger.info(f"Imported {moved} uploads from {self.root} into the content-addressed store")
+        return moved
+
+    # === Reads ===
+
+    def lookup(self, digest: str):
+        """Index entry for a digest and mark it used, or None if not stored."""
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE blobs SET accessed_at = ? WHERE digest = ?", (time.time(), digest))
+            row = conn.execute("SELECT * FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row is None or not os.path.exists(self.path(digest)):
+            return None
+        return {**dict(row), "path": self.path(digest)}
+
+    def get(self, digest: str):
+        """Stored bytes for a digest, or None if not stored (or evicted)."""
+        entry = self.lookup(digest)
+        if entry is None:
+            return None
+        try:
+            with open(entry["path"], "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None  # evicted between the lookup and the read
+
+    # === Eviction ===
+
+    def _ensure_evictor(self):
+        if self._evictor is not None:
+            return
+        with self._lock:
+            if self._evictor is None:
+                self._evictor = threading.Thread(target=self._evict_loop, name="upload-evictor", daemon=True)
+                self._evictor.start()
+
+    def _evict_loop(self):
+        while True:
+            self._wake.wait(self.evict_interval)
+            self._wake.clear()
+            try:
+                self.evict()
+            except Exception:
+                logger.exception("Upload eviction failed")
+
+    def evict(self) -> int:
+        """Remove expired blobs, then LRU blobs until under the low watermark."""
+        conn = self._conn()
+        removed = 0
+        if self.max_age_s:
+            cutoff = time.time() - self.max_age_s
+            while True:
+                rows = conn.execute(
+                    "SELECT digest, size, accessed_at FROM blobs WHERE accessed_at < ? "
+                    "ORDER BY accessed_at LIMIT 256", (cutoff,)
+                ).fetchall()
+                if not rows:
+                    break
+                removed += self._remove(rows)
+
+        if self.budget_bytes and self._usage()["bytes"] > self.budget_bytes:
+            target = self.budget_bytes * self.low_watermark
+            while self._usage()["bytes"] > target:
+                rows = conn.execute(
+                    "SELECT digest, size, accessed_at FROM blobs ORDER BY accessed_at LIMIT 256"
+                ).fetchall()
+                if not rows:
+                    break
+                removed += self._remove(rows, target)
+        if removed:
+            logger.info(f"Evicted {removed} uploads; {self._usage()['bytes'] / 2**20:.1f} MB in use")
+        return removed
+
+    def _remove(self, rows, target=None) -> int:
+        conn = self._conn()
+        removed = 0
+        for row in rows:
+            if target is not None and self._usage()["bytes"] <= target:
+                break
+            with conn:
+                # Skip blobs touched since they were selected
+                deleted = conn.execute(
+                    "DELETE FROM blobs WHERE digest = ? AND accessed_at = ?", (row["digest"], row["accessed_at"])
+                ).rowcount
+                if not deleted:
+                    continue
+                # Unlink before committing: until then a put() of the same
+                # digest waits on the index lock, so it can't write a fresh
+                # file here only for it to be removed under its new row
+                try:
+                    os.remove(self.path(row["digest"]))
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                self.evicted += 1
+                self.evicted_bytes += row["size"]
+            removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        usage = self._usage()
+        with self._lock:
+            return {
+                "entries": usage["entries"],
+                "bytes": usage["bytes"],
+                "budget_bytes": self.budget_bytes,
+                "puts": self.puts,
+                "dedup_hits": self.dedup_hits,
+                "evicted": self.evicted,
+                "evicted_bytes": self.evicted_bytes,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_upload_store() -> UploadStore:
+    """Process-wide store shared by the FastAPI and Flask servers."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = UploadStore()
+    return _store
@@ -0,0 +1,198 @@
+# gnn/drug_safety.py
+
+import os
+import threading
+import logging
+
+import numpy as np
+import torch
+
+from utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+GNN_MODEL_PATH = os.getenv("GNN_MODEL_PATH", os.path.join("gnn", "models", "gnn_model.pt"))
+# Node features the model was trained with (written by data/scripts/train_gnn.py)
+GNN_FEATURES_PATH = os.getenv("GNN_FEATURES_PATH", os.path.join("gnn", "models", "gnn_features.pt"))
+RISK_THRESHOLD = float(os.getenv("DRUG_RISK_THRESHOLD", 0.5))
+# Above this many drugs the n x n matrix is not materialized; pairs are
+# scored from the cached embeddings at query time instead (still no GNN pass).
+DENSE_MAX_DRUGS = int(os.getenv("DRUG_RISK_DENSE_MAX", 5000))
+
+# Training objective whose output embeddings score pairs as sigmoid(z_i . z_j)
+LINK_PREDICTION = "link_prediction"
+
+
+def load_checkpoint(model_path=GNN_MODEL_PATH):
+    """
+    (state_dict, info) from a model file. Files written by
+    data/scripts/train_gnn.py record the training objective and layer sizes
+    in `info`; a bare state_dict (older files) gets an empty one.
+    """
+    checkpoint = torch.load(model_path, map_location="cpu")
+    if "model" in checkpoint and "objective" in checkpoint:
+        return checkpoint["model"], {k: v for k, v in checkpoint.items() if k != "model"}
+    return checkpoint, {}
+
+
+def load_model(model_path=GNN_MODEL_PATH):
+    """
+    Trained DrugGNN in eval mode, with layer sizes from the checkpoint.
+    `model.objective` is the training objective, or None if unrecorded.
+    """
+    from gnn.models.gnn_model import DrugGNN
+
+    state, info = load_checkpoint(model_path)
+    in_feats = info.get("input_dim", state["conv1.fc_self.weight"].shape[1])
+    hidden_feats = info.get("hidden_dim", state["conv1.fc_self.weight"].shape[0])
+    out_feats = info.get("output_dim", state["conv2.fc_self.weight"].shape[0])
+
+    model = DrugGNN(in_feats, hidden_feats, out_feats)
+    model.load_state_dict(state)
+    model.eval()
+    model.objective = info.get("objective")
+    return model
+
+
+def node_features(graph, in_feats, features_path=GNN_FEATURES_PATH):
+    """The node features the model was trained on, or a deterministic stand-in."""
+    if os.path.exists(features_path):
+        features = torch.load(features_path, map_location="cpu")
+        if features.shape == (graph.num_nodes(), in_feats):
+            return features
+        logger.warning(f"Ignoring {features_path}: shape {tuple(features.shape)} does not match the model")
+    feat = graph.ndata.get("feat")
+    if feat is not None and feat.shape[1] == in_feats:
+        return feat
+    # Same fallback as training: random features, but seeded so every
+    # worker and restart gets the same embeddings.
+    logger.warning(f"No saved {in_feats}-dim node features, using seeded random features")
+    generator = torch.Generator().manual_seed(0)
+    return torch.randn(graph.num_nodes(), in_feats, generator=generator)
+
+
+class DrugSafetyIndex:
+    """
+    Pairwise interaction risk for every drug in the graph, computed once.
+
+    The trained DrugGNN is run once over the whole `build_graph()` graph to
+    get one embedding per drug. The risk for a pair is sigmoid(z_i . z_j).
+    All pairs are scored up front, so a query is a lookup with no forward
+    pass. Drug ids are node indices of that graph.
+
+    That score only means something for a model trained for link
+    prediction (TRAIN_MODE=minibatch). For any other checkpoint nothing is
+    scored: pairs come back with `"risk": None`, and only documented
+    interactions are flagged.
+    """
+
+    def __init__(self, model_path=GNN_MODEL_PATH, features_path=GNN_FEATURES_PATH):
+        from data.drugs_graph import load_drug_graph
+
+        graph, drugs = load_drug_graph()
+        self.drugs = drugs
+        self.drug_to_idx = {drug: idx for idx, drug in enumerate(self.drugs)}
+        self.num_drugs = len(drugs)
+
+        # Kept for known-interaction lookups (vectorized, no edge set in Python)
+        self.graph = graph
+
+        model = load_model(model_path)
+        self.scored = model.objective == LINK_PREDICTION
+        self.embeddings = None
+        self.dense = self.num_drugs <= DENSE_MAX_DRUGS
+        self.risk = None
+        if not self.scored:
+            logger.warning(
+                f"{model_path} was not trained for link prediction (objective: {model.objective or 'unrecorded'}); "
+                f"drug pairs get no risk score, only documented interactions are flagged. "
+                f"Retrain with TRAIN_MODE=minibatch python data/scripts/train_gnn.py"
+            )
+            return
+
+        features = node_features(graph, model.conv1.fc_self.in_features, features_path)
+        with torch.no_grad():
+            embeddings = model(graph, features)
+        self.embeddings = embeddings.numpy().astype(np.float32)
+
+        if self.dense:
+            self.risk = self._score_block(self.embeddings, self.embeddings)
+            np.fill_diagonal(self.risk, 0.0)
+        logger.info(
+            f"Drug risk index ready: {self.num_drugs} drugs, "
+            f"{'dense matrix' if self.dense else 'scored from embeddings'}"
+        )
+
+    @staticmethod
+    def _score_block(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-(a @ b.T)))
+
+    def resolve(self, drugs: list) -> list:
+        """Map drug names or indices to node indices; raises ValueError on unknowns."""
+        ids = []
+        for drug in drugs:
+            if isinstance(drug, str):
+                if drug not in self.drug_to_idx:
+                    raise ValueError(f"Unknown drug: {drug}")
+                ids.append(self.drug_to_idx[drug])
+            else:
+                if not 0 <= int(drug) < self.num_drugs:
+                    raise ValueError(f"Unknown drug id: {drug}")
+                ids.append(int(drug))
+        return ids
+
+    def pair_risks(self, ids: list) -> np.ndarray:
+        """Risk submatrix for a medication list, in one vectorized lookup."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.dense:
+            return self.risk[np.ix_(ids, ids)]
+        return self._score_block(self.embeddings[ids], self.embeddings[ids])
+
+    @timed("drug_safety_check", "gnn")
+    def check(self, drugs: list, threshold: float = RISK_THRESHOLD) -> dict:
+        """Every distinct pair in the list, riskiest first."""
+        ids = list(dict.fromkeys(self.resolve(drugs)))
+        risks = self.pair_risks(ids) if self.scored else None
+        rows, cols = np.triu_indices(len(ids), k=1)
+        id_array = np.asarray(ids, dtype=np.int64)
+        known_edges = self.graph.has_edges_between(
+            torch.from_numpy(id_array[rows]), torch.from_numpy(id_array[cols])
+        ).tolist()
+
+        interactions = []
+        for r, c, known in zip(rows.tolist(), cols.tolist(), known_edges):
+            i, j = ids[r], ids[c]
+            if risks is not None:
+                risk = round(float(risks[r, c]), 4)
+                # A documented interaction is always flagged, whatever the model says
+                risky = risk > threshold or known
+            else:
+                # No usable model: only what the interaction data says is known
+                risk, risky = None, True if known else None
+            interactions.append({
+                "drug_ids": [i, j],
+                "drugs": [self.drugs[i], self.drugs[j]],
+                "risk": risk,
+                "risky": risky,
+                "known_interaction": known,
+            })
+        interactions.sort(key=lambda pair: (bool(pair["risky"]), pair["risk"] or 0.0), reverse=True)
+        return {
+            "interactions": interactions,
+            "risky_pairs": sum(bool(pair["risky"]) for pair in interactions),
+            "scored": self.scored,
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_drug_safety_index() -> DrugSafetyIndex:
+    """Built once per process on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DrugSafetyIndex()
+    return _index
@@ -0,0 +1,381 @@
+# gnn/embedding_index.py
+#
+# Persistent vector index over DrugGNN drug embeddings, for "what else does
+# this drug interact with" queries without scoring every pair.
+#
+# Each drug has two vectors:
+#   - its hidden-layer embedding (DrugGNN.embed), L2-normalized, for the
+#     most similar drugs by cosine similarity;
+#   - its output embedding, for the riskiest partners by sigmoid(z_i . z_j),
+#     the same score gnn/drug_safety.py serves.
+# Small indexes are searched exactly with one matrix product. Large ones use
+# an inverted-file (IVF) layout: vectors are bucketed by k-means centroid and
+# a query only scans the `nprobe` best-matching buckets. New drugs go into
+# their nearest existing bucket; centroids are retrained only once the index
+# has grown several times over.
+#
+# Index ids are the drug graph's node ids, the same ids /check-drug-safety
+# takes. The saved index records the model file and the graph/feature
+# source it was computed from; when the source changes it is refreshed on
+# load, incrementally as long as the existing drugs keep their node ids.
+
+import os
+import io
+import hashlib
+import threading
+import logging
+
+import numpy as np
+import torch
+
+from gnn.drug_safety import GNN_MODEL_PATH, GNN_FEATURES_PATH, load_model, node_features
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+DRUG_INDEX_PATH = os.getenv("DRUG_INDEX_PATH", os.path.join("gnn", "models", "drug_index.npz"))
+# Switch from exact search to IVF at this many drugs
+DRUG_INDEX_ANN_MIN = int(os.getenv("DRUG_INDEX_ANN_MIN", 50_000))
+DRUG_INDEX_NPROBE = int(os.getenv("DRUG_INDEX_NPROBE", 8))
+# Retrain IVF centroids once the index is this many times its trained size
+RETRAIN_GROWTH = 4
+KMEANS_ITERATIONS = 10
+ASSIGN_CHUNK = 65_536
+
+
+class _VectorSpace:
+    """Growable (n, dim) float32 matrix with an optional IVF layout."""
+
+    def __init__(self, dim, normalize):
+        self.dim = dim
+        self.normalize = normalize
+        self.size = 0
+        self._data = np.empty((0, dim), dtype=np.float32)
+        self._assign = np.empty(0, dtype=np.int32)
+        self.centroids = None
+        self.trained_size = 0
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._data[:self.size]
+
+    def _prepare(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if self.normalize:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors
+
+    def _reserve(self, size):
+        if size <= len(self._data):
+            return
+        # Amortized doubling, so adding drugs one at a time stays cheap
+        capacity = max(size, 2 * len(self._data), 64)
+        data = np.empty((capacity, self.dim), dtype=np.float32)
+        data[:self.size] = self._data[:self.size]
+        assign = np.zeros(capacity, dtype=np.int32)
+        assign[:self.size] = self._assign[:self.size]
+        self._data, self._assign = data, assign
+
+    def upsert(self, ids: np.ndarray, vectors):
+        vectors = self._prepare(vectors)
+        end = int(ids.max()) + 1 if len(ids) else 0
+        self._reserve(end)
+        self._data[ids] = vectors
+        self.size = max(self.size, end)
+        if self.centroids is not None:
+            self._assign[ids] = self._nearest_centroids(vectors)
+
+    def train(self, nlist: int, seed: int = 0):
+        """k-means on a sample, then bucket every vector."""
+        rng = np.random.default_rng(seed)
+        vectors = self.vectors
+        sample = vectors[rng.choice(self.size, size=min(self.size, nlist * 256), replace=False)]
+        self.centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assign = self._nearest_centroids(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            filled = counts > 0
+            self.centroids[filled] = sums[filled] / counts[filled, None]
+
+        for start in range(0, self.size, ASSIGN_CHUNK):
+            chunk = vectors[start:start + ASSIGN_CHUNK]
+            self._assign[start:start + len(chunk)] = self._nearest_centroids(chunk)
+        self.trained_size = self.size
+
+    def _nearest_centroids(self, vectors) -> np.ndarray:
+        # argmin ||x - c||^2 == argmax (x . c - ||c||^2 / 2)
+        half_norms = 0.5 * np.einsum("ij,ij->i", self.centroids, self.centroids)
+        return np.argmax(vectors @ self.centroids.T - half_norms, axis=1).astype(np.int32)
+
+    def search(self, queries: np.ndarray, k: int, exclude, nprobe=DRUG_INDEX_NPROBE):
+        """
+        Top-k ids by the best inner product with any of `queries`.
+        Returns (ids, scores, best_query_row), best first.
+        """
+        if self.centroids is None:
+            candidates = np.arange(self.size)
+        else:
+            probe = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+            candidates = np.flatnonzero(np.isin(self._assign[:self.size], probe))
+
+        scores = queries @ self._data[candidates].T
+        best_row = scores.argmax(axis=0)
+        scores = scores[best_row, np.arange(len(candidates))]
+        scores[np.isin(candidates, exclude)] = -np.inf
+
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return candidates[top], scores[top], best_row[top]
+
+    def state(self, prefix) -> dict:
+        return {
+            f"{prefix}_vectors": self.vectors,
+            f"{prefix}_assign": self._assign[:self.size],
+            f"{prefix}_centroids": self.centroids if self.centroids is not None else np.empty((0, self.dim), np.float32),
+            f"{prefix}_trained_size": np.int64(self.trained_size),
+        }
+
+    @classmethod
+    def from_state(cls, state, prefix, normalize):
+        vectors = state[f"{prefix}_vectors"]
+        space = cls(vectors.shape[1], normalize)
+        space.size = len(vectors)
+        space._data = np.array(vectors, dtype=np.float32)
+        space._assign = np.array(state[f"{prefix}_assign"], dtype=np.int32)
+        centroids = state[f"{prefix}_centroids"]
+        space.centroids = np.array(centroids, dtype=np.float32) if len(centroids) else None
+        space.trained_size = int(state[f"{prefix}_trained_size"])
+        return space
+
+
+class DrugEmbeddingIndex:
+    """
+    Top-k partner queries over materialized drug embeddings.
+
+    `approximate=None` picks exact search below DRUG_INDEX_ANN_MIN drugs and
+    IVF above it; True/False forces a mode.
+    """
+
+    def __init__(self, hidden_dim, output_dim, approximate=None, model_hash="", source_hash=""):
+        self.drugs = []
+        self.drug_to_idx = {}
+        self.similar = _VectorSpace(hidden_dim, normalize=True)
+        self.risk = _VectorSpace(output_dim, normalize=False)
+        self.approximate = approximate
+        self.model_hash = model_hash
+        self.source_hash = source_hash
+        self._lock = threading.RLock()
+
+    @property
+    def num_drugs(self) -> int:
+        return len(self.drugs)
+
+    def add(self, drugs: list, hidden, output) -> list:
+        """Insert new drugs or replace the vectors of existing ones; returns their ids."""
+        with self._lock:
+            ids = []
+            for drug in drugs:
+                idx = self.drug_to_idx.get(drug)
+                if idx is None:
+                    idx = self.drug_to_idx[drug] = len(self.drugs)
+                    self.drugs.append(drug)
+                ids.append(idx)
+            id_array = np.asarray(ids, dtype=np.int64)
+            self.similar.upsert(id_array, hidden)
+            self.risk.upsert(id_array, output)
+            self._maybe_train()
+            return ids
+
+    def _maybe_train(self):
+        approximate = self.approximate
+        if approximate is None:
+            approximate = self.num_drugs >= DRUG_INDEX_ANN_MIN
+        if not approximate:
+            self.similar.centroids = self.risk.centroids = None
+            return
+        for space in (self.similar, self.risk):
+            if space.centroids is None or space.size >= RETRAIN_GROWTH * space.trained_size:
+                nlist = min(space.size, max(1, int(4 * np.sqrt(space.size))))
+                logger.info(f"Training IVF index: {space.size} drugs, {nlist} buckets")
+                space.train(nlist)
+
+    def resolve(self, drugs: list) -> list:
+        """Map drug names or indices to ids; raises ValueError on unknowns."""
+        ids = []
+        for drug in drugs:
+            if isinstance(drug, str):
+                if drug not in self.drug_to_idx:
+                    raise ValueError(f"Unknown drug: {drug}")
+                ids.append(self.drug_to_idx[drug])
+            else:
+                if not 0 <= int(drug) < self.num_drugs:
+                    raise ValueError(f"Unknown drug id: {drug}")
+                ids.append(int(drug))
+        return list(dict.fromkeys(ids))
+
+    def nearest(self, drugs: list, k: int = 10) -> list:
+        """Drugs whose hidden embedding is closest to the given drug(s)."""
+        with self._lock, span("embedding_query", "gnn"):
+            ids = self.resolve(drugs)
+            query = self.similar.vectors[ids].mean(axis=0, keepdims=True)
+            query /= max(np.linalg.norm(query), 1e-12)
+            found, scores, _ = self.similar.search(query, k, exclude=ids)
+            return [
+                {"drug_id": int(i), "drug": self.drugs[i], "similarity": round(float(s), 4)}
+                for i, s in zip(found, scores)
+            ]
+
+    def riskiest(self, drugs: list, k: int = 10) -> list:
+        """
+        Partners with the highest interaction risk against any of the given
+        drug(s); `with` names the listed drug that pair is riskiest with.
+        """
+        with self._lock, span("embedding_query", "gnn"):
+            ids = self.resolve(drugs)
+            found, scores, rows = self.risk.search(self.risk.vectors[ids], k, exclude=ids)
+            risks = 1.0 / (1.0 + np.exp(-scores))
+            return [
+                {"drug_id": int(i), "drug": self.drugs[i], "risk": round(float(r), 4),
+                 "with": self.drugs[ids[row]]}
+                for i, r, row in zip(found, risks, rows)
+            ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "drugs": self.num_drugs,
+                "mode": "ivf" if self.risk.centroids is not None else "exact",
+                "buckets": 0 if self.risk.centroids is None else len(self.risk.centroids),
+                "nprobe": DRUG_INDEX_NPROBE,
+            }
+
+    def save(self, path=DRUG_INDEX_PATH):
+        """Write the index atomically (tmp file + rename)."""
+        with self._lock:
+            buffer = io.BytesIO()
+            np.savez(
+                buffer,
+                drugs=np.asarray(self.drugs, dtype=str),
+                model_hash=np.asarray(self.model_hash),
+                source_hash=np.asarray(self.source_hash),
+                **self.similar.state("similar"),
+                **self.risk.state("risk"),
+            )
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+        logger.info(f"Saved drug embedding index ({self.num_drugs} drugs) to {path}")
+
+    @classmethod
+    def load(cls, path=DRUG_INDEX_PATH, approximate=None):
+        with np.load(path, allow_pickle=False) as state:
+            # Indexes saved before source tracking count as stale
+            source_hash = str(state["source_hash"]) if "source_hash" in state.files else ""
+            index = cls(1, 1, approximate=approximate, model_hash=str(state["model_hash"]),
+                        source_hash=source_hash)
+            index.similar = _VectorSpace.from_state(state, "similar", normalize=True)
+            index.risk = _VectorSpace.from_state(state, "risk", normalize=False)
+            index.drugs = state["drugs"].tolist()
+        index.drug_to_idx = {drug: idx for idx, drug in enumerate(index.drugs)}
+        return index
+
+
+def _file_hash(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def compute_embeddings(model_path=GNN_MODEL_PATH, features_path=GNN_FEATURES_PATH):
+    """(drug names, hidden embeddings, output embeddings) for the current drug graph."""
+    from data.drugs_graph import load_drug_graph
+
+    graph, drugs = load_drug_graph()
+    model = load_model(model_path)
+    features = node_features(graph, model.conv1.fc_self.in_features, features_path)
+    with torch.no_grad():
+        hidden = model.embed(graph, features)
+        output = model.conv2(graph, hidden)
+    return drugs, hidden.numpy(), output.numpy()
+
+
+def source_fingerprint(features_path=GNN_FEATURES_PATH) -> str:
+    """The drug graph and the saved node features embeddings are computed from."""
+    from data.drugs_graph import graph_fingerprint
+
+    features = _file_hash(features_path) if os.path.exists(features_path) else "none"
+    return f"{graph_fingerprint()}:{features}"
+
+
+def refresh_index(index=None, model_path=GNN_MODEL_PATH, path=DRUG_INDEX_PATH,
+                  features_path=GNN_FEATURES_PATH):
+    """
+    Bring an index up to date with the current graph and model and save it.
+    Existing buckets are kept, so adding drugs doesn't rebuild the index. A
+    different model file, or a graph in which existing drugs moved to other
+    node ids, starts a fresh one.
+    """
+    model_hash = _file_hash(model_path)
+    source_hash = source_fingerprint(features_path)
+    drugs, hidden, output = compute_embeddings(model_path, features_path)
+    if index is not None and index.model_hash != model_hash:
+        logger.info("Drug embedding index was built from another model, rebuilding")
+        index = None
+    if index is not None and drugs[:index.num_drugs] != index.drugs:
+        logger.info("Drug graph node ids changed, rebuilding the drug embedding index")
+        index = None
+    if index is None:
+        index = DrugEmbeddingIndex(hidden.shape[1], output.shape[1], model_hash=model_hash)
+    added = len(drugs) - index.num_drugs
+    # Every existing drug is at the same position, so ids stay node ids
+    index.add(drugs, hidden, output)
+    index.source_hash = source_hash
+    index.save(path)
+    logger.info(f"Drug embedding index refreshed: {added} new drugs, {index.num_drugs} total")
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_embedding_index() -> DrugEmbeddingIndex:
+    """
+    Loaded from DRUG_INDEX_PATH, or built from the model on first use. A saved
+    index whose model, graph or features are out of date is refreshed first.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = DrugEmbeddingIndex.load(DRUG_INDEX_PATH) if os.path.exists(DRUG_INDEX_PATH) else None
+                if (index is None or index.model_hash != _file_hash(GNN_MODEL_PATH)
+                        or index.source_hash != source_fingerprint()):
+                    index = refresh_index(index)
+                _index = index
+    return _index
+
+
+if __name__ == "__main__":
+    # python -m gnn.embedding_index [drug ...]
+    # Builds or refreshes the index, then prints partners for the given drugs.
+    import sys
+    import json
+
+    logging.basicConfig(level=logging.INFO)
+    existing = DrugEmbeddingIndex.load() if os.path.exists(DRUG_INDEX_PATH) else None
+    index = refresh_index(existing)
+    print(json.dumps(index.stats()))
+    for drug in sys.argv[1:]:
+        print(f"{drug} riskiest: {json.dumps(index.riskiest([drug], k=5))}")
+        print(f"{drug} nearest:  {json.dumps(index.nearest([drug], k=5))}")
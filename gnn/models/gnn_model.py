@@ -23,11 +23,21 @@ class DrugGNN(nn.Module):
         )
 
     def forward(self, graph, features):
-        h = self.conv1(graph, features)
-        h = torch.relu(h)
-        h = self.conv2(graph, h)
+        # `graph` is either the full graph or a list of two sampled blocks
+        # (one per layer) from dgl.dataloading.NeighborSampler
+        if isinstance(graph, (list, tuple)):
+            block1, block2 = graph
+        else:
+            block1 = block2 = graph
+        h = self.embed(block1, features)
+        h = self.conv2(block2, h)
         return h
 
+    def embed(self, graph, features):
+        # Hidden-layer drug embeddings (first layer output, after ReLU)
+        h = self.conv1(graph, features)
+        return torch.relu(h)
+
 # 🛠️ Helper: Quick model builder
 def build_gnn_model(graph):
     in_feats = graph.ndata["feat"].shape[1]
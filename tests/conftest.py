@@ -0,0 +1,24 @@
+# tests/conftest.py
+#
+# Point every on-disk store at a scratch directory and skip weight downloads
+# before any application module reads its settings at import time.
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_scratch = tempfile.mkdtemp(prefix="medassist-tests-")
+os.environ.setdefault("PRETRAINED_WEIGHTS", "0")
+os.environ.setdefault("LOG_DB", os.path.join(_scratch, "diagnosis_log.db"))
+os.environ.setdefault("LOG_FILE", os.path.join(_scratch, "diagnosis_log.csv"))
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_scratch, "uploads"))
+os.environ.setdefault("CHEXNET_HEAD_WEIGHTS", os.path.join(_scratch, "weights", "chexnet_head.pt"))
+os.environ.setdefault("SCREEN_WEIGHTS", os.path.join(_scratch, "weights", "screen.pt"))
+os.environ.setdefault("CAM_DIR", os.path.join(_scratch, "heatmaps"))
+os.environ.setdefault("EXPLANATIONS_PATH", os.path.join(_scratch, "explanations.json"))
+os.environ.setdefault("EXPLAIN_PREFETCH", "0")
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,64 @@
+# tests/test_batching.py
+
+import threading
+
+import pytest
+
+from vision.models.batching import MicroBatcher
+
+
+class Recorder:
+    """predict_fn that records the batches it was given."""
+
+    def __init__(self, fn=lambda items: [item * 10 for item in items]):
+        self.fn = fn
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, items):
+        self.release.wait(5)
+        self.batches.append(list(items))
+        return self.fn(items)
+
+
+def test_each_caller_gets_its_own_result():
+    predict = Recorder()
+    predict.release.clear()
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=50, name="test")
+
+    # Hold the worker on the first batch so the rest queue up behind it
+    first = batcher.submit(0)
+    futures = [batcher.submit(i) for i in range(1, 9)]
+    predict.release.set()
+
+    assert first.result(timeout=5) == 0
+    assert [f.result(timeout=5) for f in futures] == [i * 10 for i in range(1, 9)]
+    assert all(len(batch) <= 4 for batch in predict.batches)
+    assert sorted(item for batch in predict.batches for item in batch) == list(range(9))
+    assert batcher.stats()["items"] == 9
+
+
+def test_failed_batch_fails_every_caller():
+    def explode(items):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(explode, max_wait_ms=20, name="test")
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(ValueError, match="boom"):
+            future.result(timeout=5)
+
+
+def test_short_result_list_fails_the_leftover_callers():
+    predict = Recorder(lambda items: [item * 10 for item in items][:1])
+    predict.release.clear()
+    batcher = MicroBatcher(predict, max_batch_size=8, max_wait_ms=50, name="test")
+
+    futures = [batcher.submit(i) for i in range(3)]
+    predict.release.set()
+
+    assert futures[0].result(timeout=5) == 0
+    for future in futures[1:]:
+        with pytest.raises(RuntimeError, match="no result"):
+            future.result(timeout=5)
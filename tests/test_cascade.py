@@ -0,0 +1,64 @@
+# tests/test_cascade.py
+
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from vision.models import cascade
+from vision.models.cascade import Cascade, route
+
+
+def test_route_band():
+    assert route(0.1, low=0.2, high=0.8) == "screen_low"
+    assert route(0.2, low=0.2, high=0.8) == "escalated"
+    assert route(0.79, low=0.2, high=0.8) == "escalated"
+    assert route(0.8, low=0.2, high=0.8) == "screen_high"
+    assert route(0.95, low=0.2, high=0.8, accept_high=False) == "escalated"
+
+
+def screener_probs(tops):
+    probs = torch.zeros(len(tops), len(cascade.SCREEN_CLASSES))
+    probs[:, 0] = torch.tensor(tops)
+    return probs
+
+
+def make_cascade(monkeypatch, tops, distilled=True, **kwargs):
+    monkeypatch.setattr(cascade, "get_screener", lambda: SimpleNamespace(distilled=distilled, version="test"))
+    monkeypatch.setattr(cascade, "screen_probs", lambda grays: screener_probs(tops))
+    heavy_calls = []
+
+    def heavy(grays):
+        heavy_calls.append(list(grays))
+        return [{"diagnosis": "heavy", "input": g} for g in grays]
+
+    screened = lambda probs: {"diagnosis": "screen", "top": round(probs.max().item(), 2)}
+    return Cascade("test", heavy, screened, "model", "v", low=0.2, high=0.8, **kwargs), heavy_calls
+
+
+def test_only_uncertain_studies_reach_the_heavy_model(monkeypatch):
+    model, heavy_calls = make_cascade(monkeypatch, [0.1, 0.5, 0.9, 0.3])
+    results = model.predict_batch(["a", "b", "c", "d"])
+
+    assert heavy_calls == [["b", "d"]]
+    assert [r["stage"] for r in results] == ["screen", "full", "screen", "full"]
+    assert [r.get("input") for r in results] == [None, "b", None, "d"]
+    assert model.stats()["routes"] == {"screen_low": 1, "screen_high": 1, "escalated": 2}
+
+
+def test_high_band_escalates_without_accept_high(monkeypatch):
+    model, heavy_calls = make_cascade(monkeypatch, [0.1, 0.9], accept_high=False)
+    results = model.predict_batch(["a", "b"])
+
+    assert heavy_calls == [["b"]]
+    assert [r["stage"] for r in results] == ["screen", "full"]
+
+
+def test_undistilled_screener_escalates_everything(monkeypatch):
+    model, heavy_calls = make_cascade(monkeypatch, [0.01, 0.99], distilled=False)
+    results = model.predict_batch(["a", "b"])
+
+    assert heavy_calls == [["a", "b"]]
+    assert all(r["stage"] == "full" for r in results)
@@ -0,0 +1,68 @@
+# tests/test_diagnosis.py
+
+import io
+import itertools
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("fastapi")
+
+import numpy as np
+from PIL import Image
+from fastapi.testclient import TestClient
+
+from api import main
+from api.executor import InferenceExecutor
+from vision.models import chexnet_model
+from vision.models.result_cache import result_cache
+
+
+_seeds = itertools.count()
+
+
+def xray_png() -> bytes:
+    """A grayscale PNG no other test uploads, so it never starts as a cache hit."""
+    pixels = np.random.default_rng(next(_seeds)).integers(0, 256, (256, 256), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, "L").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def no_explanation(diagnosis):
+    return None
+
+
+@pytest.fixture(params=["thread", "process"])
+def client(request, monkeypatch):
+    executor = InferenceExecutor(kind=request.param, workers=1)
+    monkeypatch.setattr(main, "executor", executor)
+    monkeypatch.setattr(main, "_explain", no_explanation)
+    try:
+        with TestClient(main.app) as client:
+            yield client
+    finally:
+        executor.shutdown()
+
+
+def test_diagnose_runs_in_both_pool_kinds(client):
+    image = xray_png()
+    hits_before = result_cache.stats()["memory_hits"]
+
+    first = client.post("/diagnose", files={"file": ("study.png", image, "image/png")})
+    assert first.status_code == 200, first.text
+    body = first.json()
+    assert body["diagnosis"] in chexnet_model.CLASSES
+    assert 0.0 <= body["confidence"] <= 1.0
+    assert len(body["image_hash"]) == 64
+
+    # The cache lives in the server process, so the repeat is a hit there
+    second = client.post("/diagnose", files={"file": ("study.png", image, "image/png")})
+    assert second.status_code == 200, second.text
+    assert second.json()["diagnosis"] == body["diagnosis"]
+    assert result_cache.stats()["memory_hits"] == hits_before + 1
+
+
+def test_diagnose_rejects_garbage(client):
+    response = client.post("/diagnose", files={"file": ("study.png", b"not an image", "image/png")})
+    assert response.status_code == 400
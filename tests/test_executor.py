@@ -0,0 +1,58 @@
+# tests/test_executor.py
+
+import os
+import asyncio
+
+import pytest
+
+from api.executor import InferenceExecutor, Overloaded
+
+
+def square(x: int) -> int:
+    # Module level, so process pools can pickle it by reference
+    return x * x
+
+
+def worker_pid() -> int:
+    return os.getpid()
+
+
+@pytest.fixture(params=["thread", "process"])
+def executor(request):
+    executor = InferenceExecutor(kind=request.param, workers=2, max_inflight=2)
+    yield executor
+    executor.shutdown()
+
+
+def test_run_returns_results_in_both_pool_kinds(executor):
+    async def run_all():
+        return await asyncio.gather(*(executor.run(square, i) for i in range(8)))
+
+    assert asyncio.run(run_all()) == [i * i for i in range(8)]
+
+
+def test_process_pool_runs_outside_this_process():
+    executor = InferenceExecutor(kind="process", workers=1)
+    try:
+        assert asyncio.run(executor.run(worker_pid)) != os.getpid()
+    finally:
+        executor.shutdown()
+
+
+def test_slot_rejects_past_max_inflight(executor):
+    async def overfill():
+        async with executor.slot(), executor.slot():
+            with pytest.raises(Overloaded) as excinfo:
+                async with executor.slot():
+                    pass
+            assert excinfo.value.retry_after == executor.retry_after
+            assert executor.stats()["inflight"] == 2
+
+    asyncio.run(overfill())
+    stats = executor.stats()
+    assert (stats["inflight"], stats["completed"], stats["rejected"]) == (0, 2, 1)
+
+
+def test_unknown_pool_kind():
+    with pytest.raises(ValueError):
+        InferenceExecutor(kind="fiber")
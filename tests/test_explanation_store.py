@@ -0,0 +1,67 @@
+# tests/test_explanation_store.py
+
+import json
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("dotenv")
+
+from utils import explanation_store as module
+from utils.explanation_store import ExplanationStore
+from utils.llm_gateway import LLMError
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Live LLM calls the store starts, as {label: Future} the test settles."""
+    started = {}
+
+    def start_explanation(diagnosis):
+        started[diagnosis] = Future()
+        return started[diagnosis]
+
+    monkeypatch.setattr(module, "start_explanation", start_explanation)
+    return started
+
+
+def test_miss_answers_none_and_fills_in_the_background(tmp_path, calls):
+    path = tmp_path / "explanations.json"
+    store = ExplanationStore(path=str(path))
+
+    assert store.peek("Edema") is None
+    assert store.peek("Edema") is None
+    assert list(calls) == ["Edema"]  # one shared call, not one per request
+
+    calls["Edema"].set_result("Fluid in the lungs.")
+    assert store.peek("Edema") == "Fluid in the lungs."
+    assert json.loads(path.read_text())["explanations"] == {"Edema": "Fluid in the lungs."}
+    assert ExplanationStore(path=str(path)).lookup("Edema") == "Fluid in the lungs."
+
+
+def test_failed_call_is_not_retried_until_retry_after(tmp_path, calls, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: clock[0])
+    store = ExplanationStore(path=str(tmp_path / "explanations.json"), retry_after=60)
+
+    store.peek("Mass")
+    calls.pop("Mass").set_exception(LLMError("down"))
+    assert store.peek("Mass") is None
+    assert not calls
+    with pytest.raises(LLMError):
+        store.get("Mass")  # fails fast instead of waiting on the LLM
+
+    clock[0] += 61
+    assert store.peek("Mass") is None
+    assert list(calls) == ["Mass"]
+    assert store.stats()["failures"] == 1
+
+
+def test_prefetch_starts_only_missing_labels(tmp_path, calls):
+    path = tmp_path / "explanations.json"
+    module.write_table({"Edema": "known"}, str(path))
+    store = ExplanationStore(path=str(path))
+
+    assert store.prefetch(["Edema", "Mass", "Nodule"]) == 2
+    assert sorted(calls) == ["Mass", "Nodule"]
@@ -0,0 +1,43 @@
+# tests/test_log_store.py
+
+import sqlite3
+
+from data import log_store
+from data.log_store import DiagnosisLogStore, SCHEMA, SCHEMA_VERSION
+
+
+def insert(path, timestamp, source="flask"):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("INSERT INTO diagnoses (created_at, timestamp, source) VALUES (1, ?, ?)", (timestamp, source))
+    conn.close()
+
+
+def test_timestamp_migration_runs_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_store, "LOG_FILE", str(tmp_path / "missing.csv"))
+    path = str(tmp_path / "log.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.close()
+    insert(path, "20240101_120000")
+
+    store = DiagnosisLogStore(path)
+    records, _ = store.query()
+    assert records[0]["timestamp"] == "2024-01-01 12:00:00"
+    assert store._conn().execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+
+    # Already migrated: later starts don't scan the table again
+    calls = []
+    monkeypatch.setattr(DiagnosisLogStore, "_normalize_existing", lambda self: calls.append(1))
+    DiagnosisLogStore(path)
+    assert calls == []
+
+
+def test_new_records_are_normalised_on_write(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_store, "LOG_FILE", str(tmp_path / "missing.csv"))
+    store = DiagnosisLogStore(str(tmp_path / "log.db"))
+    store.append({"timestamp": "20240101_120000", "diagnosis": "Edema"})
+    store.flush()
+
+    records, _ = store.query()
+    assert records[0]["timestamp"] == "2024-01-01 12:00:00"
@@ -0,0 +1,59 @@
+# tests/test_registry.py
+
+import threading
+
+import pytest
+
+from vision.models import registry
+
+
+@pytest.fixture
+def names():
+    registered = []
+
+    def register(name, loader):
+        registry.register(name, loader)
+        registered.append(name)
+
+    yield register
+    for name in registered:
+        registry._loaders.pop(name, None)
+        registry._models.pop(name, None)
+        registry._load_times.pop(name, None)
+
+
+def load_in_thread(name, timeout=5):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(model=registry.get_model(name)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"loading {name!r} deadlocked"
+    return result["model"]
+
+
+def test_loader_can_load_another_model(names):
+    # Like chexnet_runner, whose loader wraps the eager chexnet model
+    names("test_inner", lambda: {"name": "inner"})
+    names("test_outer", lambda: {"wraps": registry.get_model("test_inner")})
+
+    outer = load_in_thread("test_outer")
+    assert outer["wraps"] is registry.get_model("test_inner")
+    assert registry.is_loaded("test_inner")
+
+
+def test_each_model_is_built_once(names):
+    calls = []
+    started = threading.Event()
+
+    def slow_loader():
+        calls.append(1)
+        started.wait(0.2)
+        return object()
+
+    names("test_slow", slow_loader)
+    threads = [threading.Thread(target=registry.get_model, args=("test_slow",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
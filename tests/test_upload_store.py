@@ -0,0 +1,81 @@
+# tests/test_upload_store.py
+
+import os
+import time
+
+import pytest
+
+from data.upload_store import UploadStore
+
+KB = 1024
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    def make(**kwargs):
+        kwargs.setdefault("evict_interval", 3600)
+        return UploadStore(root=str(tmp_path / "uploads"), **kwargs)
+    return make
+
+
+def blob(n: int) -> bytes:
+    return bytes([n % 256]) * KB
+
+
+def test_identical_uploads_are_stored_once(make_store):
+    store = make_store()
+    first = store.put(blob(1), filename="a.png")
+    second = store.put(blob(1), filename="b.png")
+
+    assert first["digest"] == second["digest"]
+    assert (first["deduplicated"], second["deduplicated"]) == (False, True)
+    assert store.get(first["digest"]) == blob(1)
+    stats = store.stats()
+    assert (stats["entries"], stats["bytes"], stats["dedup_hits"]) == (1, KB, 1)
+
+
+def test_eviction_removes_least_recently_used(make_store):
+    store = make_store(budget_mb=4 * KB / 2**20, low_watermark=0.5)
+    digests = []
+    for n in range(4):
+        digests.append(store.put(blob(n))["digest"])
+        time.sleep(0.002)
+    # Reading the oldest makes it the most recently used
+    assert store.get(digests[0]) is not None
+    # Over budget: wakes the background evictor, which may get there first
+    store.put(blob(4))
+    store.evict()
+
+    assert store.stats()["evicted"] == 3
+    kept = [d for d in digests if store.lookup(d) is not None]
+    assert kept == [digests[0]]
+    assert not os.path.exists(store.path(digests[1]))
+    assert store.stats()["bytes"] == 2 * KB
+
+
+def test_budget_is_shared_by_stores_on_one_root(make_store):
+    # As with prefork workers: one index, one budget
+    first = make_store(budget_mb=3 * KB / 2**20, low_watermark=1.0)
+    second = make_store(budget_mb=3 * KB / 2**20, low_watermark=1.0)
+    for n in range(2):
+        first.put(blob(n))
+        second.put(blob(10 + n))
+
+    second.evict()
+
+    # Four blobs across the two stores exceed the budget once, so one goes
+    assert first.stats()["bytes"] == second.stats()["bytes"] == 3 * KB
+    assert first.stats()["evicted"] + second.stats()["evicted"] == 1
+
+
+def test_expired_uploads_are_evicted(make_store):
+    store = make_store(max_age_days=1)
+    old = store.put(blob(1))["digest"]
+    fresh = store.put(blob(2))["digest"]
+    conn = store._conn()
+    with conn:
+        conn.execute("UPDATE blobs SET accessed_at = ? WHERE digest = ?", (time.time() - 2 * 86400, old))
+
+    assert store.evict() == 1
+    assert store.lookup(old) is None
+    assert store.lookup(fresh) is not None
@@ -14,10 +14,13 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from utils.explainer import explain_diagnosis
 from utils.medical_agent import consult_symptoms
+from utils.sse import iter_text
 
 API_BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000/diagnose")
 API_CONSULT_URL = os.getenv("API_CONSULT_URL", "http://localhost:8000/consult")
-API_LOG_URL = f"{API_BACKEND_URL.rsplit('/',1)[0]}/diagnosis-log"
+API_CONSULT_STREAM_URL = os.getenv("API_CONSULT_STREAM_URL", f"{API_CONSULT_URL}/stream")
+API_BASE_URL = API_BACKEND_URL.rsplit('/',1)[0]
+API_LOG_URL = f"{API_BASE_URL}/diagnosis-log"
 API_DELETE_URL = f"{API_BACKEND_URL.rsplit('/',1)[0]}/delete-diagnoses"
 LOGO_PATH = os.getenv("LOGO_PATH", "assets/logo.png")
 
@@ -43,20 +46,37 @@ if page == "🩻 Upload X-ray":
         file_bytes = uploaded_file.read()
         image = Image.open(io.BytesIO(file_bytes)).convert("RGB")
         st.image(image, caption="📸 Uploaded X-ray", use_container_width=True)
+        show_heatmaps = st.checkbox("🔥 Show heatmaps")
         st.markdown("### 🔬 Analyzing your X-ray...")
 
         with st.spinner("Please wait while the AI doctor reviews..."):
             try:
-                response = requests.post(API_BACKEND_URL, files={"file": (uploaded_file.name, file_bytes, uploaded_file.type)})
+                response = requests.post(
+                    API_BACKEND_URL,
+                    files={"file": (uploaded_file.name, file_bytes, uploaded_file.type)},
+                    params={"explain": "true"} if show_heatmaps else None,
+                )
                 if response.status_code == 200:
                     result = response.json()
                     st.balloons()
                     st.success("✅ Diagnosis complete!")
                     st.markdown(f"### 🏷️ Diagnosis: `{result['diagnosis']}`")
                     st.info(f"📊 Confidence: `{result['confidence'] * 100:.2f}%`")
-                    explanation = explain_diagnosis(result['diagnosis'])
+                    if result.get("heatmaps"):
+                        st.markdown("### 🔥 Where the model is looking")
+                        columns = st.columns(len(result["heatmaps"]))
+                        for column, heatmap in zip(columns, result["heatmaps"]):
+                            column.image(
+                                f"{API_BASE_URL}{heatmap['url']}",
+                                caption=f"{heatmap['label']} ({heatmap['probability'] * 100:.0f}%)",
+                            )
+                    # The backend ships a precomputed explanation with the diagnosis
+                    explanation = result.get("explanation") or explain_diagnosis(result['diagnosis'])
                     st.markdown("### 🧠 Medical Explanation")
-                    st.markdown(f"💬 {explanation}")
+                    if explanation:
+                        st.markdown(f"💬 {explanation}")
+                    else:
+                        st.warning("⚠️ Explanation unavailable right now, please try again later.")
                 else:
                     st.error(f"❌ Backend error {response.status_code}: {response.text}")
             except Exception as e:
@@ -68,35 +88,48 @@ elif page == "📝 Symptom Consultation":
 
     if st.button("🔍 Analyze Symptoms"):
         if symptoms.strip():
-            with st.spinner("Analyzing your symptoms..."):
-                try:
-                    response = requests.post(API_CONSULT_URL, json={"symptoms": symptoms})
-                    if response.status_code == 200:
-                        result = response.json()
-                        st.success("✅ Preliminary medical advice:")
-                        st.markdown(f"💬 {result.get('consultation', 'No advice returned.')}")
-                    else:
-                        st.error(f"❌ Backend error {response.status_code}: {response.text}")
-                except Exception as e:
-                    st.error(f"🚨 Request failed: {e}")
+            try:
+                # Render tokens as the backend streams them (SSE)
+                response = requests.post(API_CONSULT_STREAM_URL, json={"symptoms": symptoms}, stream=True)
+                if response.status_code == 200:
+                    st.success("✅ Preliminary medical advice:")
+                    st.write_stream(iter_text(response.iter_lines(decode_unicode=True)))
+                else:
+                    st.error(f"❌ Backend error {response.status_code}: {response.text}")
+            except Exception as e:
+                st.error(f"🚨 Request failed: {e}")
         else:
             st.warning("⚠️ Please enter some symptoms.")
 
 elif page == "📜 View Past Diagnoses":
     st.markdown("## 📜 Diagnosis History")
     try:
-        response = requests.get(API_LOG_URL)
+        # The log is paginated server-side; walk it one page at a time
+        cursor = st.session_state.get("log_cursor")
+        response = requests.get(API_LOG_URL, params={"cursor": cursor} if cursor else None)
         if response.status_code == 200:
-            log_data = response.json().get("log", [])
+            payload = response.json()
+            log_data = payload.get("log", [])
+            next_cursor = payload.get("next_cursor")
             if log_data:
                 df = pd.DataFrame(log_data)
                 st.dataframe(df.drop(columns=["image_path"]))
                 selected = st.selectbox("Select timestamp:", df["timestamp"].tolist())
                 row = df[df["timestamp"] == selected].iloc[0]
-                st.image(row["image_path"], caption=selected, use_container_width=True)
+                if row["image_path"] and os.path.exists(row["image_path"]):
+                    st.image(row["image_path"], caption=selected, use_container_width=True)
+
+                col_first, col_next = st.columns(2)
+                if cursor and col_first.button("⏮️ First page"):
+                    st.session_state["log_cursor"] = None
+                    st.rerun()
+                if next_cursor and col_next.button("➡️ Next page"):
+                    st.session_state["log_cursor"] = next_cursor
+                    st.rerun()
 
                 if st.button("🗑️ Delete All Diagnoses"):
                     requests.delete(API_DELETE_URL)
+                    st.session_state["log_cursor"] = None
                     st.warning("🗑️ Diagnosis history cleared.")
                     st.rerun()
             else:
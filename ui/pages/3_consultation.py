@@ -3,10 +3,16 @@
 import streamlit as st
 import requests
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from utils.sse import iter_text
+
 API_URL = os.getenv("API_CONSULT_URL", "http://localhost:8000/consult")
+API_STREAM_URL = os.getenv("API_CONSULT_STREAM_URL", f"{API_URL}/stream")
 
 st.set_page_config(page_title="Medical Consultation", layout="centered")
 
@@ -21,22 +27,18 @@ if st.button("🔍 Analyze Symptoms"):
     if symptoms.strip() == "":
         st.warning("⚠️ Please enter some symptoms first.")
     else:
-        with st.spinner("Consulting medical assistant..."):
-            try:
-                response = requests.post(API_URL, json={"symptoms": symptoms}, timeout=30)
-                data = response.json()
-
-                if response.status_code == 200:
-                    if "consultation" in data:
-                        st.success("✅ Consultation Complete!")
-                        st.markdown("### 📄 Results")
-                        st.markdown(data["consultation"])
-                    elif "error" in data:
-                        st.error(f"❌ API Error: {data['error']}")
-                    else:
-                        st.error(f"⚠️ Unexpected response: {data}")
-                else:
-                    st.error(f"❌ API Error {response.status_code}: {data}")
-
-            except requests.exceptions.RequestException as e:
-                st.error(f"🚨 Failed to connect to API: {e}")
+        try:
+            # Tokens are rendered as they arrive over SSE
+            response = requests.post(API_STREAM_URL, json={"symptoms": symptoms}, stream=True, timeout=30)
+
+            if response.status_code == 200:
+                st.markdown("### 📄 Results")
+                st.write_stream(iter_text(response.iter_lines(decode_unicode=True)))
+                st.success("✅ Consultation Complete!")
+            else:
+                st.error(f"❌ API Error {response.status_code}: {response.text}")
+
+        except requests.exceptions.RequestException as e:
+            st.error(f"🚨 Failed to connect to API: {e}")
+        except RuntimeError as e:
+            st.error(f"❌ API Error: {e}")
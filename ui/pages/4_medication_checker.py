@@ -36,15 +36,23 @@ if st.button("🔍 Check Interaction"):
                 if response.status_code == 200:
                     interactions = response.json().get("interactions", [])
                     if interactions:
-                        risk = interactions[0]["risk"]
-                        if risk > 0.5:
+                        pair = interactions[0]
+                        risk = pair["risk"]
+                        if risk is None:
+                            # The server's GNN isn't trained to score pairs
+                            if pair.get("risky"):
+                                st.error("🚨 Documented interaction between these drugs!")
+                            else:
+                                st.info("ℹ️ No documented interaction; no risk model is available to score this pair.")
+                        elif pair.get("risky", risk > 0.5):
                             st.error(f"🚨 Interaction risk detected! Risk: {risk:.2f}")
                         else:
                             st.success(f"✅ No major interaction detected. Risk: {risk:.2f}")
                     else:
                         st.success("✅ No direct interaction found.")
                 else:
-                    error_msg = response.json().get('error', 'Unknown error')
+                    body = response.json()
+                    error_msg = body.get('detail') or body.get('error', 'Unknown error')
                     st.error(f"❌ API Error: {error_msg}")
             except Exception as e:
                 st.error(f"⚠️ Failed to contact backend: {e}")
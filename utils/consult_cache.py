@@ -0,0 +1,191 @@
+# utils/consult_cache.py
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+CONSULT_CACHE_SIZE = int(os.getenv("CONSULT_CACHE_SIZE", 2048))
+CONSULT_CACHE_TTL = float(os.getenv("CONSULT_CACHE_TTL", 24 * 3600))
+# Optional persistent tier, e.g. data/cache/consult.db
+CONSULT_CACHE_DB = os.getenv("CONSULT_CACHE_DB", "")
+
+# Filler words that don't change the clinical meaning of a complaint.
+# Negations ("no", "not", "without") are deliberately kept.
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "i", "im", "i'm", "me", "my", "have", "has",
+    "had", "having", "been", "am", "is", "are", "also", "some", "with", "of",
+    "feel", "feeling", "experiencing", "please", "since",
+}
+
+
+def normalize_symptoms(text: str) -> str:
+    """'Fever, cough.' and 'fever and cough' both normalize to 'fever cough'."""
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    return " ".join(w for w in words if w not in _STOPWORDS)
+
+
+def make_key(symptoms: str, params: dict) -> str:
+    payload = json.dumps({"symptoms": normalize_symptoms(symptoms), **params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ConsultCache:
+    """
+    TTL + LRU cache for consultation responses, with an optional SQLite tier
+    and single-flight: concurrent callers with the same key share one
+    upstream call instead of each making their own.
+    """
+
+    def __init__(self, max_entries=CONSULT_CACHE_SIZE, ttl=CONSULT_CACHE_TTL, db_path=CONSULT_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path or None
+
+        # key -> (value, expires_at, compute_seconds)
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._db = None
+
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.saved_seconds = 0.0
+
+        if self.db_path:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS consultations ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, compute_seconds REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM consultations WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+
+    def get_or_compute(self, symptoms: str, params: dict, compute):
+        """Return the cached answer for these symptoms/params or call `compute()` once."""
+        key = make_key(symptoms, params)
+
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                value, _, compute_seconds = entry
+                self.hits += 1
+                self.saved_seconds += compute_seconds
+                return value
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result()
+
+        started = time.perf_counter()
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        compute_seconds = time.perf_counter() - started
+        with self._lock:
+            self._store(key, value, compute_seconds)
+            self._inflight.pop(key, None)
+        # Followers skip the upstream spend but not the wait, so they don't
+        # count towards latency saved.
+        future.set_result(value)
+        return value
+
+    def lookup(self, symptoms: str, params: dict):
+        """Return a cached answer or None, without computing anything."""
+        with self._lock:
+            entry = self._lookup(make_key(symptoms, params))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += entry[2]
+            return entry[0]
+
+    def store(self, symptoms: str, params: dict, value: str, compute_seconds: float):
+        """Cache an answer produced outside `get_or_compute` (e.g. a stream)."""
+        with self._lock:
+            self._store(make_key(symptoms, params), value, compute_seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.shared
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "persistent_tier": self.db_path,
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared_inflight": self.shared,
+                "hit_ratio": round((self.hits + self.shared) / lookups, 3) if lookups else 0.0,
+                "latency_saved_seconds": round(self.saved_seconds, 2),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM consultations")
+                self._db.commit()
+
+    def _lookup(self, key):
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self._memory.move_to_end(key)
+                return entry
+            del self._memory[key]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value, expires_at, compute_seconds FROM consultations "
+                "WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                self._remember(key, tuple(row))
+                return tuple(row)
+        return None
+
+    def _store(self, key, value, compute_seconds):
+        entry = (value, time.time() + self.ttl, compute_seconds)
+        self._remember(key, entry)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO consultations (key, value, expires_at, compute_seconds) "
+                "VALUES (?, ?, ?, ?)", (key, *entry)
+            )
+            self._db.commit()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+consult_cache = ConsultCache()
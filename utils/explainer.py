@@ -1,29 +1,51 @@
 # utils/explainer.py
 
-import os
-import openai
+import hashlib
+import logging
+from concurrent.futures import Future
+from utils.llm_gateway import get_gateway, LLMError
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
+logger = logging.getLogger(__name__)
 
-def explain_diagnosis(diagnosis: str) -> str:
-    """Call OpenAI to generate a medical explanation for a diagnosis."""
-    prompt = f"""
+EXPLAIN_MODEL = "gpt-4"  # You can change to "gpt-3.5-turbo" if needed
+EXPLAIN_TEMPERATURE = 0.5
+EXPLAIN_MAX_TOKENS = 200
+
+SYSTEM_PROMPT = "You are a helpful medical assistant specialized in radiology."
+PROMPT_TEMPLATE = """
     You are a helpful medical assistant. Explain why a chest X-ray might be diagnosed as "{diagnosis}".
     Use professional radiology reasoning. Keep the explanation concise (2–3 sentences).
     """
 
+# Identifies explanations generated with the current prompt and model settings
+EXPLAIN_VERSION = hashlib.sha256(
+    f"{EXPLAIN_MODEL}|{EXPLAIN_TEMPERATURE}|{EXPLAIN_MAX_TOKENS}|{SYSTEM_PROMPT}|{PROMPT_TEMPLATE}".encode()
+).hexdigest()[:12]
+
+def _messages(diagnosis: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": PROMPT_TEMPLATE.format(diagnosis=diagnosis)}
+    ]
+
+def start_explanation(diagnosis: str) -> Future:
+    """Start the OpenAI call for an explanation; the Future raises LLMError on API errors."""
+    return get_gateway().submit(
+        _messages(diagnosis),
+        component="explain",
+        model=EXPLAIN_MODEL,
+        temperature=EXPLAIN_TEMPERATURE,
+        max_tokens=EXPLAIN_MAX_TOKENS,
+    )
+
+def generate_explanation(diagnosis: str) -> str:
+    """Call OpenAI for an explanation of a diagnosis. Raises LLMError on API errors."""
+    return start_explanation(diagnosis).result()
+
+def explain_diagnosis(diagnosis: str):
+    """Explanation for a diagnosis, or None if the LLM is unavailable."""
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4",  # You can change to "gpt-3.5-turbo" if needed
-            messages=[
-                {"role": "system", "content": "You are a helpful medical assistant specialized in radiology."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5,
-            max_tokens=200,
-        )
-        explanation = response.choices[0].message.content.strip()
-        return explanation
-
-    except Exception as e:
-        return f"❌ Request Failed:\n\n{e}"
+        return generate_explanation(diagnosis)
+    except LLMError as e:
+        logger.warning(f"Explanation failed for {diagnosis}: {e}")
+        return None
@@ -0,0 +1,180 @@
+# utils/explanation_store.py
+
+import os
+import json
+import time
+import asyncio
+import functools
+import threading
+import logging
+from concurrent.futures import Future
+
+from utils.explainer import generate_explanation, start_explanation, EXPLAIN_MODEL, EXPLAIN_VERSION
+
+logger = logging.getLogger(__name__)
+
+EXPLANATIONS_PATH = os.getenv("EXPLANATIONS_PATH", os.path.join("data", "explanations.json"))
+# A label whose live call failed isn't retried for this many seconds
+EXPLAIN_RETRY_AFTER = float(os.getenv("EXPLAIN_RETRY_AFTER", 60))
+# Generate missing labels in the background when a server starts
+EXPLAIN_PREFETCH = os.getenv("EXPLAIN_PREFETCH", "1") == "1"
+
+
+class ExplanationStore:
+    """
+    Precomputed diagnosis explanations, one per model label.
+
+    The table is built once by `data/scripts/build_explanations.py` and is
+    tagged with the prompt/model version it was generated with. A table
+    from a different version is ignored. Labels missing from the table fall
+    back to a live LLM call; answers are added to the table and written
+    back to disk. Concurrent misses for one label share a single in-flight
+    call, and a failed call is remembered for `retry_after` seconds so an
+    LLM outage costs requests nothing.
+
+    Request paths use `peek`, which never waits: a miss starts the call in
+    the background and answers None this time.
+    """
+
+    def __init__(self, path=EXPLANATIONS_PATH, retry_after=EXPLAIN_RETRY_AFTER):
+        self.path = path
+        self.retry_after = retry_after
+        self._explanations = {}
+        self._inflight = {}
+        self._failed = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            logger.info(f"No explanation table at {self.path}, explanations will be generated live")
+            return
+        with open(self.path) as f:
+            table = json.load(f)
+        if table.get("version") != EXPLAIN_VERSION:
+            logger.warning(
+                f"Ignoring {self.path}: built for version {table.get('version')}, "
+                f"current is {EXPLAIN_VERSION}. Rebuild it with data/scripts/build_explanations.py"
+            )
+            return
+        self._explanations = dict(table["explanations"])
+        logger.info(f"Loaded {len(self._explanations)} explanations from {self.path}")
+
+    def lookup(self, diagnosis: str):
+        """O(1) lookup, no network. Returns None on a miss."""
+        explanation = self._explanations.get(diagnosis)
+        if explanation is not None:
+            with self._lock:
+                self.hits += 1
+        return explanation
+
+    def peek(self, diagnosis: str):
+        """Non-blocking: the table entry, or None while a live call fills it in."""
+        explanation = self.lookup(diagnosis)
+        if explanation is None:
+            self._shared_call(diagnosis)
+        return explanation
+
+    def prefetch(self, labels) -> int:
+        """Start live calls for the labels the table lacks; returns how many."""
+        missing = [label for label in labels if label not in self._explanations]
+        for label in missing:
+            self._shared_call(label)
+        if missing:
+            logger.info(f"Generating {len(missing)} missing explanations in the background")
+        return len(missing)
+
+    def get(self, diagnosis: str) -> str:
+        """Blocking: the table entry, or the (shared) live LLM call's answer."""
+        explanation = self.lookup(diagnosis)
+        if explanation is not None:
+            return explanation
+        return self._shared_call(diagnosis).result()
+
+    async def aget(self, diagnosis: str) -> str:
+        """Same as `get`, without holding a thread while the LLM answers."""
+        explanation = self.lookup(diagnosis)
+        if explanation is not None:
+            return explanation
+        # Shielded: a caller that goes away must not cancel the call the
+        # other waiters share
+        return await asyncio.shield(asyncio.wrap_future(self._shared_call(diagnosis)))
+
+    def _shared_call(self, diagnosis: str):
+        """The in-flight LLM call for a label, started if there is none yet."""
+        with self._lock:
+            future = self._inflight.get(diagnosis)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            if diagnosis in self._explanations:
+                # Answered between the caller's lookup and now
+                future = Future()
+                future.set_result(self._explanations[diagnosis])
+                return future
+            failed_at, error = self._failed.get(diagnosis, (None, None))
+            if failed_at is not None and time.monotonic() - failed_at < self.retry_after:
+                future = Future()
+                future.set_exception(error)
+                return future
+            self.misses += 1
+            future = start_explanation(diagnosis)
+            self._inflight[diagnosis] = future
+        # Outside the lock: the callback runs right here if the call already finished
+        future.add_done_callback(functools.partial(self._settle, diagnosis))
+        return future
+
+    def _settle(self, diagnosis: str, future):
+        error = future.exception() if not future.cancelled() else None
+        with self._lock:
+            if self._inflight.get(diagnosis) is future:
+                del self._inflight[diagnosis]
+            if future.cancelled():
+                return
+            if error is not None:
+                self.failures += 1
+                self._failed[diagnosis] = (time.monotonic(), error)
+            else:
+                self._failed.pop(diagnosis, None)
+                self._explanations[diagnosis] = future.result()
+                explanations = dict(self._explanations)
+        if error is not None:
+            logger.warning(f"Live explanation for {diagnosis} failed, retrying in {self.retry_after:.0f}s: {error}")
+            return
+        try:
+            write_table(explanations, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save explanations to {self.path}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._explanations),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "failures": self.failures,
+        }
+
+
+def write_table(explanations: dict, path=EXPLANATIONS_PATH) -> dict:
+    """Write a versioned explanation table atomically."""
+    table = {"version": EXPLAIN_VERSION, "model": EXPLAIN_MODEL, "explanations": explanations}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(table, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return table
+
+
+def build_table(labels, path=EXPLANATIONS_PATH) -> dict:
+    """Generate explanations for every label and write the versioned table."""
+    return write_table({label: generate_explanation(label) for label in labels}, path)
+
+
+explanation_store = ExplanationStore()
@@ -0,0 +1,385 @@
+# utils/llm_gateway.py
+#
+# One shared path to the chat-completions API for the whole process.
+#
+# All calls run on a dedicated event loop thread that owns a single pooled
+# httpx.AsyncClient (keep-alive connections reused across requests). Sync
+# callers (Flask, thread pools) block on a future; async callers (FastAPI)
+# await it without blocking their own loop. Every call gets:
+#   - a deadline covering queueing, retries and hedges together,
+#   - a per-process concurrency cap and a token-bucket rate limit,
+#   - retries with exponential backoff and jitter on timeouts, connection
+#     errors, 429s (honouring Retry-After) and 5xx,
+#   - a hedged duplicate request once it has run longer than the recent p95,
+#     first answer wins and the other is cancelled (non-streaming only).
+
+import os
+import time
+import json
+import random
+import asyncio
+import threading
+import contextlib
+import concurrent.futures
+import logging
+from collections import deque
+
+import httpx
+from dotenv import load_dotenv
+
+from utils import metrics
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+load_dotenv(override=True)
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# Any OpenAI-compatible server, e.g. benchmarks/mock_openai.py for load tests
+OPENAI_BASE_URL = (os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+LLM_RATE_PER_SEC = float(os.getenv("LLM_RATE_PER_SEC", 10))
+LLM_BURST = int(os.getenv("LLM_BURST", 20))
+# Total budget for one call, including waiting, retries and hedges
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", 30))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+# Hedging only starts once there are enough latency samples for a p95
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 64))
+
+
+class LLMError(Exception):
+    """The LLM call failed for good (retries exhausted or a non-retryable error)."""
+
+
+class LLMDeadlineExceeded(LLMError):
+    """The call's deadline passed before an answer arrived."""
+
+
+class _Retryable(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """`rate` tokens per second, up to `burst` saved up. Loop-local, no locking."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self, deadline: float):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                raise LLMDeadlineExceeded("Deadline exceeded waiting for the LLM rate limit")
+            await asyncio.sleep(wait)
+
+
+class LLMGateway:
+    def __init__(self, base_url=OPENAI_BASE_URL, api_key=OPENAI_API_KEY,
+                 max_concurrency=LLM_MAX_CONCURRENCY, rate_per_sec=LLM_RATE_PER_SEC, burst=LLM_BURST,
+                 deadline=LLM_DEADLINE, max_retries=LLM_MAX_RETRIES, hedge=LLM_HEDGE):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.hedge = hedge
+
+        self._latencies = deque(maxlen=500)
+        self._p95 = None
+        self._samples = 0
+        self._rate_per_sec = rate_per_sec
+        self._burst = burst
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+        self._bucket = None
+        self._start_lock = threading.Lock()
+
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.inflight = 0
+
+    # === Event loop thread ===
+
+    def _ensure_started(self):
+        if self._loop is not None:
+            return
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._client = httpx.AsyncClient(
+                    base_url=self.base_url,
+                    headers={"Authorization": f"Bearer {self.api_key}"},
+                    limits=httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE),
+                    timeout=httpx.Timeout(self.deadline, connect=LLM_CONNECT_TIMEOUT),
+                )
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._bucket = TokenBucket(self._rate_per_sec, self._burst)
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, name="llm-gateway", daemon=True).start()
+            ready.wait()
+            self._loop = loop
+
+    def _submit(self, coro):
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    # === Public API ===
+
+    def complete(self, messages: list, component: str = "", **params) -> str:
+        """Blocking chat completion; returns the message text or raises LLMError."""
+        return self.submit(messages, component, **params).result()
+
+    async def acomplete(self, messages: list, component: str = "", **params) -> str:
+        """Same as `complete`, awaitable from any event loop."""
+        return await asyncio.wrap_future(self.submit(messages, component, **params))
+
+    def submit(self, messages: list, component: str = "", **params) -> concurrent.futures.Future:
+        """
+        Start a chat completion and return its Future right away. The call runs
+        on the gateway loop, so it is not tied to any caller: several callers
+        can wait on one Future (see utils.explanation_store).
+        """
+        return self._submit(self._complete(messages, component, params))
+
+    async def astream(self, messages: list, component: str = "", **params):
+        """Yield content deltas. Retried only until the first chunk arrives; never hedged."""
+        caller_loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def emit(kind, value=None):
+            caller_loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+
+        future = self._submit(self._stream_into(emit, messages, component, params))
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "delta":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            future.cancel()
+
+    def p95(self):
+        """Recent p95 latency of successful calls in seconds, None until there are enough."""
+        return self._p95
+
+    def stats(self) -> dict:
+        p95 = self.p95()
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "inflight": self.inflight,
+            "max_concurrency": self.max_concurrency,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else 0.0,
+        }
+
+    # === Internals (run on the gateway loop) ===
+
+    async def _complete(self, messages, component, params):
+        payload = {"messages": messages, **params}
+        deadline = time.monotonic() + self.deadline
+        self.calls += 1
+        try:
+            with span("llm_call", component):
+                data = await self._hedged(payload, deadline)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            raise LLMDeadlineExceeded(f"No LLM answer within {self.deadline}s")
+        except LLMError:
+            self.failures += 1
+            raise
+        return data["choices"][0]["message"]["content"].strip()
+
+    async def _hedged(self, payload, deadline):
+        remaining = deadline - time.monotonic()
+        primary = asyncio.ensure_future(self._with_retries(payload, deadline))
+        hedge_after = self.p95() if self.hedge else None
+        if hedge_after is None or hedge_after >= remaining:
+            return await asyncio.wait_for(primary, remaining)
+
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        self.hedges += 1
+        backup = asyncio.ensure_future(self._with_retries(payload, deadline))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=deadline - time.monotonic(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _with_retries(self, payload, deadline):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._attempt(payload, deadline)
+            except _Retryable as e:
+                if attempt == self.max_retries:
+                    raise LLMError(f"LLM call failed after {attempt + 1} attempts: {e}")
+                backoff = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+                if e.retry_after is not None:
+                    backoff = max(backoff, e.retry_after)
+                if time.monotonic() + backoff >= deadline:
+                    raise LLMDeadlineExceeded(f"Deadline exceeded after {attempt + 1} attempts: {e}")
+                self.retries += 1
+                logger.warning(f"LLM call attempt {attempt + 1} failed ({e}), retrying in {backoff:.2f}s")
+                await asyncio.sleep(backoff)
+
+    async def _attempt(self, payload, deadline):
+        async with self._slot(deadline):
+            started = time.monotonic()
+            try:
+                response = await self._client.post(
+                    "/chat/completions", json=payload, timeout=self._timeout(deadline)
+                )
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                raise _Retryable(f"{type(e).__name__}: {e}")
+            self._check(response)
+            self._record_latency(time.monotonic() - started)
+            return response.json()
+
+    def _record_latency(self, seconds):
+        self._latencies.append(seconds)
+        self._samples += 1
+        # Recomputed every few samples, on the loop thread only
+        if len(self._latencies) >= LLM_HEDGE_MIN_SAMPLES and self._samples % 10 == 0:
+            ordered = sorted(self._latencies)
+            self._p95 = ordered[int(0.95 * (len(ordered) - 1))]
+
+    async def _stream_into(self, emit, messages, component, params):
+        payload = {"messages": messages, **params, "stream": True}
+        deadline = time.monotonic() + self.deadline
+        self.calls += 1
+        try:
+            with span("llm_stream", component):
+                for attempt in range(self.max_retries + 1):
+                    sent = False
+                    try:
+                        async with self._slot(deadline):
+                            async with self._client.stream(
+                                "POST", "/chat/completions", json=payload, timeout=self._timeout(deadline)
+                            ) as response:
+                                if response.status_code >= 400:
+                                    await response.aread()
+                                self._check(response)
+                                async for line in response.aiter_lines():
+                                    if not line.startswith("data:"):
+                                        continue
+                                    data = line[5:].strip()
+                                    if data == "[DONE]":
+                                        break
+                                    choices = json.loads(data).get("choices") or []
+                                    delta = choices[0].get("delta", {}).get("content") if choices else None
+                                    if delta:
+                                        sent = True
+                                        emit("delta", delta)
+                        emit("done")
+                        return
+                    except (_Retryable, httpx.TimeoutException, httpx.TransportError) as e:
+                        # Once text has reached the caller a retry would repeat it
+                        if sent or attempt == self.max_retries or time.monotonic() >= deadline:
+                            raise LLMError(f"LLM stream failed: {e}")
+                        self.retries += 1
+                        await asyncio.sleep(min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+        except LLMError as e:
+            self.failures += 1
+            emit("error", e)
+        except Exception as e:
+            self.failures += 1
+            emit("error", LLMError(str(e)))
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, deadline):
+        """One concurrency slot plus one rate-limit token, both bounded by the deadline."""
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            raise LLMDeadlineExceeded("Deadline exceeded waiting for an LLM slot")
+        try:
+            await self._bucket.acquire(deadline)
+            self.inflight += 1
+            try:
+                yield
+            finally:
+                self.inflight -= 1
+        finally:
+            self._semaphore.release()
+
+    @staticmethod
+    def _timeout(deadline) -> httpx.Timeout:
+        remaining = max(deadline - time.monotonic(), 0.001)
+        return httpx.Timeout(remaining, connect=min(LLM_CONNECT_TIMEOUT, remaining))
+
+    @staticmethod
+    def _check(response: httpx.Response):
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            raise _Retryable(
+                f"HTTP {response.status_code}",
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        if response.status_code >= 400:
+            raise LLMError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """Process-wide gateway, created on first use."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+                metrics.register_collector("llm_gateway", _gateway.stats)
+    return _gateway
@@ -1,20 +1,21 @@
 # utils/medical_agent.py
 
-import openai
-import os
-from dotenv import load_dotenv
+import time
+import hashlib
 import logging
+from utils.consult_cache import consult_cache
+# Pooled client with concurrency / rate limits, deadlines and retries;
+# OPENAI_API_KEY and OPENAI_BASE_URL are read there
+from utils.llm_gateway import get_gateway
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-load_dotenv(override=True)
-openai.api_key = os.getenv("OPENAI_API_KEY")
+CONSULT_MODEL = "gpt-3.5-turbo"
+CONSULT_TEMPERATURE = 0.4
+CONSULT_MAX_TOKENS = 300
 
-client = openai.OpenAI()
-
-def consult_symptoms(symptoms: str) -> str:
-    prompt = f"""
+PROMPT_TEMPLATE = """
     You are a professional medical assistant. The patient reports:
     "{symptoms}"
 
@@ -25,10 +26,51 @@ def consult_symptoms(symptoms: str) -> str:
     Remind user to see a doctor.
     Limit to 3-5 sentences.
     """
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.4,
-        max_tokens=300,
+
+# Everything that changes the answer besides the symptoms themselves
+CACHE_PARAMS = {
+    "model": CONSULT_MODEL,
+    "temperature": CONSULT_TEMPERATURE,
+    "max_tokens": CONSULT_MAX_TOKENS,
+    "prompt": hashlib.sha256(PROMPT_TEMPLATE.encode()).hexdigest()[:12],
+}
+
+def _messages(symptoms: str) -> list:
+    return [{"role": "user", "content": PROMPT_TEMPLATE.format(symptoms=symptoms)}]
+
+def _ask_llm(symptoms: str) -> str:
+    return get_gateway().complete(
+        _messages(symptoms),
+        component="consult",
+        model=CONSULT_MODEL,
+        temperature=CONSULT_TEMPERATURE,
+        max_tokens=CONSULT_MAX_TOKENS,
     )
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+
+def consult_symptoms(symptoms: str) -> str:
+    # Near-identical complaints share one cached answer (see utils.consult_cache)
+    return consult_cache.get_or_compute(symptoms, CACHE_PARAMS, lambda: _ask_llm(symptoms))
+
+async def stream_consultation(symptoms: str):
+    """
+    Yield the consultation text as it is generated. Cached answers are
+    yielded in one piece; fresh ones are cached once the stream completes.
+    """
+    cached = consult_cache.lookup(symptoms, CACHE_PARAMS)
+    if cached is not None:
+        yield cached
+        return
+
+    started = time.perf_counter()
+    parts = []
+    async for delta in get_gateway().astream(
+        _messages(symptoms),
+        component="consult",
+        model=CONSULT_MODEL,
+        temperature=CONSULT_TEMPERATURE,
+        max_tokens=CONSULT_MAX_TOKENS,
+    ):
+        parts.append(delta)
+        yield delta
+
+    consult_cache.store(symptoms, CACHE_PARAMS, "".join(parts).strip(), time.perf_counter() - started)
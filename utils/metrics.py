@@ -0,0 +1,258 @@
+# utils/metrics.py
+#
+# In-process metrics for the API servers, rendered in the Prometheus text
+# format by their /metrics endpoints.
+#
+# Instrumented code only touches three primitives: Counter, Gauge and
+# Histogram, each a dict of floats behind a lock. Stages are timed with
+# `span("forward", "chexnet")` (a context manager) or `@timed(...)`.
+# Values that already live elsewhere (queue depths, cache stats, model load
+# times) are read at scrape time by collectors instead of being copied on
+# every request.
+
+import os
+import re
+import time
+import bisect
+import threading
+import functools
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "medassist")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans from sub-millisecond cache lookups to multi-second LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", f"{METRICS_PREFIX}_{name}")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = _name(name)
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labelnames)
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        lines = self._header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        lines = self._header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # Per-bucket (non-cumulative) counts; made cumulative when rendered
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        lines = self._header()
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+_metrics = {}
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(cls, name, help, labelnames, **kwargs):
+    with _registry_lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, help, labelnames, **kwargs)
+        return metric
+
+
+def counter(name: str, help: str, labelnames=()) -> Counter:
+    return _get_or_create(Counter, name, help, labelnames)
+
+
+def gauge(name: str, help: str, labelnames=()) -> Gauge:
+    return _get_or_create(Gauge, name, help, labelnames)
+
+
+def histogram(name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+
+def register_collector(name: str, collect):
+    """
+    `collect()` is called on every scrape and returns a (possibly nested)
+    stats dict, e.g. a `.stats()` method; each numeric leaf becomes a gauge
+    named `<prefix>_<name>_<key path>`.
+    """
+    with _registry_lock:
+        _collectors.append((name, collect))
+
+
+def _flatten(stats: dict, prefix: str) -> dict:
+    flat = {}
+    for key, value in stats.items():
+        name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{key}")
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+        elif isinstance(value, bool):
+            flat[name] = int(value)
+    return flat
+
+
+# === Built-in request and stage metrics ===
+
+requests_total = counter(
+    "http_requests_total", "HTTP requests by endpoint and status", ("server", "endpoint", "method", "status")
+)
+request_seconds = histogram(
+    "http_request_duration_seconds", "HTTP request latency by endpoint", ("server", "endpoint", "method")
+)
+inflight_requests = gauge("http_requests_inflight", "Requests currently being handled", ("server",))
+stage_seconds = histogram(
+    "stage_duration_seconds", "Time spent in one stage of a request", ("stage", "component")
+)
+
+
+@contextmanager
+def span(stage: str, component: str = ""):
+    """Time a block as one stage, e.g. `with span("forward", "chexnet"):`."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, stage=stage, component=component)
+
+
+def timed(stage: str, component: str = ""):
+    """Decorator form of `span` for whole functions."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, component):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_request(server: str, endpoint: str, method: str, status: int, seconds: float):
+    if not METRICS_ENABLED:
+        return
+    requests_total.inc(server=server, endpoint=endpoint, method=method, status=status)
+    request_seconds.observe(seconds, server=server, endpoint=endpoint, method=method)
+
+
+def render() -> str:
+    """Every metric and collector in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_metrics.values())
+        collectors = list(_collectors)
+
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+
+    for name, collect in collectors:
+        try:
+            flat = _flatten(collect(), _name(name))
+        except Exception as e:
+            logger.warning(f"Metrics collector {name} failed: {e}")
+            continue
+        for metric_name, value in flat.items():
+            lines.append(f"# TYPE {metric_name} gauge")
+            lines.append(f"{metric_name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,39 @@
+# utils/sse.py
+
+import json
+
+
+def format_event(data: dict, event: str = None) -> str:
+    """Encode one Server-Sent Event. Payloads are JSON so newlines survive."""
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def iter_events(lines):
+    """
+    Parse SSE from an iterable of text lines (e.g. requests'
+    `response.iter_lines(decode_unicode=True)`) into (event, data) pairs.
+    """
+    event, data = "message", []
+    for line in lines:
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+    if data:
+        yield event, json.loads("\n".join(data))
+
+
+def iter_text(lines):
+    """Yield consultation text deltas from an SSE stream; raise on an error event."""
+    for event, data in iter_events(lines):
+        if event == "error":
+            raise RuntimeError(data.get("error", "Streaming failed"))
+        if event == "done":
+            return
+        yield data.get("delta", "")
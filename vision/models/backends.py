@@ -0,0 +1,188 @@
+# vision/models/backends.py
+
+import io
+import os
+import copy
+import time
+import logging
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+# eager | torchscript | onnx | int8_dynamic | int8_static
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+CHANNELS_LAST = os.getenv("CHANNELS_LAST", "1") == "1"
+# Check a non-eager backend against eager outputs when it is built and fall
+# back to eager if the probabilities drift further than the tolerance.
+BACKEND_VERIFY = os.getenv("BACKEND_VERIFY", "1") == "1"
+BACKEND_TOLERANCE = float(os.getenv("BACKEND_TOLERANCE", 0.05))
+
+BACKENDS = ["eager", "torchscript", "onnx", "int8_dynamic", "int8_static"]
+
+
+def _to_channels_last(batch: torch.Tensor) -> torch.Tensor:
+    return batch.contiguous(memory_format=torch.channels_last)
+
+
+def _eager(model, example, channels_last):
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+
+        def run(batch):
+            return model(_to_channels_last(batch))
+        # The module holding the weights, e.g. for api.prefork to share
+        run.module = model
+        return run
+    return model
+
+
+def _torchscript(model, example, channels_last):
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+        example = _to_channels_last(example)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    frozen = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+    def run(batch):
+        return frozen(_to_channels_last(batch) if channels_last else batch)
+    run.module = frozen
+    return run
+
+
+def _onnx(model, example, channels_last):
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise RuntimeError("The 'onnx' backend needs onnxruntime installed")
+
+    buffer = io.BytesIO()
+    torch.onnx.export(
+        model, example, buffer,
+        input_names=["input"], output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17,
+    )
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = torch.get_num_threads()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(
+        buffer.getvalue(), options, providers=["CPUExecutionProvider"]
+    )
+
+    def run(batch):
+        (logits,) = session.run(None, {"input": batch.cpu().numpy()})
+        return torch.from_numpy(logits)
+    return run
+
+
+def _int8_dynamic(model, example, channels_last):
+    # Dynamic quantization only covers Linear layers (the classifier head)
+    quantized = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    return _eager(quantized, example, channels_last)
+
+
+def _int8_static(model, example, channels_last):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    # Static quantization calibrates activation ranges on the example batch,
+    # then converts convolutions and the head to int8 kernels.
+    qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(example,))
+    with torch.no_grad():
+        prepared(example)
+    quantized = convert_fx(prepared)
+    return _eager(quantized, example, channels_last)
+
+
+_BUILDERS = {
+    "eager": _eager,
+    "torchscript": _torchscript,
+    "onnx": _onnx,
+    "int8_dynamic": _int8_dynamic,
+    "int8_static": _int8_static,
+}
+
+
+def build_backend(name: str, model: nn.Module, example: torch.Tensor,
+                  channels_last: bool = CHANNELS_LAST, copy_model: bool = True):
+    """
+    Wrap an eager CPU model into a callable `run(batch) -> logits` for the
+    given backend. `example` is a representative (N, 3, 224, 224) batch used
+    for tracing, export and int8 calibration. The eager model is not modified,
+    unless `copy_model=False`: then the runner uses `model` itself (converted
+    to channels-last in place), so both share one set of weights. Runners
+    that are not modules themselves carry theirs as `run.module`.
+    """
+    if name not in _BUILDERS:
+        raise ValueError(f"Unknown inference backend {name!r}, expected one of {BACKENDS}")
+    if copy_model:
+        model = copy.deepcopy(model)
+    model = model.cpu().eval()
+    return _BUILDERS[name](model, example, channels_last)
+
+
+def compare(reference, candidate, batch: torch.Tensor, repeats: int = 5) -> dict:
+    """Compare a backend against the eager reference on the same batch."""
+    with torch.no_grad():
+        expected = torch.sigmoid(reference(batch))
+        actual = torch.sigmoid(candidate(batch))
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            candidate(batch)
+        latency_ms = (time.perf_counter() - started) / repeats * 1000
+
+    return {
+        "max_abs_diff": round((expected - actual).abs().max().item(), 5),
+        "top1_agreement": (expected.argmax(1) == actual.argmax(1)).float().mean().item(),
+        "latency_ms": round(latency_ms, 2),
+    }
+
+
+def build_verified(name: str, model: nn.Module, example: torch.Tensor,
+                   tolerance: float = BACKEND_TOLERANCE):
+    """
+    Build a backend and fall back to eager if it fails or drifts from eager.
+    Eager runners reuse `model` rather than copying it.
+    """
+    if name == "eager":
+        return build_backend(name, model, example, copy_model=False)
+    try:
+        runner = build_backend(name, model, example)
+        if BACKEND_VERIFY:
+            report = compare(model, runner, example, repeats=1)
+            logger.info(f"Backend '{name}' vs eager: {report}")
+            if report["max_abs_diff"] > tolerance or report["top1_agreement"] < 1.0:
+                raise RuntimeError(f"outputs drift from eager: {report}")
+        return runner
+    except Exception as e:
+        logger.warning(f"Backend '{name}' unavailable ({e}), falling back to eager")
+        return build_backend("eager", model, example, copy_model=False)
+
+
+if __name__ == "__main__":
+    # Accuracy and latency of every backend against eager on the sample X-ray:
+    #   python -m vision.models.backends [backend ...]
+    import sys
+    from vision.models import chexnet_model
+
+    logging.basicConfig(level=logging.INFO)
+    names = sys.argv[1:] or BACKENDS
+    model = chexnet_model.get_model().cpu()
+    example = chexnet_model.calibration_batch()
+
+    failed = False
+    for name in names:
+        try:
+            report = compare(model, build_backend(name, model, example), example)
+        except Exception as e:
+            print(f"{name:>14}: unavailable ({e})")
+            continue
+        ok = report["max_abs_diff"] <= BACKEND_TOLERANCE and report["top1_agreement"] == 1.0
+        failed = failed or not ok
+        print(f"{name:>14}: {report} {'OK' if ok else 'FAIL'}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,126 @@
+# vision/models/batching.py
+
+import os
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Tuning knobs: bigger batches raise throughput, longer waits raise p99 latency.
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 8))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 10))
+BATCH_MAX_QUEUE = int(os.getenv("BATCH_MAX_QUEUE", 256))
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from concurrent requests and runs them through
+    `predict_fn` in batches on a single background thread.
+
+    `predict_fn` takes a list of items and must return a list of results in
+    the same order. Each caller gets a Future resolving to its own result.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=BATCH_MAX_SIZE,
+                 max_wait_ms=BATCH_MAX_WAIT_MS, max_queue_size=BATCH_MAX_QUEUE,
+                 name="batcher"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self._batches = 0
+        self._items = 0
+        self._last_batch_size = 0
+        self._total_wait_ms = 0.0
+        self._max_wait_seen_ms = 0.0
+
+    def submit(self, item) -> Future:
+        """Queue one item. Raises queue.Full when the queue is at capacity."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "last_batch_size": self._last_batch_size,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "avg_wait_ms": round(self._total_wait_ms / self._items, 2) if self._items else 0.0,
+                "max_wait_seen_ms": round(self._max_wait_seen_ms, 2),
+            }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"{self.name}-worker", daemon=True
+                )
+                self._thread.start()
+
+    def _collect(self) -> list:
+        # Block for the first item, then fill the batch until it is full or
+        # the wait window measured from the first item has closed.
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            futures = [future for _, future, _ in batch]
+
+            waits = [(started - enqueued) * 1000 for _, _, enqueued in batch]
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._last_batch_size = len(batch)
+                self._total_wait_ms += sum(waits)
+                self._max_wait_seen_ms = max(self._max_wait_seen_ms, *waits)
+
+            try:
+                results = list(self.predict_fn(items))
+            except Exception as e:
+                logger.exception(f"[{self.name}] batch of {len(batch)} failed")
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            if len(results) != len(batch):
+                logger.error(f"[{self.name}] predict_fn returned {len(results)} results for {len(batch)} items")
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+            # Callers without a result of their own would otherwise wait forever
+            for future in futures[len(results):]:
+                if not future.done():
+                    future.set_exception(RuntimeError(
+                        f"{self.name}: no result for this item ({len(results)} results for {len(batch)} items)"
+                    ))
@@ -0,0 +1,127 @@
+# vision/models/bulk.py
+
+import io
+import os
+import csv
+import json
+import zipfile
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from vision.models import chexnet_model
+
+logger = logging.getLogger(__name__)
+
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", os.cpu_count() or 2))
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 16))
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+CSV_FIELDS = ["filename", "diagnosis", "confidence", "error"]
+
+_pool = None
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: forking a process that has already run torch ops
+        # can deadlock the children's OpenMP thread pools.
+        _pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def iter_zip(data: bytes):
+    """Yield (name, bytes) for every image inside a zip archive."""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield info.filename, archive.read(info)
+
+
+def iter_directory(root: str):
+    """Yield (relative name, path) for every image under a directory."""
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(dirpath, filename)
+                yield os.path.relpath(path, root), path
+
+
+def score_stream(items, decode=chexnet_model.preprocess_bytes,
+                 batch_size=BULK_BATCH_SIZE, workers=BULK_WORKERS):
+    """
+    Score many images and yield one result dict per image as soon as its
+    batch finishes (not in input order).
+
+    `items` yields (name, payload) pairs and `decode(payload)` turns a
+    payload into an input tensor. Decoding fans out over worker processes;
+    decoded tensors are grouped into batches of `batch_size` for a single
+    CheXNet forward pass each.
+    """
+    pool = _get_pool(workers)
+    items = iter(items)
+    max_pending = workers * 2 + batch_size
+    pending = {}
+    batch = []
+    exhausted = False
+
+    while True:
+        while not exhausted and len(pending) < max_pending:
+            try:
+                name, payload = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            pending[pool.submit(decode, payload)] = name
+
+        if pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    batch.append((name, future.result()))
+                except Exception as e:
+                    yield {"filename": name, "error": str(e)}
+
+        # Run full batches right away, and the remainder once input runs out
+        while len(batch) >= batch_size or (batch and exhausted and not pending):
+            chunk, batch = batch[:batch_size], batch[batch_size:]
+            yield from _predict(chunk)
+
+        if exhausted and not pending and not batch:
+            return
+
+
+def _predict(chunk):
+    names = [name for name, _ in chunk]
+    try:
+        results = chexnet_model.predict_batch([tensor for _, tensor in chunk])
+    except Exception as e:
+        logger.exception(f"Batch of {len(chunk)} failed")
+        for name in names:
+            yield {"filename": name, "error": str(e)}
+        return
+    for name, result in zip(names, results):
+        yield {"filename": name, **result}
+
+
+def to_ndjson(results):
+    for result in results:
+        yield json.dumps(result) + "\n"
+
+
+def to_csv(results):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for result in results:
+        writer.writerow(result)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.getvalue():
+        # Header only: there were no results
+        yield buffer.getvalue()
@@ -0,0 +1,136 @@
+# vision/models/cam.py
+#
+# Heatmap overlays for CheXNet diagnoses.
+#
+# The class-activation maps come out of the diagnosis forward pass itself
+# (chexnet_model.predict_batch_explained). This module turns each 7x7 map into
+# a small palette PNG over the decoded X-ray. It stores the PNGs under CAM_DIR,
+# keyed by image hash and model version, so a repeat upload reuses them.
+
+import io
+import os
+import re
+import threading
+import logging
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+CAM_DIR = os.getenv("CAM_DIR", os.path.join("data", "heatmaps"))
+# Labels per study that get a heatmap
+CAM_TOP_K = int(os.getenv("CAM_TOP_K", 3))
+# Peak opacity of the heat colours; cold regions show the plain X-ray
+CAM_ALPHA = float(os.getenv("CAM_ALPHA", 0.5))
+# Palette size of the PNGs; 64 colours keep a 224x224 overlay around 20 KB
+CAM_COLORS = int(os.getenv("CAM_COLORS", 64))
+
+_NAME = re.compile(r"^[A-Za-z0-9_.+-]+\.png$")
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+
+def normalize(cam: torch.Tensor, size: int) -> np.ndarray:
+    """Upsample a (h, w) map to (size, size) and scale its positive part to [0, 1]."""
+    cam = F.interpolate(cam[None, None].float(), size=(size, size), mode="bilinear", align_corners=False)[0, 0]
+    cam = cam.clamp_(min=0)
+    peak = cam.max()
+    if peak > 0:
+        cam /= peak
+    return cam.numpy()
+
+
+def _jet(values: np.ndarray) -> np.ndarray:
+    """Blue -> cyan -> yellow -> red colour map, (H, W) in [0, 1] to (H, W, 3) in [0, 1]."""
+    r = np.clip(1.5 - np.abs(4 * values - 3), 0, 1)
+    g = np.clip(1.5 - np.abs(4 * values - 2), 0, 1)
+    b = np.clip(1.5 - np.abs(4 * values - 1), 0, 1)
+    return np.stack([r, g, b], axis=-1)
+
+
+def render_overlay(gray: torch.Tensor, cam: torch.Tensor) -> bytes:
+    """PNG of a (1, H, W) uint8 X-ray with one class-activation map blended over it."""
+    base = gray[0].numpy().astype(np.float32) / 255
+    heat = normalize(cam, base.shape[0])
+    alpha = (CAM_ALPHA * heat)[..., None]
+    rgb = (1 - alpha) * base[..., None] + alpha * _jet(heat)
+
+    image = Image.fromarray((rgb * 255).round().astype(np.uint8), "RGB")
+    buffer = io.BytesIO()
+    image.quantize(colors=CAM_COLORS).save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+class HeatmapStore:
+    """
+    PNG overlays on disk, one directory per image hash:
+    `<root>/<digest[:2]>/<digest>/<model version>-<label>.png`.
+    """
+
+    def __init__(self, root=CAM_DIR, url_prefix="/heatmaps"):
+        self.root = root
+        self.url_prefix = url_prefix
+        self._lock = threading.Lock()
+        self.written = 0
+        self.bytes_written = 0
+
+    def path(self, digest: str, name: str):
+        """Path of one stored overlay, or None for names that aren't ours."""
+        if not _DIGEST.match(digest) or not _NAME.match(name):
+            return None
+        return os.path.join(self.root, digest[:2], digest, name)
+
+    def has(self, result: dict) -> bool:
+        """Whether every overlay a cached result points at is still on disk."""
+        heatmaps = result.get("heatmaps")
+        if not heatmaps:
+            return False
+        for heatmap in heatmaps:
+            _, digest, name = heatmap["url"].rsplit("/", 2)
+            path = self.path(digest, name)
+            if path is None or not os.path.exists(path):
+                return False
+        return True
+
+    def attach(self, digest: str, version: str, gray: torch.Tensor, result: dict) -> dict:
+        """
+        Render and store the overlays for one `predict_batch_explained`
+        result; returns it with the raw maps replaced by `heatmaps` URLs.
+        """
+        result = dict(result)
+        heatmaps = []
+        for cam in result.pop("cams"):
+            name = f"{version}-{cam['label']}.png"
+            path = self.path(digest, name)
+            if not os.path.exists(path):
+                self._write(path, render_overlay(gray, cam["map"]))
+            heatmaps.append({
+                "label": cam["label"],
+                "probability": cam["probability"],
+                "url": f"{self.url_prefix}/{digest}/{name}",
+            })
+        result["heatmaps"] = heatmaps
+        return result
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Readers never see a half-written PNG
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.written += 1
+            self.bytes_written += len(data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "written": self.written,
+                "avg_kb": round(self.bytes_written / self.written / 1024, 1) if self.written else 0.0,
+            }
+
+
+heatmap_store = HeatmapStore()
@@ -0,0 +1,244 @@
+# vision/models/cascade.py
+#
+# Confidence-gated model cascade: a small screening model scores every
+# study, and the heavy model (DenseNet121 CheXNet, or ViT on the Flask path)
+# only runs on the studies the screener is unsure about.
+#
+# The screener is a MobileNetV3-Small with the 14 CheXNet labels, run at a
+# reduced resolution on the same decoded grayscale tensors and distilled
+# from CheXNet's outputs (data/scripts/distill_screener.py). Its top
+# probability routes each study:
+#   top < CASCADE_LOW                   clearly normal, screener answers
+#   CASCADE_LOW <= top < CASCADE_HIGH   uncertain, escalated
+#   top >= CASCADE_HIGH                 clear finding, screener answers
+#                                       (CheXNet only: ViT's labels differ)
+# Without distilled weights every study is escalated, so enabling the
+# cascade never silently serves an untrained screener. The same goes for a
+# screener distilled from a different CheXNet than the one being served:
+# the weights file records its teacher's MODEL_VERSION.
+#
+# Pick the band with data/scripts/eval_cascade.py, which replays a folder
+# of images over a grid of thresholds and reports escalation rate,
+# agreement with the heavy model and CPU time per study.
+
+import io
+import os
+import time
+import hashlib
+import threading
+import logging
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torchvision import models
+
+from vision.models import registry, chexnet_model, vit_dummy
+from vision.models.preprocess import load_gray, to_batch, IMAGENET_MEAN, IMAGENET_STD
+from utils import metrics
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "0") == "1"
+CASCADE_LOW = float(os.getenv("CASCADE_LOW", 0.2))
+CASCADE_HIGH = float(os.getenv("CASCADE_HIGH", 0.8))
+# Screener input resolution; the decoded 224x224 study is downscaled to it
+SCREEN_SIZE = int(os.getenv("SCREEN_SIZE", 160))
+SCREEN_WEIGHTS = os.getenv("SCREEN_WEIGHTS", "vision/models/weights/screen.pt")
+
+SCREEN_CLASSES = chexnet_model.CLASSES
+
+ROUTES = ("screen_low", "screen_high", "escalated")
+
+routed_total = metrics.counter(
+    "cascade_routed_total", "Studies by cascade and routing decision", ("cascade", "route")
+)
+
+
+def build_screener(pretrained_backbone: bool = False) -> nn.Module:
+    """MobileNetV3-Small with a 14-label head (ImageNet backbone if requested)."""
+    weights = models.MobileNet_V3_Small_Weights.IMAGENET1K_V1 if pretrained_backbone else None
+    model = models.mobilenet_v3_small(weights=weights)
+    model.classifier[-1] = nn.Linear(model.classifier[-1].in_features, len(SCREEN_CLASSES))
+    return model
+
+
+def _build_screen() -> nn.Module:
+    model = build_screener()
+    # Decided once, when the model is built: weights that appear later are
+    # picked up on the next restart, never half-way through serving
+    model.distilled = False
+    model.version = "none"
+    if os.path.exists(SCREEN_WEIGHTS):
+        with open(SCREEN_WEIGHTS, "rb") as f:
+            data = f.read()
+        saved = torch.load(io.BytesIO(data), map_location="cpu")
+        # Files from before the teacher was recorded have no "teacher" entry
+        teacher = saved.get("teacher") if "state_dict" in saved else None
+        if teacher == chexnet_model.MODEL_VERSION:
+            model.load_state_dict(saved["state_dict"])
+            model.distilled = True
+            model.version = hashlib.sha256(data).hexdigest()[:12]
+        else:
+            logger.warning(f"Screener at {SCREEN_WEIGHTS} was distilled from CheXNet {teacher}, not the "
+                           f"served {chexnet_model.MODEL_VERSION}; cascades will escalate every study")
+    else:
+        logger.warning(f"No distilled screener at {SCREEN_WEIGHTS}; cascades will escalate every study")
+    model.eval()
+    return model
+
+
+def get_screener() -> nn.Module:
+    return registry.get_model("screen")
+
+
+def _warmup(model: nn.Module):
+    with torch.no_grad():
+        model(torch.zeros(1, 3, SCREEN_SIZE, SCREEN_SIZE))
+
+
+# Built lazily on first use, see vision.models.registry
+registry.register("screen", _build_screen, warmup=_warmup)
+
+
+def screen_input(grays: list) -> torch.Tensor:
+    """Normalized (N, 3, SCREEN_SIZE, SCREEN_SIZE) batch from (1, 224, 224) uint8 tensors."""
+    batch = to_batch(grays, IMAGENET_MEAN, IMAGENET_STD)
+    if batch.shape[-1] != SCREEN_SIZE:
+        batch = F.interpolate(batch, size=(SCREEN_SIZE, SCREEN_SIZE), mode="bilinear",
+                              antialias=True, align_corners=False)
+    return batch
+
+
+def screen_probs(grays: list) -> torch.Tensor:
+    """(N, 14) screener probabilities, on the CPU."""
+    with span("preprocess", "screen"):
+        batch = screen_input(grays)
+    with span("forward", "screen"), torch.no_grad():
+        return torch.sigmoid(get_screener()(batch))
+
+
+def route(confidence: float, low: float = CASCADE_LOW, high: float = CASCADE_HIGH,
+          accept_high: bool = True) -> str:
+    """Routing decision for one study from the screener's top probability."""
+    if confidence < low:
+        return "screen_low"
+    if accept_high and confidence >= high:
+        return "screen_high"
+    return "escalated"
+
+
+class Cascade:
+    """
+    Screener in front of a heavy `predict_batch`. `screened_result(probs)`
+    turns one row of screener probabilities into the heavy model's result
+    format. Results carry `"stage": "screen"` or `"stage": "full"`.
+    """
+
+    def __init__(self, name, heavy, screened_result, model_id, model_version,
+                 accept_high=True, low=CASCADE_LOW, high=CASCADE_HIGH):
+        self.name = name
+        self.heavy = heavy
+        self.screened_result = screened_result
+        self.accept_high = accept_high
+        self.low = low
+        self.high = high
+        self.model_id = f"{model_id}+screen"
+        self._heavy_version = model_version
+
+        self._lock = threading.Lock()
+        self._routes = dict.fromkeys(ROUTES, 0)
+        self._screen_seconds = 0.0
+        self._heavy_seconds = 0.0
+
+    @property
+    def model_version(self) -> str:
+        # Result cache identity: a different band or screener can change answers
+        accept = "lh" if self.accept_high else "l"
+        return f"{self._heavy_version}-{accept}{self.low}-{self.high}-{get_screener().version}"
+
+    def predict_batch(self, grays: list) -> list:
+        """Drop-in for the heavy model's `predict_batch`, e.g. behind a MicroBatcher."""
+        probs = None
+        screen_seconds = 0.0
+        if get_screener().distilled:
+            started = time.perf_counter()
+            probs = screen_probs(grays)
+            screen_seconds = time.perf_counter() - started
+            tops = probs.max(dim=1).values.tolist()
+            routes = [route(top, self.low, self.high, self.accept_high) for top in tops]
+        else:
+            routes = ["escalated"] * len(grays)
+
+        results = [None] * len(grays)
+        escalate = []
+        for i, decision in enumerate(routes):
+            if decision == "escalated":
+                escalate.append(i)
+            else:
+                results[i] = {**self.screened_result(probs[i]), "stage": "screen"}
+
+        heavy_seconds = 0.0
+        if escalate:
+            started = time.perf_counter()
+            heavy_results = self.heavy([grays[i] for i in escalate])
+            heavy_seconds = time.perf_counter() - started
+            for i, result in zip(escalate, heavy_results):
+                results[i] = {**result, "stage": "full"}
+
+        self._record(routes, screen_seconds, heavy_seconds)
+        return results
+
+    def diagnose_bytes(self, data: bytes) -> dict:
+        with span("decode", "screen"):
+            gray = load_gray(data)
+        return self.predict_batch([gray])[0]
+
+    def _record(self, routes, screen_seconds, heavy_seconds):
+        with self._lock:
+            for decision in routes:
+                self._routes[decision] += 1
+            self._screen_seconds += screen_seconds
+            self._heavy_seconds += heavy_seconds
+        for decision in ROUTES:
+            count = routes.count(decision)
+            if count:
+                routed_total.inc(count, cascade=self.name, route=decision)
+
+    def stats(self) -> dict:
+        with self._lock:
+            routes = dict(self._routes)
+            screen_seconds = self._screen_seconds
+            heavy_seconds = self._heavy_seconds
+        studies = sum(routes.values())
+        return {
+            "name": self.name,
+            "low": self.low,
+            "high": self.high,
+            "screen_distilled": registry.is_loaded("screen") and get_screener().distilled,
+            "studies": studies,
+            "routes": routes,
+            "escalation_rate": round(routes["escalated"] / studies, 4) if studies else 0.0,
+            "screen_seconds": round(screen_seconds, 3),
+            "heavy_seconds": round(heavy_seconds, 3),
+            "avg_ms_per_study": round(1000 * (screen_seconds + heavy_seconds) / studies, 3) if studies else 0.0,
+        }
+
+
+def _vit_screened(probs: torch.Tensor) -> dict:
+    # Only clearly normal studies reach this (accept_high=False)
+    return vit_dummy.make_result("No Finding", 1 - probs.max().item())
+
+
+# FastAPI /diagnose: screener -> CheXNet, same labels, so both ends of the band are answered
+chexnet_cascade = Cascade(
+    "chexnet", chexnet_model.predict_batch, chexnet_model._postprocess,
+    chexnet_model.MODEL_ID, chexnet_model.MODEL_VERSION,
+)
+
+# Flask /diagnose: screener -> ViT; only "clearly normal" maps onto ViT's labels
+vit_cascade = Cascade(
+    "vit", vit_dummy.predict_batch, _vit_screened,
+    vit_dummy.MODEL_ID, vit_dummy.MODEL_VERSION, accept_high=False,
+)
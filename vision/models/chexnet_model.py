@@ -1,34 +1,111 @@
 # vision/models/chexnet_model.py
 
+import os
+import hashlib
+import logging
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from torchvision import models
 from torchvision.models import DenseNet121_Weights
-from PIL import Image
-from torchvision import transforms
+from vision.models import registry, backends
+from vision.models.preprocess import load_gray, to_batch, IMAGENET_MEAN, IMAGENET_STD
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
 
 # === Model Setup ===
+# The 14-label head. torchvision only ships the ImageNet backbone, so the
+# head is initialised once from CHEXNET_HEAD_SEED and persisted here; every
+# later start (and every prefork worker, distillation and eval run) loads
+# the same weights. Put a trained head at this path to serve it instead.
+CHEXNET_HEAD_WEIGHTS = os.getenv("CHEXNET_HEAD_WEIGHTS", "vision/models/weights/chexnet_head.pt")
+CHEXNET_HEAD_SEED = int(os.getenv("CHEXNET_HEAD_SEED", 0))
+NUM_FEATURES = 1024  # DenseNet121's pooled feature size
+
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-# Load DenseNet121 with updated 'weights' argument
-weights = DenseNet121_Weights.IMAGENET1K_V1
-model = models.densenet121(weights=weights)
+def _seeded(module_fn):
+    # Build a module from CHEXNET_HEAD_SEED without touching the global RNG
+    with torch.random.fork_rng(devices=[]):
+        torch.manual_seed(CHEXNET_HEAD_SEED)
+        return module_fn()
+
+def _weights_hash(state: dict) -> str:
+    digest = hashlib.sha256()
+    for name in sorted(state):
+        digest.update(name.encode())
+        digest.update(state[name].detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()[:12]
+
+def _load_head() -> dict:
+    if os.path.exists(CHEXNET_HEAD_WEIGHTS):
+        return torch.load(CHEXNET_HEAD_WEIGHTS, map_location="cpu")
+    state = _seeded(lambda: nn.Linear(NUM_FEATURES, 14)).state_dict()
+    try:
+        os.makedirs(os.path.dirname(CHEXNET_HEAD_WEIGHTS) or ".", exist_ok=True)
+        tmp_path = f"{CHEXNET_HEAD_WEIGHTS}.{os.getpid()}.tmp"
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, CHEXNET_HEAD_WEIGHTS)
+        logger.info(f"Initialised CheXNet head (seed {CHEXNET_HEAD_SEED}) at {CHEXNET_HEAD_WEIGHTS}")
+    except OSError as e:
+        # Still reproducible from the seed, just not pinned to a file
+        logger.warning(f"Could not persist CheXNet head to {CHEXNET_HEAD_WEIGHTS}: {e}")
+    return state
+
+_head_state = _load_head()
+
+# Identity used in result cache keys: the backbone plus a hash of the head's
+# weights, so it changes exactly when the served model does. A random
+# backbone (PRETRAINED_WEIGHTS=0) is seeded too, and named by its seed.
+MODEL_ID = "chexnet-densenet121"
+_BACKBONE = "in1k" if registry.PRETRAINED_WEIGHTS else f"random-s{CHEXNET_HEAD_SEED}"
+MODEL_VERSION = f"{_BACKBONE}-{_weights_hash(_head_state)}"
+
+def _build_model() -> nn.Module:
+    # Load DenseNet121 with updated 'weights' argument
+    if registry.PRETRAINED_WEIGHTS:
+        model = models.densenet121(weights=DenseNet121_Weights.IMAGENET1K_V1)
+    else:
+        model = _seeded(lambda: models.densenet121(weights=None))
+
+    # Replace classifier for 14 chest X-ray labels
+    model.classifier = nn.Linear(model.classifier.in_features, 14)  # 14 diseases
+    model.classifier.load_state_dict(_head_state)
+    model = model.to(device)
+    model.eval()
+
+    logger.info(f"CheXNet model {MODEL_VERSION} loaded on device: {device}")
+    return model
+
+def _warmup(model: nn.Module):
+    with torch.no_grad():
+        model(torch.zeros(1, 3, 224, 224, device=device))
+
+# Built lazily on first use, see vision.models.registry
+registry.register("chexnet", _build_model, warmup=_warmup)
+
+def get_model() -> nn.Module:
+    return registry.get_model("chexnet")
+
+SAMPLE_IMAGE = os.path.join("data", "samples", "sample_xray.png")
+
+def calibration_batch() -> torch.Tensor:
+    # Representative input for tracing, export, int8 calibration and accuracy checks
+    if os.path.exists(SAMPLE_IMAGE):
+        return prepare_batch([preprocess(SAMPLE_IMAGE)])
+    return torch.rand(1, 3, 224, 224)
 
-# Replace classifier for 14 chest X-ray labels
-num_features = model.classifier.in_features
-model.classifier = nn.Linear(num_features, 14)  # 14 diseases
-model = model.to(device)
-model.eval()
+def _build_runner():
+    # Optimized CPU backends (see vision.models.backends); GPUs stay eager
+    if device.type != "cpu":
+        return get_model()
+    return backends.build_verified(backends.INFERENCE_BACKEND, get_model(), calibration_batch())
 
-print(f"[INFO] CheXNet model loaded on device: {device}")
+registry.register("chexnet_runner", _build_runner, warmup=_warmup)
 
-# Transformation
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize([0.485, 0.456, 0.406],
-                         [0.229, 0.224, 0.225])
-])
+def get_runner():
+    return registry.get_model("chexnet_runner")
 
 # List of labels from NIH ChestXray14
 CLASSES = [
@@ -37,14 +114,25 @@ CLASSES = [
     "Emphysema", "Fibrosis", "Pleural_Thickening", "Hernia"
 ]
 
-def diagnose_image(image_path: str) -> dict:
-    image = Image.open(image_path).convert("RGB")
-    input_tensor = transform(image).unsqueeze(0).to(device)
+# Preprocessing is split in two (see vision.models.preprocess): per-image
+# decode + resize to a (1, 224, 224) uint8 tensor, then per-batch
+# normalization in `prepare_batch`.
 
-    with torch.no_grad():
-        output = model(input_tensor)
-        probs = torch.sigmoid(output)[0]  # Multi-label probs
+def preprocess(image_path: str) -> torch.Tensor:
+    """Load an X-ray from disk and return a (1, 224, 224) uint8 tensor."""
+    with span("decode", "chexnet"):
+        return load_gray(image_path)
+
+def preprocess_bytes(data: bytes) -> torch.Tensor:
+    """Decode an X-ray straight from an upload buffer, without touching disk."""
+    with span("decode", "chexnet"):
+        return load_gray(data)
+
+def prepare_batch(tensors: list) -> torch.Tensor:
+    """Turn preprocessed uint8 tensors into a normalized (N, 3, 224, 224) batch."""
+    return to_batch(tensors, IMAGENET_MEAN, IMAGENET_STD)
 
+def _postprocess(probs: torch.Tensor) -> dict:
     # Pick top disease
     top_idx = probs.argmax().item()
     top_prob = probs[top_idx].item()
@@ -52,4 +140,63 @@ def diagnose_image(image_path: str) -> dict:
     return {
         "diagnosis": CLASSES[top_idx],
         "confidence": round(top_prob, 2)
-    }
\ No newline at end of file
+    }
+
+def predict_probs(tensors: list) -> torch.Tensor:
+    """(N, 14) multi-label probabilities for a list of preprocessed tensors."""
+    with span("preprocess", "chexnet"):
+        input_batch = prepare_batch(tensors).to(device)
+
+    with span("forward", "chexnet"), torch.no_grad():
+        output = get_runner()(input_batch)
+        return torch.sigmoid(output).cpu()  # Multi-label probs
+
+def predict_batch(tensors: list) -> list:
+    """Run one forward pass over a list of preprocessed tensors."""
+    probs = predict_probs(tensors)
+    with span("postprocess", "chexnet"):
+        return [_postprocess(p) for p in probs]
+
+def predict_batch_explained(tensors: list, top_k: int = 3) -> list:
+    """
+    `predict_batch` plus class-activation maps for the top-k labels, from
+    the same forward pass. DenseNet121 ends in relu -> global average pool
+    -> linear, so the map for label c is W_c . relu(features): exactly what
+    the logit averages over, with no backward pass. Each result gets
+    `"cams": [{"label", "probability", "map": (7, 7) tensor}, ...]`.
+
+    Always runs the eager model (the optimized backends don't expose the
+    feature maps); the split forward is computed here rather than with
+    module hooks so concurrent callers can't see each other's activations.
+    """
+    with span("preprocess", "chexnet"):
+        input_batch = prepare_batch(tensors).to(device)
+
+    model = get_model()
+    with span("forward", "chexnet"), torch.no_grad():
+        features = torch.relu(model.features(input_batch))  # (N, 1024, 7, 7)
+        logits = model.classifier(torch.flatten(F.adaptive_avg_pool2d(features, 1), 1))
+        probs = torch.sigmoid(logits).cpu()
+
+    with span("cam", "chexnet"), torch.no_grad():
+        top = probs.topk(min(top_k, len(CLASSES)), dim=1)
+        weights = model.classifier.weight[top.indices.to(device)]  # (N, k, 1024)
+        cams = torch.einsum("nkc,nchw->nkhw", weights, features).cpu()
+
+    with span("postprocess", "chexnet"):
+        results = []
+        for p, indices, values, maps in zip(probs, top.indices, top.values, cams):
+            results.append({
+                **_postprocess(p),
+                "cams": [
+                    {"label": CLASSES[i], "probability": round(v, 3), "map": m}
+                    for i, v, m in zip(indices.tolist(), values.tolist(), maps)
+                ],
+            })
+        return results
+
+def diagnose_image(image_path: str) -> dict:
+    return predict_batch([preprocess(image_path)])[0]
+
+def diagnose_bytes(data: bytes) -> dict:
+    return predict_batch([preprocess_bytes(data)])[0]
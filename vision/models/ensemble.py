@@ -0,0 +1,172 @@
+# vision/models/ensemble.py
+#
+# CheXNet + ViT ensemble for one study.
+#
+# The upload is decoded once, to the shared (1, 224, 224) uint8 grayscale
+# tensor from vision.models.preprocess. Each model builds its own input
+# from that tensor: ImageNet-normalized for CheXNet, plain [0, 1] for ViT.
+# The two forward passes then run at the same time, each on its own thread
+# pool. Each pool's threads are initialised with their share of the
+# intra-op threads, so the models don't oversubscribe the cores and
+# wall-clock time tracks the slower model rather than the sum of both.
+#
+# Fusion is a weighted average over the union of labels. CheXNet scores all
+# 14 findings plus "No Finding" (the chance that none is present). ViT
+# contributes to the labels it shares with CheXNet. Labels only one model
+# knows come from that model alone.
+
+import os
+import math
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from vision.models import chexnet_model, vit_dummy
+from vision.models.preprocess import load_gray
+from utils import metrics
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Weight of ViT in the fused probabilities; CheXNet gets the rest
+ENSEMBLE_VIT_WEIGHT = float(os.getenv("ENSEMBLE_VIT_WEIGHT", 0.4))
+# Intra-op threads shared by both models; 0 = torch's current setting
+ENSEMBLE_THREADS = int(os.getenv("ENSEMBLE_THREADS", 0))
+# ViT-B/16 needs ~6x the FLOPs of DenseNet121, so it gets most of the threads
+ENSEMBLE_VIT_SHARE = float(os.getenv("ENSEMBLE_VIT_SHARE", 0.75))
+# Studies each model works on at once
+ENSEMBLE_CONCURRENCY = int(os.getenv("ENSEMBLE_CONCURRENCY", 1))
+
+# Identity used in result cache keys
+MODEL_ID = "ensemble-chexnet-vit"
+MODEL_VERSION = f"{chexnet_model.MODEL_VERSION}+{vit_dummy.MODEL_VERSION}-w{ENSEMBLE_VIT_WEIGHT}"
+
+NO_FINDING = "No Finding"
+LABELS = [*chexnet_model.CLASSES, NO_FINDING]
+
+
+def split_threads(total: int, vit_share: float = ENSEMBLE_VIT_SHARE) -> dict:
+    """Intra-op threads per model, at least one each."""
+    if total < 2:
+        return {"chexnet": 1, "vit": 1}
+    vit = min(total - 1, max(1, round(total * vit_share)))
+    return {"chexnet": total - vit, "vit": vit}
+
+
+def fuse(chexnet_probs: torch.Tensor, vit_probs: torch.Tensor, vit_weight: float = ENSEMBLE_VIT_WEIGHT) -> dict:
+    """Fused probability per label, from one study's CheXNet and ViT probabilities."""
+    chexnet = dict(zip(chexnet_model.CLASSES, chexnet_probs.tolist()))
+    chexnet[NO_FINDING] = math.prod(1 - p for p in chexnet_probs.tolist())
+    vit = dict(zip(vit_dummy.CLASSES, vit_probs.tolist()))
+
+    fused = {}
+    for label in LABELS:
+        if label in vit:
+            fused[label] = (1 - vit_weight) * chexnet[label] + vit_weight * vit[label]
+        else:
+            fused[label] = chexnet[label]
+    return fused
+
+
+class Ensemble:
+    def __init__(self, threads: int = ENSEMBLE_THREADS, vit_weight: float = ENSEMBLE_VIT_WEIGHT,
+                 concurrency: int = ENSEMBLE_CONCURRENCY):
+        self.vit_weight = vit_weight
+        self.threads = split_threads(threads or torch.get_num_threads())
+        self._predict = {"chexnet": chexnet_model.predict_probs, "vit": vit_dummy.predict_probs}
+        # Studies submitted to each pool and not started yet
+        self._queued = dict.fromkeys(self._predict, 0)
+        self._lock = threading.Lock()
+        # torch.set_num_threads in the initializer applies to that pool's
+        # worker threads (OpenMP's thread count is a per-thread setting)
+        self._pools = {
+            name: ThreadPoolExecutor(
+                max_workers=concurrency, thread_name_prefix=f"ensemble-{name}",
+                initializer=torch.set_num_threads, initargs=(self.threads[name],),
+            )
+            for name in self._predict
+        }
+        logger.info(f"Ensemble intra-op threads: {self.threads}")
+
+    def _run(self, name: str, gray: torch.Tensor, submitted: float):
+        started = time.perf_counter()
+        with self._lock:
+            self._queued[name] -= 1
+        probs = self._predict[name]([gray])[0]
+        finished = time.perf_counter()
+        return probs, {"queue_ms": round(1000 * (started - submitted), 2),
+                       "ms": round(1000 * (finished - started), 2)}
+
+    def diagnose_gray(self, gray: torch.Tensor) -> dict:
+        """Run both models on one decoded study and fuse their outputs."""
+        submitted = time.perf_counter()
+        with self._lock:
+            for name in self._pools:
+                self._queued[name] += 1
+        futures = {name: pool.submit(self._run, name, gray, submitted) for name, pool in self._pools.items()}
+        chexnet_probs, chexnet_timing = futures["chexnet"].result()
+        vit_probs, vit_timing = futures["vit"].result()
+        parallel_ms = round(1000 * (time.perf_counter() - submitted), 2)
+
+        with span("fuse", "ensemble"):
+            fused = fuse(chexnet_probs, vit_probs, self.vit_weight)
+            diagnosis = max(fused, key=fused.get)
+
+        chexnet_top = int(chexnet_probs.argmax())
+        vit_top = int(vit_probs.argmax())
+        return {
+            "diagnosis": diagnosis,
+            "confidence": round(fused[diagnosis], 2),
+            "models": {
+                "chexnet": {"diagnosis": chexnet_model.CLASSES[chexnet_top],
+                            "confidence": round(chexnet_probs[chexnet_top].item(), 2)},
+                "vit": {"diagnosis": vit_dummy.CLASSES[vit_top],
+                        "confidence": round(vit_probs[vit_top].item(), 2)},
+            },
+            "timing_ms": {"chexnet": chexnet_timing, "vit": vit_timing, "models": parallel_ms},
+        }
+
+    def diagnose_bytes(self, data: bytes) -> dict:
+        started = time.perf_counter()
+        with span("decode", "ensemble"):
+            gray = load_gray(data)
+        decoded = time.perf_counter()
+        result = self.diagnose_gray(gray)
+        result["timing_ms"] = {
+            "decode": round(1000 * (decoded - started), 2),
+            **result["timing_ms"],
+            "total": round(1000 * (time.perf_counter() - started), 2),
+        }
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"threads": self.threads, "queue_depth": dict(self._queued)}
+
+    def shutdown(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=False)
+
+
+_ensemble = None
+_ensemble_lock = threading.Lock()
+
+
+def get_ensemble() -> Ensemble:
+    """Process-wide ensemble, created on first use (after any pre-fork thread setup)."""
+    global _ensemble
+    if _ensemble is None:
+        with _ensemble_lock:
+            if _ensemble is None:
+                _ensemble = Ensemble()
+                # Only once it exists: scraping must not start its thread pools
+                metrics.register_collector("ensemble", _ensemble.stats)
+    return _ensemble
+
+
+def diagnose_bytes(data: bytes) -> dict:
+    """Module-level entry point, picklable for InferenceExecutor process pools."""
+    return get_ensemble().diagnose_bytes(data)
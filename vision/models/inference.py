@@ -1,5 +1,33 @@
 # vision/models/inference.py
 
-from vision.models.chexnet_model import diagnose_image
+import functools
+from concurrent.futures import Future
 
-__all__ = ["diagnose_image"]
+from vision.models import chexnet_model
+from vision.models.batching import MicroBatcher
+from vision.models.cascade import chexnet_cascade
+from vision.models.cam import CAM_TOP_K
+from vision.models.chexnet_model import diagnose_image, diagnose_bytes
+
+# Shared batcher in front of the CheXNet model for concurrent requests
+chexnet_batcher = MicroBatcher(chexnet_model.predict_batch, name="chexnet")
+# Same, with the screening model in front (CASCADE_ENABLED=1, see vision.models.cascade)
+cascade_batcher = MicroBatcher(chexnet_cascade.predict_batch, name="chexnet_cascade")
+# Diagnosis plus class-activation maps from the same forward pass (?explain=true)
+explain_batcher = MicroBatcher(
+    functools.partial(chexnet_model.predict_batch_explained, top_k=CAM_TOP_K), name="chexnet_explain"
+)
+
+def diagnose_image_batched(image_path: str) -> Future:
+    """Preprocess an image and queue it for a batched CheXNet forward pass."""
+    return chexnet_batcher.submit(chexnet_model.preprocess(image_path))
+
+def diagnose_bytes_batched(data: bytes) -> Future:
+    """Decode an upload buffer and queue it for a batched CheXNet forward pass."""
+    return chexnet_batcher.submit(chexnet_model.preprocess_bytes(data))
+
+__all__ = [
+    "diagnose_image", "diagnose_bytes",
+    "diagnose_image_batched", "diagnose_bytes_batched",
+    "chexnet_batcher", "cascade_batcher", "explain_batcher",
+]
@@ -0,0 +1,118 @@
+# vision/models/registry.py
+
+import os
+import time
+import threading
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Set PRETRAINED_WEIGHTS=0 to skip weight downloads (tests, benchmarks, CI)
+PRETRAINED_WEIGHTS = os.getenv("PRETRAINED_WEIGHTS", "1") == "1"
+
+# Comma-separated model names to warm up when a server starts, e.g. "chexnet,vit"
+WARMUP_MODELS = [m.strip() for m in os.getenv("WARMUP_MODELS", "").split(",") if m.strip()]
+
+# Modules that register a model when imported, so names resolve without the
+# caller having to import the model module first.
+KNOWN_MODELS = {
+    "chexnet": "vision.models.chexnet_model",
+    "chexnet_runner": "vision.models.chexnet_model",
+    "vit": "vision.models.vit_dummy",
+    "screen": "vision.models.cascade",
+}
+
+_loaders = {}
+_warmups = {}
+_models = {}
+_load_times = {}
+# One lock per model name, so a loader can build the models it depends on
+# (e.g. chexnet_runner wraps chexnet) while other names load in parallel
+_locks = {}
+_lock = threading.Lock()
+
+
+def register(name: str, loader, warmup=None):
+    """
+    Register a model builder. `loader()` is called once, on first use, and
+    must return a ready-to-run model. `warmup(model)` is optional and should
+    run a dummy forward pass.
+    """
+    _loaders[name] = loader
+    if warmup is not None:
+        _warmups[name] = warmup
+
+
+def _resolve(name: str):
+    if name not in _loaders and name in KNOWN_MODELS:
+        importlib.import_module(KNOWN_MODELS[name])
+    if name not in _loaders:
+        raise KeyError(f"Unknown model: {name!r}")
+    return _loaders[name]
+
+
+def get_model(name: str):
+    """Return the model registered under `name`, building it on first use."""
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    loader = _resolve(name)
+    with _lock:
+        name_lock = _locks.setdefault(name, threading.Lock())
+    with name_lock:
+        if name not in _models:
+            started = time.perf_counter()
+            _models[name] = loader()
+            _load_times[name] = time.perf_counter() - started
+            logger.info(f"Loaded model '{name}' in {_load_times[name]:.2f}s")
+    return _models[name]
+
+
+def is_loaded(name: str) -> bool:
+    return name in _models
+
+
+def preload(names=None) -> list:
+    """Build the given models (default: all known) without running them.
+
+    Call this in a parent process before forking workers so the weights are
+    shared copy-on-write instead of being loaded once per worker.
+    """
+    names = list(names or KNOWN_MODELS)
+    for name in names:
+        get_model(name)
+    return names
+
+
+def warmup(names=None) -> list:
+    """Build the given models and run their warm-up pass, if any."""
+    names = preload(names)
+    for name in names:
+        if name in _warmups:
+            started = time.perf_counter()
+            _warmups[name](_models[name])
+            logger.info(f"Warmed up model '{name}' in {time.perf_counter() - started:.2f}s")
+    return names
+
+
+def stats() -> dict:
+    return {
+        name: {"loaded": name in _models, "load_time_s": round(_load_times.get(name, 0.0), 3)}
+        for name in sorted(set(KNOWN_MODELS) | set(_loaders))
+    }
+
+
+if __name__ == "__main__":
+    # e.g. `python -m vision.models.registry chexnet vit` at image build time
+    # to download weights and check that the models run.
+    import sys
+
+    # Go through the package module: the model modules register there, not
+    # in this __main__ copy.
+    from vision.models import registry as _registry
+
+    logging.basicConfig(level=logging.INFO)
+    _registry.warmup(sys.argv[1:] or None)
+    print(_registry.stats())
@@ -0,0 +1,127 @@
+# vision/models/result_cache.py
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 1024))
+# Optional on-disk tier that survives restarts, e.g. data/cache/results.db
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "")
+RESULT_CACHE_DB_SIZE = int(os.getenv("RESULT_CACHE_DB_SIZE", 100_000))
+
+
+def make_key(data: bytes, model_id: str, model_version: str) -> str:
+    """Cache key for one image under one model: sha256 of the bytes + model identity."""
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{model_id}:{model_version}:{digest}"
+
+
+class ResultCache:
+    """
+    Two-tier diagnosis cache: a size-bounded LRU dict in memory, backed by an
+    optional SQLite table on disk. Disk hits are promoted into memory.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, db_path=RESULT_CACHE_DB,
+                 max_db_entries=RESULT_CACHE_DB_SIZE):
+        self.max_entries = max_entries
+        self.db_path = db_path or None
+        self.max_db_entries = max_db_entries
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.db_path:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return dict(self._memory[key])
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+                    self.disk_hits += 1
+                    return dict(value)
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: dict):
+        with self._lock:
+            self._remember(key, dict(value))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, accessed) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time()),
+                )
+                self._db.commit()
+                self._db_writes += 1
+                # Trim the disk tier every so often rather than on every write
+                if self._db_writes % 1000 == 0:
+                    self._trim_db()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk_tier": self.db_path,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / total, 3) if total else 0.0,
+            }
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _trim_db(self):
+        self._db.execute(
+            "DELETE FROM results WHERE key NOT IN "
+            "(SELECT key FROM results ORDER BY accessed DESC LIMIT ?)",
+            (self.max_db_entries,),
+        )
+        self._db.commit()
+
+
+# Shared by the FastAPI and Flask diagnose paths
+result_cache = ResultCache()
@@ -1,19 +1,32 @@
 # vision/models/vit_dummy.py
 
 import torch
-from PIL import Image
-from torchvision import transforms
-from timm import create_model
+from vision.models import registry
+from vision.models.preprocess import load_gray, to_batch
+from utils.metrics import span
 
-# Load pretrained Vision Transformer model
-model = create_model("vit_base_patch16_224", pretrained=True)
-model.eval()
+# Identity used in result cache keys; bump the version when weights change
+MODEL_ID = "vit_base_patch16_224"
+MODEL_VERSION = "1" if registry.PRETRAINED_WEIGHTS else "1-random"
 
-# Image preprocessing pipeline
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-])
+def _build_model():
+    # timm is only imported once the model is actually needed
+    from timm import create_model
+
+    # Load pretrained Vision Transformer model
+    model = create_model("vit_base_patch16_224", pretrained=registry.PRETRAINED_WEIGHTS)
+    model.eval()
+    return model
+
+def _warmup(model):
+    with torch.no_grad():
+        model(torch.zeros(1, 3, 224, 224))
+
+# Built lazily on first use, see vision.models.registry
+registry.register("vit", _build_model, warmup=_warmup)
+
+def get_model():
+    return registry.get_model("vit")
 
 # Diagnosis labels
 CLASSES = ["Pneumonia", "No Finding", "Effusion", "Infiltration", "Edema"]
@@ -43,19 +56,54 @@ def diagnose_image(image_path: str) -> dict:
     Returns:
         dict: Diagnosis, confidence, and generated doctor's note.
     """
-    image = Image.open(image_path).convert("RGB")
-    input_tensor = transform(image).unsqueeze(0)
+    with span("decode", "vit"):
+        gray = load_gray(image_path)
+    return _diagnose(gray)
 
-    with torch.no_grad():
-        output = model(input_tensor)
-        pred_idx = output.argmax(dim=1).item()
-        confidence = torch.nn.functional.softmax(output, dim=1)[0, pred_idx].item()
+def diagnose_bytes(data: bytes) -> dict:
+    """
+    Same as `diagnose_image`, but decodes the X-ray from an in-memory
+    upload buffer instead of a file on disk.
+    """
+    with span("decode", "vit"):
+        gray = load_gray(data)
+    return _diagnose(gray)
 
-    diagnosis = CLASSES[pred_idx % len(CLASSES)]
-    note = generate_notes(diagnosis, confidence)
+def _diagnose(gray: torch.Tensor) -> dict:
+    return predict_batch([gray])[0]
 
+def make_result(diagnosis: str, confidence: float) -> dict:
     return {
         "diagnosis": diagnosis,
         "confidence": round(confidence, 2),
-        "note": note
+        "note": generate_notes(diagnosis, confidence)
     }
+
+def predict_batch(grays: list) -> list:
+    """Run one forward pass over a list of (1, 224, 224) uint8 tensors."""
+    # Shared grayscale pipeline, scaled to [0, 1] without normalization
+    with span("preprocess", "vit"):
+        input_tensor = to_batch(grays)
+
+    with span("forward", "vit"), torch.no_grad():
+        output = get_model()(input_tensor)
+        confidences, pred_idx = torch.nn.functional.softmax(output, dim=1).max(dim=1)
+
+    return [
+        make_result(CLASSES[idx % len(CLASSES)], confidence)
+        for idx, confidence in zip(pred_idx.tolist(), confidences.tolist())
+    ]
+
+def predict_probs(grays: list) -> torch.Tensor:
+    """
+    (N, len(CLASSES)) label probabilities: the softmax mass of every
+    ImageNet-head output that `predict_batch` maps onto each label.
+    """
+    with span("preprocess", "vit"):
+        input_tensor = to_batch(grays)
+
+    with span("forward", "vit"), torch.no_grad():
+        probs = torch.nn.functional.softmax(get_model()(input_tensor), dim=1)
+
+    groups = torch.arange(probs.shape[1]) % len(CLASSES)
+    return probs.new_zeros(probs.shape[0], len(CLASSES)).index_add_(1, groups, probs)